@@ -19,6 +19,7 @@ HELP_MENU = f"""You can interact with me by sending these commands\:
 /stop{BOT_TELEGRAM_HANDLE_MD} \- stops me in group chat
 /unleash{BOT_TELEGRAM_HANDLE_MD} \- enables auto-response every N messages (default: 5)
 /leash{BOT_TELEGRAM_HANDLE_MD} \- disables auto-response every N messages (default: 0)
+/cache{BOT_TELEGRAM_HANDLE_MD} on\|off \- shares answers to common questions across groups at a discount (default: on)
 
 *Pay Me*
 /balance{BOT_TELEGRAM_HANDLE_MD} \- request group chat balance in USD & SATs
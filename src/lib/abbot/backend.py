@@ -0,0 +1,227 @@
+import asyncio
+import json
+import random
+import time
+from hashlib import sha256
+from os import makedirs
+from os.path import abspath, exists, join
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from cli_args import TEST_MODE
+from ..logger import debug_bot, error_bot
+from ..utils import try_get
+from .env import LLM_BACKEND, LLM_REPLAY_LATENCY, LLM_REPLAY_SEED
+from .tokenizer import tokenizer
+
+FILE_NAME = __name__
+
+LLM_BACKEND_LIVE = "live"
+LLM_BACKEND_RECORD = "record"
+LLM_BACKEND_REPLAY = "replay"
+LLM_BACKEND_MODES = (LLM_BACKEND_LIVE, LLM_BACKEND_RECORD, LLM_BACKEND_REPLAY)
+# test runs replay by default so they are offline, free and deterministic
+LLM_BACKEND_MODE: str = LLM_BACKEND or (LLM_BACKEND_REPLAY if TEST_MODE else LLM_BACKEND_LIVE)
+
+LLM_RECORDINGS_DIR: str = abspath("src/data/llm")
+LLM_RECORDINGS_FILE: str = "recordings.jsonl"
+# pause between replayed stream chunks, and words per chunk
+LLM_REPLAY_CHUNK_DELAY: float = 0.02
+LLM_REPLAY_CHUNK_WORDS: int = 3
+
+
+def prompt_key(kwargs: Dict) -> str:
+    """Recordings are keyed on the model and the exact role/content of every message sent"""
+    messages: List[Dict] = [
+        {"role": try_get(message, "role"), "content": try_get(message, "content")}
+        for message in kwargs.get("messages") or []
+    ]
+    return sha256(json.dumps({"model": kwargs.get("model"), "messages": messages}, sort_keys=True).encode()).hexdigest()
+
+
+class LatencyModel:
+    """
+    Synthetic latency for replayed completions, from a spec string:
+    "fixed:<s>", "uniform:<low>,<high>", "lognormal:<mu>,<sigma>" or "recorded" (the latency seen when recording)
+    Seeded, so a replay run sleeps the same sequence of delays every time
+    """
+
+    def __init__(self, spec: str = LLM_REPLAY_LATENCY, seed: int = LLM_REPLAY_SEED):
+        kind, _, params = spec.partition(":")
+        self.kind: str = kind
+        self.params: List[float] = [float(param) for param in params.split(",") if param]
+        self.random: random.Random = random.Random(seed)
+
+    def sample(self, recorded: Optional[float] = None) -> float:
+        if self.kind == "fixed":
+            return self.params[0]
+        if self.kind == "uniform":
+            return self.random.uniform(*self.params)
+        if self.kind == "lognormal":
+            return self.random.lognormvariate(*self.params)
+        return recorded or 0.0
+
+
+class Recordings:
+    """Append-only JSONL store of request/response pairs under LLM_RECORDINGS_DIR; the latest pair per key wins"""
+
+    def __init__(self, root: str = LLM_RECORDINGS_DIR):
+        self.path: str = join(root, LLM_RECORDINGS_FILE)
+        self.root: str = root
+        self.pairs: Optional[Dict[str, Dict]] = None
+
+    def load(self) -> Dict[str, Dict]:
+        if self.pairs is None:
+            self.pairs = {}
+            if exists(self.path):
+                with open(self.path, encoding="utf-8") as recordings:
+                    for line in recordings:
+                        if line.strip():
+                            pair: Dict = json.loads(line)
+                            self.pairs[pair["key"]] = pair
+        return self.pairs
+
+    def get(self, key: str) -> Optional[Dict]:
+        return self.load().get(key)
+
+    def add(self, pair: Dict) -> None:
+        makedirs(self.root, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as recordings:
+            recordings.write(f"{json.dumps(pair)}\n")
+        self.load()[pair["key"]] = pair
+
+
+def completion_response(model: str, content: str, prompt_tokens: int, completion_tokens: int) -> Dict:
+    """A chat.completion shaped dict; Abbot reads responses with try_get, so dicts and openai objects both work"""
+    return {
+        "id": f"chatcmpl-replay-{sha256(content.encode()).hexdigest()[:24]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+def completion_chunk(model: str, content: Optional[str], finish_reason: Optional[str] = None) -> Dict:
+    delta: Dict = {"content": content} if content is not None else {}
+    return {
+        "id": "chatcmpl-replay",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+
+
+class ReplayCompletions:
+    """
+    Serves recorded answers without touching the network, after a synthetic delay from latency
+    Prompts with no recording get a deterministic synthetic answer derived from the prompt key, so benchmarks
+    and test runs never fail on a cache miss
+    """
+
+    def __init__(self, recordings: Recordings, latency: LatencyModel):
+        self.recordings: Recordings = recordings
+        self.latency: LatencyModel = latency
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def answer(self, kwargs: Dict) -> Dict:
+        key: str = prompt_key(kwargs)
+        pair: Optional[Dict] = self.recordings.get(key)
+        if pair:
+            self.hits += 1
+            return pair
+        self.misses += 1
+        prompt: str = try_get(kwargs, "messages", -1, "content", default="") or ""
+        content: str = f"Replayed answer {key[:8]} to: {prompt[:200]}"
+        return {"key": key, "content": content, "latency": None}
+
+    async def create(self, **kwargs) -> Any:
+        log_name: str = f"{FILE_NAME}: ReplayCompletions.create"
+        pair: Dict = self.answer(kwargs)
+        model: str = kwargs.get("model")
+        content: str = pair["content"]
+        await asyncio.sleep(self.latency.sample(pair.get("latency")))
+        debug_bot.log(log_name, f"key={pair['key'][:12]} hits={self.hits} misses={self.misses}")
+        if kwargs.get("stream"):
+            return self.stream(model, content)
+        prompt_tokens: int = sum(tokenizer.count_many(try_get(message, "content") for message in kwargs["messages"]))
+        return completion_response(model, content, prompt_tokens, tokenizer.count(content, model))
+
+    async def stream(self, model: str, content: str) -> AsyncIterator[Dict]:
+        words: List[str] = content.split(" ")
+        for start in range(0, len(words), LLM_REPLAY_CHUNK_WORDS):
+            piece: str = " ".join(words[start : start + LLM_REPLAY_CHUNK_WORDS])
+            yield completion_chunk(model, piece if not start else f" {piece}")
+            await asyncio.sleep(LLM_REPLAY_CHUNK_DELAY)
+        yield completion_chunk(model, None, "stop")
+
+
+class RecordingCompletions:
+    """Calls the live client and appends each request/response pair to the recordings"""
+
+    def __init__(self, live: Any, recordings: Recordings):
+        self.live: Any = live
+        self.recordings: Recordings = recordings
+
+    def record(self, kwargs: Dict, content: str, latency: float) -> None:
+        log_name: str = f"{FILE_NAME}: RecordingCompletions.record"
+        try:
+            self.recordings.add(
+                {
+                    "key": prompt_key(kwargs),
+                    "model": kwargs.get("model"),
+                    "messages": [
+                        {"role": try_get(message, "role"), "content": try_get(message, "content")}
+                        for message in kwargs.get("messages") or []
+                    ],
+                    "content": content,
+                    "latency": latency,
+                    "recorded_at": int(time.time()),
+                }
+            )
+        except Exception as exception:
+            error_bot.log(log_name, f"failed to record: {exception}")
+
+    async def create(self, **kwargs) -> Any:
+        started: float = time.monotonic()
+        response: Any = await self.live.chat.completions.create(**kwargs)
+        if kwargs.get("stream"):
+            return self.stream(kwargs, response, started)
+        content: str = try_get(response, "choices", 0, "message", "content", default="") or ""
+        self.record(kwargs, content, time.monotonic() - started)
+        return response
+
+    async def stream(self, kwargs: Dict, response: Any, started: float) -> AsyncIterator[Any]:
+        first_chunk: Optional[float] = None
+        chunks: List[str] = []
+        async for chunk in response:
+            first_chunk = first_chunk or time.monotonic() - started
+            chunks.append(try_get(chunk, "choices", 0, "delta", "content", default="") or "")
+            yield chunk
+        self.record(kwargs, "".join(chunks), first_chunk or 0.0)
+
+
+class BackendClient:
+    """Exposes a completions backend as client.chat.completions, the only part of AsyncOpenAI Abbot uses"""
+
+    def __init__(self, completions: Any):
+        self.chat: SimpleNamespace = SimpleNamespace(completions=completions)
+
+
+def build_client(live: Any, mode: str = LLM_BACKEND_MODE) -> Any:
+    """The client Abbot talks to: the live AsyncOpenAI client, or a recording/replaying stand-in for it"""
+    if mode not in LLM_BACKEND_MODES:
+        raise ValueError(f"LLM_BACKEND must be one of {', '.join(LLM_BACKEND_MODES)}, got {mode!r}")
+    debug_bot.log(f"{FILE_NAME}: build_client", f"mode={mode}")
+    if mode == LLM_BACKEND_RECORD:
+        return BackendClient(RecordingCompletions(live, Recordings()))
+    if mode == LLM_BACKEND_REPLAY:
+        return BackendClient(ReplayCompletions(Recordings(), LatencyModel()))
+    return live
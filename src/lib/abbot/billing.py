@@ -0,0 +1,132 @@
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo.errors import DuplicateKeyError
+
+from ..logger import debug_bot, error_bot
+from ..utils import error, success, try_get
+from ..db.cache import GroupStateCache, group_state_cache
+from ..db.mongo import TelegramGroup
+from ..db.mongo_async import async_telegram_ledger
+
+FILE_NAME = __name__
+
+LEDGER_DEBIT = "debit"
+LEDGER_CREDIT = "credit"
+# a debit short of its full cost drains what is left; retried this many times if other turns move the balance
+BILLING_DRAIN_RETRIES: int = 5
+
+
+def split_sats(sats: int, askers: List[Dict]) -> List[Dict]:
+    """Each asker with an even share of sats; the remainder goes to the first ones so the shares add up to sats"""
+    share, remainder = divmod(sats, len(askers))
+    return [{**asker, "sats": share + (1 if index < remainder else 0)} for index, asker in enumerate(askers)]
+
+
+class Billing:
+    """
+    Group balances changed only through atomic, conditional $inc's, each recorded as an entry in the ledger
+    A debit applies only while the balance covers it, so concurrent turns in one group can never both spend the
+    same sats or push the balance below zero. Every debit keeps the tokens, model and BTCUSD price it was billed
+    at; credits are keyed by invoice so a payment seen twice (webhook and poll) is only credited once
+    """
+
+    def __init__(self, ledger: AsyncIOMotorCollection, groups: GroupStateCache):
+        self.ledger: AsyncIOMotorCollection = ledger
+        self.groups: GroupStateCache = groups
+
+    async def record(self, entry: Dict) -> None:
+        log_name: str = f"{FILE_NAME}: Billing.record"
+        try:
+            await self.ledger.insert_one({**entry, "created_at": datetime.now()})
+        except Exception as exception:
+            error_bot.log(log_name, f"failed to record ledger entry={entry}: {exception}")
+
+    async def debit(
+        self,
+        chat_id: int,
+        sats: int,
+        input_tokens: int = 0,
+        output_tokens: int = 0,
+        model: Optional[str] = None,
+        btcusd_price: Optional[float] = None,
+        cost_mult: float = 1.0,
+        reason: str = "completion",
+        askers: Optional[List[Dict]] = None,
+    ) -> Dict:
+        """
+        Take sats from the group's balance; when the balance cannot cover them all, whatever is left is taken
+        With askers (users one turn answered together) the entry records each one's even share of the sats taken
+        Returns success(data=balance after, debited=sats taken, drained=True if the group is now out of sats),
+        or error if the group had nothing left to take
+        """
+        log_name: str = f"{FILE_NAME}: Billing.debit"
+        sats = max(int(sats), 0)
+        debited: int = sats
+        group: Optional[TelegramGroup] = await self.groups.inc_group_balance(chat_id, -sats, minimum=sats)
+        for _ in range(BILLING_DRAIN_RETRIES if not group else 0):
+            fresh: Optional[TelegramGroup] = await self.groups.mongo.find_one_group({"id": chat_id}, ["balance"])
+            debited = int(try_get(fresh, "balance", default=0) or 0)
+            if debited <= 0:
+                break
+            group = await self.groups.inc_group_balance(chat_id, -debited, minimum=debited)
+            if group:
+                break
+        if not group:
+            debug_bot.log(log_name, f"chat_id={chat_id} has no sats left to cover {sats}")
+            return error("Insufficient balance", data=0, debited=0, drained=True)
+        balance: int = try_get(group, "balance", default=0)
+        entry: Dict = {"askers": split_sats(debited, askers)} if askers else {}
+        await self.record(
+            {
+                **entry,
+                "chat_id": chat_id,
+                "kind": LEDGER_DEBIT,
+                "sats": -debited,
+                "cost_sats": sats,
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "model": model,
+                "btcusd_price": btcusd_price,
+                "cost_mult": cost_mult,
+                "reason": reason,
+                "balance": balance,
+            }
+        )
+        debug_bot.log(log_name, f"chat_id={chat_id} debited={debited} cost={sats} balance={balance}")
+        return success(data=balance, debited=debited, drained=balance <= 0)
+
+    async def credit(self, chat_id: int, sats: int, invoice_id: Optional[str] = None, reason: str = "invoice") -> Dict:
+        """
+        Add sats to the group's balance; with an invoice_id the ledger entry is written first under a unique
+        _id, so a second credit for the same invoice is refused before it touches the balance
+        Returns success(data=balance after) or error(duplicate=True) for an invoice already credited
+        """
+        log_name: str = f"{FILE_NAME}: Billing.credit"
+        entry: Dict = {"chat_id": chat_id, "kind": LEDGER_CREDIT, "sats": int(sats), "reason": reason}
+        entry_id: Optional[str] = f"{LEDGER_CREDIT}:{invoice_id}" if invoice_id else None
+        if entry_id:
+            try:
+                await self.ledger.insert_one(
+                    {"_id": entry_id, **entry, "invoice_id": invoice_id, "created_at": datetime.now()}
+                )
+            except DuplicateKeyError:
+                debug_bot.log(log_name, f"invoice_id={invoice_id} already credited")
+                return error("Invoice already credited", duplicate=True)
+        group: Optional[TelegramGroup] = await self.groups.inc_group_balance(chat_id, int(sats))
+        if not group:
+            error_bot.log(log_name, f"chat_id={chat_id} not found, {sats} sats not credited")
+            if entry_id:
+                await self.ledger.delete_one({"_id": entry_id})
+            return error("No group to credit", data=None)
+        balance: int = try_get(group, "balance", default=0)
+        if entry_id:
+            await self.ledger.update_one({"_id": entry_id}, {"$set": {"balance": balance}})
+        else:
+            await self.record({**entry, "balance": balance})
+        debug_bot.log(log_name, f"chat_id={chat_id} credited={sats} balance={balance}")
+        return success(data=balance)
+
+
+billing = Billing(async_telegram_ledger, group_state_cache)
@@ -18,6 +18,7 @@ ORG_INPUT_TOKEN_COST = try_get(ORG_BUSINESS_MODEL, "input_token_cost")
 ORG_OUTPUT_TOKEN_COST = try_get(ORG_BUSINESS_MODEL, "output_token_cost")
 ORG_PER_TOKEN_COST_DIV = try_get(ORG_BUSINESS_MODEL, "per_token_cost_divisor")
 ORG_TOKEN_COST_MULT = try_get(ORG_BUSINESS_MODEL, "token_cost_multiplier")
+ORG_MODELS = try_get(ORG_BUSINESS_MODEL, "models", default={})
 ORG_CHAT_ID = try_get(ORG_CONFIG, "chat_id")
 ORG_CHAT_TITLE = try_get(ORG_CONFIG, "chat_title")
 ORG_BLOCK_HEIGHT = try_get(ORG_CONFIG, "block_height")
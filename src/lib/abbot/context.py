@@ -0,0 +1,151 @@
+from bisect import bisect_left
+from datetime import datetime
+from itertools import accumulate
+from typing import Callable, Dict, List, Optional, Tuple
+
+from ..utils import try_get
+
+FILE_NAME = __name__
+
+# the unsummarized tail may grow to CONTEXT_TOKEN_BUDGET before the oldest turns are folded into the summary,
+# after which CONTEXT_TAIL_TOKENS worth of the most recent turns are kept verbatim
+CONTEXT_TOKEN_BUDGET: int = 6000
+CONTEXT_TAIL_TOKENS: int = 3000
+CONTEXT_SUMMARY_WORDS: int = 300
+# hard cap on what one request sends, whatever the model's window, with room kept for the answer
+CONTEXT_MAX_TOKENS: int = 8000
+CONTEXT_REPLY_TOKENS: int = 1024
+MODEL_CONTEXT_TOKENS: Dict[str, int] = {
+    "gpt-4-1106-preview": 128000,
+    "gpt-4": 8192,
+    "gpt-4-32k": 32768,
+    "gpt-3.5-turbo": 16385,
+    "gpt-3.5-turbo-1106": 16385,
+}
+MODEL_CONTEXT_TOKENS_DEFAULT: int = 8192
+# chat formatting tokens the API bills on top of message contents: per message, and once to prime the reply
+MESSAGE_OVERHEAD_TOKENS: int = 3
+REPLY_PRIMING_TOKENS: int = 3
+CONTEXT_SUMMARY_PROMPT: str = (
+    "You maintain the running summary of a chat you take part in. Merge the previous summary and the new "
+    "transcript into one updated summary. Keep who said what, facts, numbers, links, decisions and open "
+    f"questions; drop greetings and small talk. Answer with the summary only, at most {CONTEXT_SUMMARY_WORDS} words."
+)
+
+
+def lifetime_history_len(doc: Optional[Dict]) -> Optional[int]:
+    """Number of history entries a chat has ever had, including those the archiver moved out"""
+    history_len: Optional[int] = try_get(doc, "history_len")
+    if history_len is None:
+        return None
+    return history_len + try_get(doc, "archived_history", default=0)
+
+
+def context_budget(model: str) -> int:
+    """Prompt tokens one request may use with this model"""
+    model_tokens: int = MODEL_CONTEXT_TOKENS.get(model, MODEL_CONTEXT_TOKENS_DEFAULT)
+    return min(CONTEXT_MAX_TOKENS, model_tokens - CONTEXT_REPLY_TOKENS)
+
+
+def window_start(token_counts: List[int], budget: int) -> Tuple[int, int]:
+    """
+    Index of the oldest entry that fits in budget together with every newer one, and their token total
+    prefix[i] is the cost of the entries before i, so the window starting at i costs prefix[-1] - prefix[i]
+    and the first i where that fits is found by bisecting for prefix[-1] - budget; a budget below zero (a head
+    larger than the model's window) fits nothing, like a budget of zero
+    """
+    prefix: List[int] = [0, *accumulate(token_counts)]
+    start: int = bisect_left(prefix, prefix[-1] - max(budget, 0))
+    return start, prefix[-1] - prefix[start]
+
+
+class RollingContext:
+    """
+    The messages Abbot sends for a chat: system prompt, a rolling summary of older turns, and a verbatim tail
+    The stored summary records `through`, the lifetime history index of the first entry it does not cover,
+    so the tail is every loaded entry from there on. When the tail outgrows token_budget, the oldest entries
+    are handed out by overflow() to be summarized and folded in, keeping about tail_tokens verbatim
+    """
+
+    def __init__(
+        self,
+        history: List[Dict],
+        count_tokens: Callable[[Dict], int],
+        history_len: Optional[int] = None,
+        summary: Optional[Dict] = None,
+        token_budget: int = CONTEXT_TOKEN_BUDGET,
+        tail_tokens: int = CONTEXT_TAIL_TOKENS,
+    ):
+        self.count_tokens: Callable[[Dict], int] = count_tokens
+        self.token_budget: int = token_budget
+        self.tail_tokens: int = min(tail_tokens, token_budget)
+        has_system: bool = bool(history) and try_get(history, 0, "role") == "system"
+        self.system: Optional[Dict] = history[0] if has_system else None
+        entries: List[Dict] = history[1:] if has_system else list(history or [])
+        history_len = history_len if history_len is not None else len(history or [])
+        first_index: int = history_len - len(entries)
+        self.summary: Optional[Dict] = summary
+        self.changed: bool = False
+        through: int = try_get(summary, "through", default=0)
+        self.tail: List[Dict] = entries[max(through - first_index, 0) :]
+        self.tail_index: int = max(through, first_index)
+        self.tail_token_counts: List[int] = [self.count_tokens(entry) for entry in self.tail]
+
+    def append(self, entry: Dict) -> None:
+        self.tail.append(entry)
+        self.tail_token_counts.append(self.count_tokens(entry))
+
+    def tail_token_total(self) -> int:
+        return sum(self.tail_token_counts)
+
+    def overflowing(self) -> bool:
+        return self.tail_token_total() > self.token_budget
+
+    def overflow(self) -> Tuple[List[Dict], int]:
+        """Oldest tail entries to fold into the summary so the rest fits in tail_tokens; the newest always stays"""
+        if len(self.tail) < 2:
+            return [], 0
+        split: int = len(self.tail) - 1
+        kept_tokens: int = self.tail_token_counts[split]
+        while split > 1 and kept_tokens + self.tail_token_counts[split - 1] <= self.tail_tokens:
+            split -= 1
+            kept_tokens += self.tail_token_counts[split]
+        return self.tail[:split], split
+
+    def fold(self, summary_content: str, count: int) -> None:
+        """Replace the summary with one that also covers the first `count` tail entries"""
+        self.tail = self.tail[count:]
+        self.tail_token_counts = self.tail_token_counts[count:]
+        self.tail_index += count
+        self.summary = {"content": summary_content, "through": self.tail_index, "updated_at": datetime.now()}
+        self.changed = True
+
+    def summary_request(self, entries: List[Dict]) -> List[Dict]:
+        """Messages asking the model to merge the previous summary with the entries being folded"""
+        previous: str = try_get(self.summary, "content", default="(none)")
+        transcript: str = "\n".join(f"{try_get(entry, 'role')}: {try_get(entry, 'content')}" for entry in entries)
+        return [
+            {"role": "system", "content": CONTEXT_SUMMARY_PROMPT},
+            {"role": "user", "content": f"Previous summary:\n{previous}\n\nNew transcript:\n{transcript}"},
+        ]
+
+    def window(self, model: str) -> Tuple[List[Dict], int]:
+        """
+        The messages to send to model and their exact prompt token count: system prompt and summary always,
+        then as many of the most recent tail entries as fit in context_budget(model); the newest always goes
+        """
+        head: List[Dict] = [self.system] if self.system else []
+        summary_content: Optional[str] = try_get(self.summary, "content")
+        if summary_content:
+            head.append({"role": "system", "content": f"Summary of the earlier conversation: {summary_content}"})
+        head_tokens: int = sum(self.count_tokens(entry) + MESSAGE_OVERHEAD_TOKENS for entry in head)
+        head_tokens += REPLY_PRIMING_TOKENS
+        tail_counts: List[int] = [tokens + MESSAGE_OVERHEAD_TOKENS for tokens in self.tail_token_counts]
+        start, tail_tokens = window_start(tail_counts, context_budget(model) - head_tokens)
+        if start == len(self.tail) and self.tail:
+            start, tail_tokens = len(self.tail) - 1, tail_counts[-1]
+        messages: List[Dict] = [
+            *({"role": entry["role"], "content": entry["content"]} for entry in head),
+            *({"role": entry["role"], "content": entry["content"]} for entry in self.tail[start:]),
+        ]
+        return messages, head_tokens + tail_tokens
@@ -1,41 +1,150 @@
+from collections import deque
 from datetime import datetime
+from statistics import median
 import time
-import tiktoken
-from openai import OpenAI
+from openai import AsyncOpenAI
 from abc import abstractmethod
-from typing import List, Dict
+from typing import AsyncIterator, Deque, List, Dict, Optional, Tuple
 
 from constants import OPENAI_MODEL
 from ..db.utils import successful_update_one
-from ..abbot.config import BOT_TELEGRAM_HANDLE
+from ..abbot.config import (
+    BOT_TELEGRAM_HANDLE,
+    ORG_INPUT_TOKEN_COST,
+    ORG_MODELS,
+    ORG_OUTPUT_TOKEN_COST,
+    ORG_PER_TOKEN_COST_DIV,
+    ORG_TOKEN_COST_MULT,
+)
 from ..utils import error, success, to_dict, try_get
 from ..db.mongo import GroupConfig, UpdateResult, mongo_abbot
+from .backend import build_client
+from .context import RollingContext
+from .llm import LLM_DEADLINE, ResilientCompletions, completion_limiter
+from .tokenizer import tokenizer
+from .utils import calculate_tokens, count_tokens, entry_tokens
 
 from ..logger import debug_bot, error_bot
 
-encoding = tiktoken.encoding_for_model(OPENAI_MODEL)
 FILE_NAME = __name__
 
+# per-model token costs from the org business model; OPENAI_MODEL is always available at the org-wide rates
+MODEL_COSTS: Dict[str, Dict[str, float]] = {
+    OPENAI_MODEL: {"input_token_cost": ORG_INPUT_TOKEN_COST, "output_token_cost": ORG_OUTPUT_TOKEN_COST},
+    **ORG_MODELS,
+}
+# triggers where the user asked Abbot something and always get OPENAI_MODEL while the group can afford it
+EXPLICIT_TRIGGERS = ("mention", "reply", "dm")
+# latest user entries this short without a question mark ("gm", "lol") are small talk whatever the trigger
+ROUTER_SMALL_TALK_TOKENS: int = 16
+# below this balance every turn goes to the cheapest model so the group's sats last longer
+ROUTER_LOW_BALANCE_SATS: int = 1000
+# a model whose median latency over its recent completions exceeds this is avoided; samples older than
+# ROUTER_LATENCY_WINDOW seconds are ignored so an avoided model is tried again once things calm down
+ROUTER_SLOW_SECONDS: float = 20.0
+ROUTER_LATENCY_SAMPLES: int = 50
+ROUTER_LATENCY_WINDOW: float = 10 * 60
+
+
+def model_cost_usd(model: str, input_tokens: int, output_tokens: int) -> float:
+    """What a completion costs the group in USD: the model's token costs times the org multiplier"""
+    costs: Dict[str, float] = MODEL_COSTS.get(model) or MODEL_COSTS[OPENAI_MODEL]
+    input_cost: float = (input_tokens / ORG_PER_TOKEN_COST_DIV) * costs["input_token_cost"]
+    output_cost: float = (output_tokens / ORG_PER_TOKEN_COST_DIV) * costs["output_token_cost"]
+    return (input_cost + output_cost) * ORG_TOKEN_COST_MULT
+
+
+class ModelRouter:
+    """
+    Picks the model for each turn from MODEL_COSTS
+    Explicit questions (mention, reply, dm) get OPENAI_MODEL; unleash/start turns and small talk get the cheapest
+    model that is not currently slow. Groups low on sats get the cheapest model for everything. Latency is the
+    median of recent completion times per model, fed back by Abbot through observe()
+    """
+
+    def __init__(self, models: Dict[str, Dict[str, float]] = MODEL_COSTS, default: str = OPENAI_MODEL):
+        self.models: Dict[str, Dict[str, float]] = models
+        self.default: str = default
+        self.latencies: Dict[str, Deque[Tuple[float, float]]] = {
+            model: deque(maxlen=ROUTER_LATENCY_SAMPLES) for model in models
+        }
+        self.by_cost: List[str] = sorted(models, key=lambda model: model_cost_usd(model, 1000, 1000))
 
-@to_dict
-class Abbot(GroupConfig):
-    from ..abbot.env import OPENAI_API_KEY, OPENAI_ORG_ID
+    def observe(self, model: str, seconds: float) -> None:
+        self.latencies.setdefault(model, deque(maxlen=ROUTER_LATENCY_SAMPLES)).append((time.monotonic(), seconds))
+
+    def latency(self, model: str) -> float:
+        since: float = time.monotonic() - ROUTER_LATENCY_WINDOW
+        samples: List[float] = [seconds for at, seconds in self.latencies.get(model) or () if at >= since]
+        return median(samples) if samples else 0.0
+
+    def cheapest(self) -> str:
+        """Cheapest model whose median latency is acceptable, else the fastest"""
+        for model in self.by_cost:
+            if self.latency(model) <= ROUTER_SLOW_SECONDS:
+                return model
+        return min(self.by_cost, key=self.latency)
 
-    client: OpenAI = OpenAI(organization=OPENAI_ORG_ID, api_key=OPENAI_API_KEY)
+    def route(self, trigger: str, latest: Optional[Dict], balance: Optional[int] = None) -> str:
+        log_name: str = f"{FILE_NAME}: ModelRouter.route"
+        content: str = try_get(latest, "content", default="") or ""
+        small_talk: bool = entry_tokens(latest or {}) <= ROUTER_SMALL_TALK_TOKENS and "?" not in content
+        if balance is not None and balance < ROUTER_LOW_BALANCE_SATS:
+            model: str = self.cheapest()
+        elif trigger in EXPLICIT_TRIGGERS and not small_talk:
+            model: str = self.default
+        else:
+            model: str = self.cheapest()
+        debug_bot.log(log_name, f"trigger={trigger} balance={balance} small_talk={small_talk} model={model}")
+        return model
 
-    def __init__(self, id: str, bot_type: str, history: List):
+
+model_router = ModelRouter()
+
+
+@to_dict
+class Abbot(GroupConfig):
+    from ..abbot.env import OPENAI_API_KEY, OPENAI_BASE_URL, OPENAI_ORG_ID
+
+    # retries and deadlines are owned by ResilientCompletions; the client timeout bounds idle stream reads
+    # LLM_BACKEND swaps the live client for a recording or offline replaying stand-in
+    client: AsyncOpenAI = build_client(
+        AsyncOpenAI(
+            organization=OPENAI_ORG_ID,
+            api_key=OPENAI_API_KEY,
+            base_url=OPENAI_BASE_URL,
+            max_retries=0,
+            timeout=LLM_DEADLINE,
+        )
+    )
+    completions: ResilientCompletions = ResilientCompletions(client)
+
+    def __init__(
+        self,
+        id: str,
+        bot_type: str,
+        history: List,
+        history_len: Optional[int] = None,
+        summary: Optional[Dict] = None,
+        history_tokens: Optional[int] = None,
+    ):
         log_name: str = f"{__name__}: Abbot.__init__():"
         debug_bot.log(log_name, f"history={history}")
         self.id: str = id
         self.bot_type: str = bot_type
         self.history: List = history
         self.history_len: int = len(history)
-        self.history_tokens: int = self.calculate_history_tokens(history)
+        self.history_tokens: int = history_tokens if history_tokens is not None else calculate_tokens(history)
+        self.context: RollingContext = RollingContext(history, entry_tokens, history_len, summary)
+        self.completion: Optional[Tuple[str, int, int, int]] = None
+        self.model: str = OPENAI_MODEL
+        # set when the turn's answer came from the answer cache: the model that generated it
+        self.cached_model: Optional[str] = None
         if bot_type == "group":
             self.config: GroupConfig = GroupConfig()
 
     def __str__(self) -> str:
-        return f"Abbot(model={OPENAI_MODEL}, id={self.id}, bot_type={self.bot_type}, history_len={self.history_len}, history_tokens={self.history_tokens}, config={self.config})"
+        return f"Abbot(model={self.model}, id={self.id}, bot_type={self.bot_type}, history_len={self.history_len}, history_tokens={self.history_tokens}, config={self.config})"
 
     @abstractmethod
     def to_dict(self) -> dict:
@@ -103,23 +212,13 @@ class Abbot(GroupConfig):
         return self.history
 
     def tokenize(self, content: str) -> list:
-        return encoding.encode(content, allowed_special="all")
+        return tokenizer.encode(content, self.model)
 
     def calculate_tokens(self, content: str) -> int:
-        return len(self.tokenize(content))
+        return count_tokens(content)
 
     def calculate_history_tokens(self, history=None) -> int:
-        log_name: str = f"{FILE_NAME}: calculate_history_tokens"
-        debug_bot.log(log_name, f"history={history}")
-        total = 0
-        if not history:
-            history = self.history
-        for data in history:
-            content = try_get(data, "content")
-            if not content:
-                continue
-            total += self.calculate_tokens(content)
-        return total
+        return calculate_tokens(history or self.history)
 
     def update_db(self, update: Dict) -> Dict | UpdateResult:
         result: UpdateResult = mongo_abbot.update_one(self.bot_type, {"id": self.id}, update)
@@ -129,24 +228,55 @@ class Abbot(GroupConfig):
         upsert_id = try_get(result, "upserted_id")
         return success(upsert_id)
 
-    def update_history_tokens(self, content: str) -> int:
-        self.history_len += 1
-        self.history_tokens += len(self.tokenize(content))
-
     def update_history(self, update: Dict) -> None:
+        update["tokens"] = entry_tokens(update)
         self.history.append(update)
-        content = try_get(update, "content")
-        if not content:
-            return
-        self.update_history_tokens(content)
+        self.context.append(update)
+        self.history_len += 1
+        self.history_tokens += update["tokens"]
+
+    def route(self, trigger: str, balance: Optional[int] = None) -> str:
+        """Choose the model for this turn with model_router; billing should price the turn at self.model"""
+        latest: Optional[Dict] = next((entry for entry in reversed(self.context.tail) if entry["role"] == "user"), None)
+        self.model = model_router.route(trigger, latest, balance)
+        return self.model
+
+    def summary_update(self) -> Dict:
+        """$set fields persisting the rolling summary, if this turn changed it"""
+        return {"summary": self.context.summary} if self.context.changed else {}
+
+    async def summarize(self) -> Dict:
+        """Fold the oldest turns of an over-budget context into the rolling summary; returns the usage it cost"""
+        log_name: str = f"{FILE_NAME}: Abbot.summarize"
+        entries, count = self.context.overflow()
+        if not count:
+            return {}
+        response = await self.completions.create(messages=self.context.summary_request(entries), model=self.model)
+        summary = try_get(response, "choices", 0, "message", "content")
+        if not summary:
+            error_bot.log(log_name, f"no summary: response={response}")
+            return {}
+        self.context.fold(summary, count)
+        debug_bot.log(log_name, f"folded {count} entries, through={self.context.tail_index}")
+        return {
+            "prompt_tokens": try_get(response, "usage", "prompt_tokens", default=0),
+            "completion_tokens": try_get(response, "usage", "completion_tokens", default=0),
+        }
 
-    def chat_completion(self) -> str:
-        response = self.client.chat.completions.create(messages=self.history, model=OPENAI_MODEL)
+    async def chat_completion(self) -> str:
+        """Waits for a completion_limiter slot for this chat, so other chats are served while this one waits"""
+        self.cached_model = None
+        async with completion_limiter.slot(self.id):
+            summary_usage: Dict = await self.summarize() if self.context.overflowing() else {}
+            messages, _ = self.context.window(self.model)
+            started: float = time.perf_counter()
+            response = await self.completions.create(messages=messages, model=self.model)
+            model_router.observe(self.model, time.perf_counter() - started)
         answer = try_get(response, "choices", 0, "message", "content")
-        input_tokens = try_get(response, "usage", "prompt_tokens")
+        input_tokens = try_get(response, "usage", "prompt_tokens") + try_get(summary_usage, "prompt_tokens", default=0)
         output_tokens = try_get(response, "usage", "completion_tokens")
+        output_tokens += try_get(summary_usage, "completion_tokens", default=0)
         total_tokens = try_get(response, "usage", "total_tokens")
-        self.history_tokens += total_tokens
         assistant_update = {
             "role": "assistant",
             "content": f"{BOT_TELEGRAM_HANDLE} said: {answer} on {datetime.now().isoformat()}",
@@ -156,3 +286,55 @@ class Abbot(GroupConfig):
             debug_bot.log(__name__, f"chat_completion => response={response}")
             error_bot.log(__name__, f"chat_completion => answer={answer}")
         return answer, input_tokens, output_tokens, total_tokens
+
+    async def stream_completion(self) -> AsyncIterator[str]:
+        """
+        chat_completion, streamed: yields the answer so far each time a chunk arrives
+        Streamed responses carry no usage, so the prompt is billed at the window's exact count and the answer is
+        counted locally; the chat_completion-shaped result is left in self.completion once the stream ends
+        """
+        log_name: str = f"{FILE_NAME}: Abbot.stream_completion"
+        chunks: List[str] = []
+        self.cached_model = None
+        async with completion_limiter.slot(self.id):
+            summary_usage: Dict = await self.summarize() if self.context.overflowing() else {}
+            messages, prompt_tokens = self.context.window(self.model)
+            started: float = time.perf_counter()
+            stream = await self.completions.create(messages=messages, model=self.model, stream=True)
+            async for chunk in stream:
+                delta: Optional[str] = try_get(chunk, "choices", 0, "delta", "content")
+                if delta:
+                    chunks.append(delta)
+                    yield "".join(chunks)
+            model_router.observe(self.model, time.perf_counter() - started)
+        answer: str = "".join(chunks)
+        completion_tokens: int = count_tokens(answer, self.model)
+        input_tokens: int = prompt_tokens + try_get(summary_usage, "prompt_tokens", default=0)
+        output_tokens: int = completion_tokens + try_get(summary_usage, "completion_tokens", default=0)
+        if not answer:
+            error_bot.log(log_name, f"answer={answer}")
+        self.record_completion(answer, input_tokens, output_tokens, prompt_tokens + completion_tokens)
+
+    @property
+    def billing_model(self) -> str:
+        """The model whose rates the turn is billed at: the one that produced its answer"""
+        return self.cached_model or self.model
+
+    def cached_completion(
+        self, answer: str, input_tokens: int, output_tokens: int, model: Optional[str] = None
+    ) -> Tuple[str, int, int, int]:
+        """Take an answer from the answer cache as this turn's completion, without calling the model"""
+        self.cached_model = model
+        return self.record_completion(answer, input_tokens, output_tokens, input_tokens + output_tokens)
+
+    def record_completion(
+        self, answer: str, input_tokens: int, output_tokens: int, total_tokens: int
+    ) -> Tuple[str, int, int, int]:
+        self.update_history(
+            {
+                "role": "assistant",
+                "content": f"{BOT_TELEGRAM_HANDLE} said: {answer} on {datetime.now().isoformat()}",
+            }
+        )
+        self.completion = (answer, input_tokens, output_tokens, total_tokens)
+        return self.completion
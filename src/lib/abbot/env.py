@@ -14,11 +14,22 @@ PAYMENT_PROCESSOR_KIND: str = try_get(env, "PAYMENT_PROCESSOR_KIND")
 PAYMENT_PROCESSOR_TOKEN: str = try_get(env, "PAYMENT_PROCESSOR_TOKEN")
 
 PRICE_PROVIDER_KIND: str = try_get(env, "PRICE_PROVIDER_KIND", default=PAYMENT_PROCESSOR_KIND)
+PRICE_REFRESH_INTERVAL: float = float(try_get(env, "PRICE_REFRESH_INTERVAL") or 60)
 
 LNBITS_BASE_URL: Optional[str] = try_get(env, "LNBITS_BASE_URL")
 
+STRIKE_BASE_URL: str = try_get(env, "STRIKE_BASE_URL") or "https://api.strike.me/v1"
+STRIKE_WEBHOOK_SECRET: Optional[str] = try_get(env, "STRIKE_WEBHOOK_SECRET")
+STRIKE_WEBHOOK_URL: Optional[str] = try_get(env, "STRIKE_WEBHOOK_URL")
+STRIKE_WEBHOOK_PORT: int = int(try_get(env, "STRIKE_WEBHOOK_PORT") or 8090)
+
 OPENAI_API_KEY: str = try_get(env, "OPENAI_API_KEY")
 OPENAI_ORG_ID: str = try_get(env, "OPENAI_ORG_ID")
+OPENAI_BASE_URL: Optional[str] = try_get(env, "OPENAI_BASE_URL") or None
+
+LLM_BACKEND: Optional[str] = try_get(env, "LLM_BACKEND") or None
+LLM_REPLAY_LATENCY: str = try_get(env, "LLM_REPLAY_LATENCY") or "recorded"
+LLM_REPLAY_SEED: int = int(try_get(env, "LLM_REPLAY_SEED") or 0)
 
 VECTOR_DATABASE_KIND: Optional[str] = try_get(env, "VECTOR_DATABASE_KIND")
 VECTOR_DATABASE_API_KEY: Optional[str] = try_get(env, "VECTOR_DATABASE_API_KEY")
@@ -29,6 +40,14 @@ DATABASE_USERNAME: Optional[str] = try_get(env, "DATABASE_USERNAME")
 DATABASE_PASSWORD: Optional[str] = try_get(env, "DATABASE_PASSWORD")
 DATABASE_HOST: Optional[str] = try_get(env, "DATABASE_HOST")
 DATABASE_CONNECTION_STRING: Optional[str] = try_get(env, "DATABASE_CONNECTION_STRING")
+DATABASE_STORAGE_MODE: str = try_get(env, "DATABASE_STORAGE_MODE") or "document"
+DATABASE_STORE_RAW_MESSAGES: bool = (try_get(env, "DATABASE_STORE_RAW_MESSAGES") or "true").lower() == "true"
+
+ARCHIVE_KEEP_COUNT: int = int(try_get(env, "ARCHIVE_KEEP_COUNT") or 1000)
+ARCHIVE_MAX_AGE_DAYS: int = int(try_get(env, "ARCHIVE_MAX_AGE_DAYS") or 90)
+ARCHIVE_INTERVAL: float = float(try_get(env, "ARCHIVE_INTERVAL") or 6 * 60 * 60)
+
+MENTION_BATCH_WINDOW: float = float(try_get(env, "MENTION_BATCH_WINDOW") or 1.5)
 
 ENV_VAR_MISSING = "Env var missing"
 
@@ -48,6 +67,11 @@ assert LNBITS_BASE_URL, f"{ENV_VAR_MISSING}: LNBITS_BASE_URL required" if PAYMEN
 
 assert DATABASE_KIND == "mongo", f"{ENV_VAR_MISSING}: DATABASE_KIND must be mongo"
 
+if LLM_BACKEND not in (None, "live", "record", "replay"):
+    raise ValueError(f"LLM_BACKEND must be one of live, record, replay, got {LLM_BACKEND!r}")
+
+assert DATABASE_STORAGE_MODE in ("document", "append"), "DATABASE_STORAGE_MODE must be one of document, append"
+
 if not DATABASE_CONNECTION_STRING:
     assert DATABASE_USERNAME, f"{ENV_VAR_MISSING}: DATABASE_USERNAME required"
     assert DATABASE_PASSWORD, f"{ENV_VAR_MISSING}: DATABASE_PASSWORD required"
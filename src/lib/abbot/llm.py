@@ -0,0 +1,250 @@
+import asyncio
+import random
+import time
+from collections import Counter, deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Optional
+
+from openai import APIConnectionError, AsyncOpenAI, InternalServerError, RateLimitError
+
+from ..logger import debug_bot, error_bot
+from .exceptions.exception import AbbotException
+
+FILE_NAME = __name__
+
+# completions in flight across every chat, and per chat
+LLM_MAX_CONCURRENCY: int = 8
+LLM_MAX_PER_CHAT: int = 1
+# completions allowed to wait for a slot, and how long each may wait, before new ones are turned away
+LLM_MAX_QUEUED: int = 64
+LLM_QUEUE_TIMEOUT: float = 60.0
+
+
+# each attempt must produce a response (for streams: open the stream) within this many seconds
+LLM_DEADLINE: float = 45.0
+# retryable failures are retried this many times, after a full-jitter backoff of up to base * 2^attempt seconds
+LLM_MAX_RETRIES: int = 2
+LLM_BACKOFF_BASE: float = 0.5
+# after this many consecutive retryable failures requests fail fast for LLM_BREAKER_COOLDOWN seconds,
+# then one probe request decides whether to close the breaker again
+LLM_BREAKER_FAILURES: int = 5
+LLM_BREAKER_COOLDOWN: float = 30.0
+# when on, a request still pending after the model's p95 latency gets a second, hedged request; first one wins
+LLM_HEDGE: bool = True
+LLM_HEDGE_MIN_SAMPLES: int = 20
+LLM_LATENCY_SAMPLES: int = 200
+
+RETRYABLE_ERRORS = (APIConnectionError, RateLimitError, InternalServerError, TimeoutError)
+
+
+class LLMBusyException(AbbotException):
+    reply: str = "I'm answering a lot of questions right now. Please try again in a minute."
+
+
+class LLMUnavailableException(AbbotException):
+    reply: str = "My AI provider is having trouble right now. Please try again in a few minutes."
+
+
+class CompletionLimiter:
+    """
+    Bounds concurrent completions globally and per chat
+    A completion first waits for its chat's slot, then for a global one, so a single busy chat queues behind
+    itself instead of holding global capacity. Waiting is bounded: past max_queued waiters, or after
+    queue_timeout seconds, slot() raises LLMBusyException
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        max_per_chat: int = LLM_MAX_PER_CHAT,
+        max_queued: int = LLM_MAX_QUEUED,
+        queue_timeout: float = LLM_QUEUE_TIMEOUT,
+    ):
+        self.max_per_chat: int = max_per_chat
+        self.max_queued: int = max_queued
+        self.queue_timeout: float = queue_timeout
+        self.global_slots: asyncio.Semaphore = asyncio.Semaphore(max_concurrency)
+        self.chat_slots: Dict[int, asyncio.Semaphore] = {}
+        self.chat_users: Dict[int, int] = {}
+        self.waiting: int = 0
+        self.in_flight: int = 0
+
+    @asynccontextmanager
+    async def slot(self, chat_id: int) -> AsyncIterator[None]:
+        log_name: str = f"{FILE_NAME}: CompletionLimiter.slot"
+        if self.waiting >= self.max_queued:
+            raise LLMBusyException(f"{log_name}: {self.waiting} completions already waiting, chat_id={chat_id}")
+        chat_slot: asyncio.Semaphore = self.chat_slots.setdefault(chat_id, asyncio.Semaphore(self.max_per_chat))
+        self.chat_users[chat_id] = self.chat_users.get(chat_id, 0) + 1
+        holds_chat: bool = False
+        holds_global: bool = False
+        try:
+            self.waiting += 1
+            try:
+                async with asyncio.timeout(self.queue_timeout):
+                    await chat_slot.acquire()
+                    holds_chat = True
+                    await self.global_slots.acquire()
+                    holds_global = True
+            except TimeoutError:
+                raise LLMBusyException(f"{log_name}: no slot after {self.queue_timeout}s, chat_id={chat_id}")
+            finally:
+                self.waiting -= 1
+            self.in_flight += 1
+            debug_bot.log(log_name, f"chat_id={chat_id} in_flight={self.in_flight} waiting={self.waiting}")
+            try:
+                yield
+            finally:
+                self.in_flight -= 1
+        finally:
+            if holds_global:
+                self.global_slots.release()
+            if holds_chat:
+                chat_slot.release()
+            self.chat_users[chat_id] -= 1
+            if not self.chat_users[chat_id]:
+                del self.chat_users[chat_id]
+                del self.chat_slots[chat_id]
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker: closed -> open after max_failures, half open after cooldown, closed on success"""
+
+    def __init__(self, max_failures: int = LLM_BREAKER_FAILURES, cooldown: float = LLM_BREAKER_COOLDOWN):
+        self.max_failures: int = max_failures
+        self.cooldown: float = cooldown
+        self.failures: int = 0
+        self.opened_at: Optional[float] = None
+        self.probing: bool = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.cooldown else "open"
+
+    def allow(self) -> bool:
+        state: str = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.probing:
+            self.probing = True
+            return True
+        return False
+
+    def success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def failure(self) -> None:
+        self.failures += 1
+        if self.probing or self.failures >= self.max_failures:
+            self.opened_at = time.monotonic()
+        self.probing = False
+
+
+class ResilientCompletions:
+    """
+    Drop-in for client.chat.completions.create with a deadline per attempt, jittered retries of retryable errors,
+    a circuit breaker that fails fast with LLMUnavailableException while the provider is degraded, and optional
+    hedging: once a request outlives the model's observed p95 latency a second one is raced against it.
+    Outcomes are counted in self.metrics
+    """
+
+    def __init__(
+        self,
+        client: AsyncOpenAI,
+        deadline: float = LLM_DEADLINE,
+        max_retries: int = LLM_MAX_RETRIES,
+        hedge: bool = LLM_HEDGE,
+    ):
+        self.client: AsyncOpenAI = client
+        self.deadline: float = deadline
+        self.max_retries: int = max_retries
+        self.hedge: bool = hedge
+        self.breaker: CircuitBreaker = CircuitBreaker()
+        self.latencies: Dict[str, Deque[float]] = {}
+        self.metrics: Counter = Counter()
+
+    def p95(self, model: str) -> Optional[float]:
+        samples: Deque[float] = self.latencies.get(model) or deque()
+        if len(samples) < LLM_HEDGE_MIN_SAMPLES:
+            return None
+        return sorted(samples)[int(len(samples) * 0.95) - 1]
+
+    async def attempt(self, **kwargs) -> Any:
+        async with asyncio.timeout(self.deadline):
+            return await self.client.chat.completions.create(**kwargs)
+
+    @staticmethod
+    async def discard(task: asyncio.Task) -> None:
+        """Cancel the losing request of a hedge, closing its stream if it already opened one"""
+        if not task.done():
+            task.cancel()
+            return
+        if task.cancelled() or task.exception():
+            return
+        response: Any = getattr(task.result(), "response", None)
+        if response is not None:
+            await response.aclose()
+
+    async def hedged(self, **kwargs) -> Any:
+        delay: Optional[float] = self.p95(kwargs.get("model")) if self.hedge else None
+        first: asyncio.Task = asyncio.ensure_future(self.attempt(**kwargs))
+        if delay is None:
+            return await first
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if done:
+            return first.result()
+        self.metrics["hedged"] += 1
+        second: asyncio.Task = asyncio.ensure_future(self.attempt(**kwargs))
+        pending = {first, second}
+        winner: Optional[asyncio.Task] = None
+        try:
+            while pending and not winner:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winner = next((task for task in done if not task.exception()), None)
+            if winner is second:
+                self.metrics["hedge_won"] += 1
+            return (winner or second).result()
+        finally:
+            for task in (first, second):
+                if task is not winner:
+                    await self.discard(task)
+
+    async def create(self, **kwargs) -> Any:
+        log_name: str = f"{FILE_NAME}: ResilientCompletions.create"
+        model: str = kwargs.get("model")
+        for attempt in range(self.max_retries + 1):
+            if not self.breaker.allow():
+                self.metrics["rejected"] += 1
+                raise LLMUnavailableException(f"{log_name}: circuit open, failures={self.breaker.failures}")
+            started: float = time.monotonic()
+            try:
+                response: Any = await self.hedged(**kwargs)
+            except RETRYABLE_ERRORS as exception:
+                self.breaker.failure()
+                outcome: str = "timeout" if isinstance(exception, TimeoutError) else "retryable_error"
+                self.metrics[outcome] += 1
+                error_bot.log(log_name, f"model={model} attempt={attempt} {outcome}: {exception!r}")
+                if attempt == self.max_retries:
+                    self.metrics["failed"] += 1
+                    raise LLMUnavailableException(f"{log_name}: {outcome} after {attempt + 1} attempts: {exception!r}")
+                await asyncio.sleep(random.uniform(0, LLM_BACKOFF_BASE * 2**attempt))
+                continue
+            except Exception:
+                # not a sign of provider trouble, so the failure count stands; a failed probe still reopens
+                if self.breaker.probing:
+                    self.breaker.failure()
+                self.metrics["error"] += 1
+                raise
+            elapsed: float = time.monotonic() - started
+            self.breaker.success()
+            self.latencies.setdefault(model, deque(maxlen=LLM_LATENCY_SAMPLES)).append(elapsed)
+            self.metrics["ok" if not attempt else "ok_after_retry"] += 1
+            debug_bot.log(log_name, f"model={model} elapsed={elapsed:.2f}s metrics={dict(self.metrics)}")
+            return response
+
+
+completion_limiter = CompletionLimiter()
@@ -55,7 +55,10 @@ class NostrBotBuilder:
         self,
         custom_filters: Optional[List[Filter]] = [],
     ):
-        self.io_loop = asyncio.get_event_loop()
+        # one loop for the bot's lifetime: completion_limiter's semaphores bind to the first loop that waits on
+        # them, so a fresh loop per message (asyncio.run) would break them
+        self.io_loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.io_loop)
         from lib.abbot.env import BOT_NOSTR_SK as sk
 
         self.keys = Keys.from_sk_str(sk)
@@ -200,7 +203,7 @@ class NostrBotBuilder:
         abbot = Abbot(sender, "dm")
         debug_bot.log(fn, f"abbot: {abbot}")
         abbot.update_history({"role": "user", "content": content})
-        answer: str = abbot.chat_completion()
+        answer, _, _, _ = self.io_loop.run_until_complete(abbot.chat_completion())
         debug_bot.log(fn, f"content={content}")
 
         event_id: str = self.send_direct_message(answer, dm_event)
@@ -0,0 +1,71 @@
+import asyncio
+import time
+from typing import Dict, List, Optional
+
+from lib.logger import debug_bot
+from lib.abbot.env import MENTION_BATCH_WINDOW
+
+FILE_NAME = __name__
+
+MENTION_BATCH_PROMPT: str = (
+    "Several people mentioned you at once. Answer all of them in one reply, addressing each by handle:"
+)
+
+
+class MentionBatcher:
+    """
+    Per-chat micro-batching of mentions
+    A lone mention is answered right away. A mention arriving while the chat is busy (another mention within
+    window seconds, or more updates of the chat already queued behind it) opens a batch instead: mentions arriving
+    within the window join it, and its leader waits out the window, closes it and answers every mention with one
+    completion
+    """
+
+    def __init__(self, window: float = MENTION_BATCH_WINDOW):
+        self.window: float = window
+        self.batches: Dict[int, List[Dict]] = {}
+        self.last_mention_at: Dict[int, float] = {}
+        self.batched: int = 0
+        self.completions: int = 0
+
+    def is_open(self, chat_id: int) -> bool:
+        return chat_id in self.batches
+
+    def busy(self, chat_id: int, now: float, queued: int) -> bool:
+        last: Optional[float] = self.last_mention_at.get(chat_id)
+        return queued > 1 or (last is not None and now - last < self.window)
+
+    def join(self, chat_id: int, mention: Dict, queued: int = 0) -> Optional[List[Dict]]:
+        """
+        Add a mention to the chat; returns None if it joined an open batch, else the mentions to answer: a new
+        open batch (is_open) to close() after the window, or just this mention to answer now
+        queued is how many updates of the chat are waiting or running, this one included
+        """
+        now: float = time.monotonic()
+        busy: bool = self.busy(chat_id, now, queued)
+        self.last_mention_at[chat_id] = now
+        batch: Optional[List[Dict]] = self.batches.get(chat_id)
+        if batch is not None:
+            batch.append(mention)
+            self.batched += 1
+            return None
+        batch = [mention]
+        if self.window > 0 and busy:
+            self.batches[chat_id] = batch
+        else:
+            self.completions += 1
+        return batch
+
+    async def close(self, chat_id: int) -> List[Dict]:
+        """Wait out the window, then stop accepting mentions for the chat's batch and return it"""
+        log_name: str = f"{FILE_NAME}: MentionBatcher.close"
+        await asyncio.sleep(self.window)
+        batch: List[Dict] = self.batches.pop(chat_id, [])
+        self.completions += 1
+        debug_bot.log(
+            log_name, f"chat_id={chat_id} batch={len(batch)} completions={self.completions} batched={self.batched}"
+        )
+        return batch
+
+
+mention_batcher = MentionBatcher()
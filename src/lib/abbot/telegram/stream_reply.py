@@ -0,0 +1,91 @@
+import asyncio
+from time import monotonic
+from typing import Dict, Optional, Tuple
+
+from telegram import Message
+from telegram.constants import ParseMode
+from telegram.error import BadRequest, RetryAfter
+
+from lib.logger import debug_bot, error_bot
+from lib.utils import try_get
+from lib.abbot.core import Abbot
+from lib.db.answer_cache import answer_cache
+
+FILE_NAME = __name__
+
+# telegram allows roughly one edit per second per chat and 20 per minute in groups
+STREAM_EDIT_INTERVAL: float = 1.5
+STREAM_PLACEHOLDER: str = "..."
+STREAM_FAILED: str = "Sorry, something went wrong while answering. Please try again."
+
+
+async def edit_reply(reply: Message, text: str, **kwargs) -> Optional[float]:
+    """Edit the streamed reply; returns how long to hold off further edits if telegram rate limited us"""
+    log_name: str = f"{FILE_NAME}: edit_reply"
+    try:
+        await reply.edit_text(text, **kwargs)
+    except RetryAfter as retry_after:
+        debug_bot.log(log_name, f"retry_after={retry_after.retry_after}")
+        return float(retry_after.retry_after)
+    except BadRequest as bad_request:
+        if "not modified" not in str(bad_request).lower():
+            error_bot.log(log_name, f"{bad_request}")
+    return None
+
+
+async def stream_reply(
+    message: Message, abbot: Abbot, edit_interval: float = STREAM_EDIT_INTERVAL
+) -> Tuple[Message, str, int, int, int]:
+    """
+    Reply with a placeholder right away and edit it as abbot's answer streams in, at most once per edit_interval
+    The first chunk is shown as soon as it arrives. Returns the reply message plus abbot.completion, so the
+    caller can bill the turn and then settle the final text with finish_reply
+    """
+    reply: Message = await message.reply_text(STREAM_PLACEHOLDER)
+    next_edit: float = 0.0
+    try:
+        async for text in abbot.stream_completion():
+            if monotonic() < next_edit:
+                continue
+            hold_off: Optional[float] = await edit_reply(reply, text)
+            next_edit = monotonic() + max(edit_interval, hold_off or 0.0)
+    except Exception as exception:
+        await edit_reply(reply, getattr(exception, "reply", STREAM_FAILED))
+        raise
+    return (reply, *abbot.completion)
+
+
+async def answer_reply(
+    message: Message, abbot: Abbot, question: str, use_cache: bool = False
+) -> Tuple[Message, str, int, int, bool]:
+    """
+    stream_reply, unless use_cache and answer_cache already holds an answer to an equivalent question asked in
+    this chat. Only groups opt in: a dm's answers are built from private history and are never cached
+    Returns the reply, the answer, its input/output tokens and whether it came from the cache, so the caller
+    can bill a hit at the reduced ANSWER_CACHE_COST_MULT rate of the model that generated it (abbot.billing_model)
+    """
+    system_prompt: str = try_get(abbot.context.system, "content", default="")
+    cached: Optional[Dict] = await answer_cache.lookup(question, system_prompt, abbot.id) if use_cache else None
+    if cached:
+        reply: Message = await message.reply_text(STREAM_PLACEHOLDER)
+        answer, input_tokens, output_tokens, _ = abbot.cached_completion(
+            cached["answer"], cached["input_tokens"], cached["output_tokens"], try_get(cached, "model")
+        )
+        return reply, answer, input_tokens, output_tokens, True
+    reply, answer, input_tokens, output_tokens, _ = await stream_reply(message, abbot)
+    if use_cache:
+        await answer_cache.store(question, system_prompt, abbot.id, answer, input_tokens, output_tokens, abbot.model)
+    return reply, answer, input_tokens, output_tokens, False
+
+
+async def finish_reply(reply: Message, answer: str) -> None:
+    """Settle the streamed reply on the final answer, formatted the way a one-shot reply would be"""
+    text: str = answer or STREAM_FAILED
+    kwargs: Dict = {}
+    if "`" in text:
+        text = f"`{text}`"
+        kwargs = {"parse_mode": ParseMode.MARKDOWN_V2, "disable_web_page_preview": True}
+    hold_off: Optional[float] = await edit_reply(reply, text, **kwargs)
+    if hold_off:
+        await asyncio.sleep(hold_off)
+        await edit_reply(reply, text, **kwargs)
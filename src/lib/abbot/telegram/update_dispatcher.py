@@ -0,0 +1,127 @@
+import asyncio
+import time
+from collections import Counter
+from inspect import CORO_CREATED, getcoroutinestate
+from typing import Any, Awaitable, Dict, Optional
+
+from telegram.ext import BaseUpdateProcessor
+
+from lib.logger import debug_bot, error_bot
+
+FILE_NAME = __name__
+
+# handlers running at once across every chat
+UPDATE_MAX_WORKERS: int = 32
+# updates a single chat may have waiting or running; past this the chat's new updates are dropped
+UPDATE_MAX_CHAT_DEPTH: int = 50
+# log the dispatcher metrics every this many processed updates
+UPDATE_METRICS_EVERY: int = 500
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """
+    Runs updates concurrently across chats but strictly in arrival order within a chat
+    Each update chains onto the previous update of its chat and only starts once that one finished, so history
+    and balance writes for a chat never race. Running handlers are capped at max_workers across all chats, and a
+    chat flooding the bot is cut off at max_depth queued updates instead of growing without bound. Updates
+    without a chat (e.g. poll answers) are not ordered
+    """
+
+    def __init__(self, max_workers: int = UPDATE_MAX_WORKERS, max_depth: int = UPDATE_MAX_CHAT_DEPTH):
+        super().__init__(max_concurrent_updates=max_workers)
+        self.max_workers: int = max_workers
+        self.max_depth: int = max_depth
+        self.workers: asyncio.Semaphore = asyncio.Semaphore(max_workers)
+        self.tails: Dict[int, asyncio.Future] = {}
+        self.depths: Dict[int, int] = {}
+        self.metrics: Counter = Counter()
+        self.peak_depth: int = 0
+        self.wait_seconds: float = 0.0
+
+    @staticmethod
+    def chat_key(update: object) -> Optional[int]:
+        chat: Any = getattr(update, "effective_chat", None)
+        return chat.id if chat else None
+
+    async def process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        """
+        Replaces the base class' global semaphore: an update has to claim its place in the chat's order
+        synchronously, before its first await, or two updates of one chat could swap places waiting for a worker
+        """
+        chat_id: Optional[int] = self.chat_key(update)
+        if chat_id is None:
+            self.metrics["unordered"] += 1
+            return await self.do_process_update(update, coroutine)
+        await self.ordered(chat_id, update, coroutine)
+
+    async def run_ordered(self, chat_id: int, coroutine: Awaitable[Any]) -> None:
+        """
+        Run work a handler finished off its own task (e.g. a batched mention answer) in the chat's order, as if it
+        were a new update arriving now; it is never dropped for depth. Call it from its own task, never from a
+        handler of the same chat, which would wait on itself
+        """
+        self.metrics["reentered"] += 1
+        await self.ordered(chat_id, None, coroutine, droppable=False)
+
+    def queued(self, chat_id: int) -> int:
+        """Updates of the chat waiting or running, including the caller's own"""
+        return self.depths.get(chat_id, 0)
+
+    async def ordered(self, chat_id: int, update: object, coroutine: Awaitable[Any], droppable: bool = True) -> None:
+        log_name: str = f"{FILE_NAME}: ChatOrderedUpdateProcessor.ordered"
+        depth: int = self.depths.get(chat_id, 0)
+        if droppable and depth >= self.max_depth:
+            coroutine.close()
+            self.metrics["dropped"] += 1
+            error_bot.log(log_name, f"chat_id={chat_id} queue full ({depth}), dropped update")
+            return
+        self.depths[chat_id] = depth + 1
+        self.peak_depth = max(self.peak_depth, depth + 1)
+        previous: Optional[asyncio.Future] = self.tails.get(chat_id)
+        done: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.tails[chat_id] = done
+        try:
+            if previous is not None:
+                queued: float = time.monotonic()
+                # asyncio.wait never cancels previous if this update is cancelled while waiting
+                await asyncio.wait([previous])
+                self.wait_seconds += time.monotonic() - queued
+            await self.do_process_update(update, coroutine)
+        finally:
+            if getcoroutinestate(coroutine) == CORO_CREATED:
+                coroutine.close()
+            done.set_result(None)
+            self.depths[chat_id] -= 1
+            if not self.depths[chat_id]:
+                del self.depths[chat_id]
+                del self.tails[chat_id]
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        log_name: str = f"{FILE_NAME}: ChatOrderedUpdateProcessor.do_process_update"
+        async with self.workers:
+            try:
+                await coroutine
+                self.metrics["processed"] += 1
+            except Exception as exception:
+                self.metrics["failed"] += 1
+                error_bot.log(log_name, f"update failed: {exception}")
+        if not sum(self.metrics[outcome] for outcome in ("processed", "failed")) % UPDATE_METRICS_EVERY:
+            debug_bot.log(log_name, f"{self.stats()}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.metrics,
+            "active_chats": len(self.depths),
+            "queued": sum(self.depths.values()),
+            "peak_depth": self.peak_depth,
+            "wait_seconds": round(self.wait_seconds, 3),
+        }
+
+    async def initialize(self) -> None:
+        debug_bot.log(
+            f"{FILE_NAME}: ChatOrderedUpdateProcessor.initialize",
+            f"max_workers={self.max_workers} max_depth={self.max_depth}",
+        )
+
+    async def shutdown(self) -> None:
+        debug_bot.log(f"{FILE_NAME}: ChatOrderedUpdateProcessor.shutdown", f"{self.stats()}")
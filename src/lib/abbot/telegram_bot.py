@@ -5,12 +5,20 @@ import uuid
 import traceback
 
 from datetime import datetime
+from functools import partial
 from typing import Any, Dict, List, Optional
 
 # packages
 from telegram import Bot, CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup, Update, Message, Chat, User
 from telegram.constants import MessageEntityType, ParseMode
-from telegram.ext import ApplicationBuilder, ContextTypes, CommandHandler, MessageHandler, CallbackQueryHandler
+from telegram.ext import (
+    Application,
+    ApplicationBuilder,
+    ContextTypes,
+    CommandHandler,
+    MessageHandler,
+    CallbackQueryHandler,
+)
 from telegram.ext.filters import ChatType, StatusUpdate, Regex, Entity, Mention, UpdateFilter, UpdateType, REPLY, TEXT
 
 """
@@ -51,10 +59,6 @@ from ..abbot.config import (
     BOT_TELEGRAM_SUPPORT_CONTACT,
     BOT_TELEGRAM_USERNAME,
     BOT_SYSTEM_OBJECT_DMS,
-    ORG_INPUT_TOKEN_COST,
-    ORG_OUTPUT_TOKEN_COST,
-    ORG_PER_TOKEN_COST_DIV,
-    ORG_TOKEN_COST_MULT,
 )
 
 MARKDOWN_V2 = ParseMode.MARKDOWN_V2
@@ -76,11 +80,26 @@ MESSAGE_OR_EDITED = UpdateType.MESSAGES
 # local
 from ..logger import debug_bot, error_bot
 from ..utils import error, qr_code, success, try_get, successful
-from ..db.mongo import TelegramDM, TelegramGroup, mongo_abbot
-from ..abbot.core import Abbot
+from ..db.mongo import (
+    CONTEXT_FIELDS,
+    GROUP_STATE_FIELDS,
+    GROUP_TURN_FIELDS,
+    HISTORY_WINDOW,
+    TelegramDM,
+    TelegramGroup,
+    TelegramMessage,
+)
+from ..db.mongo_async import async_mongo_abbot
+from ..db.archive import history_archiver
+from ..db.buffer import group_message_buffer
+from ..db.cache import group_state_cache
+from ..db.answer_cache import ANSWER_CACHE_COST_MULT, cache_enabled
+from ..abbot.billing import billing
+from ..abbot.core import Abbot, model_cost_usd
+from ..abbot.llm import LLMBusyException, LLMUnavailableException
+from ..abbot.context import lifetime_history_len
 from ..abbot.utils import (
     bot_squawk,
-    calculate_tokens,
     parse_group_chat_data,
     parse_dm_chat_data,
     parse_message_data,
@@ -88,16 +107,25 @@ from ..abbot.utils import (
     parse_user_data,
     parse_update_data,
 )
-from ..payments import Coinbase, CoinbasePrice, init_payment_processor, init_price_provider
+from ..invoice_watcher import InvoiceWatcher, WatchedInvoice
+from ..payments import Strike, init_payment_processor
+from ..price_oracle import PriceUnavailableException, price_oracle
+from ..api.strike_webhook import StrikeWebhook
+from ..abbot.env import STRIKE_WEBHOOK_PORT, STRIKE_WEBHOOK_SECRET, STRIKE_WEBHOOK_URL
 from ..abbot.exceptions.exception import AbbotException
 from ..abbot.telegram.filter_abbot_reply import FilterAbbotReply
+from ..abbot.telegram.stream_reply import answer_reply, finish_reply
+from ..abbot.telegram.mention_batch import MENTION_BATCH_PROMPT, mention_batcher
+from ..abbot.telegram.update_dispatcher import ChatOrderedUpdateProcessor
 
 payment_processor = init_payment_processor()
-price_provider: Coinbase = init_price_provider()
-
-import tiktoken
+invoice_watcher = InvoiceWatcher(payment_processor)
+strike_webhook: Optional[StrikeWebhook] = (
+    StrikeWebhook(STRIKE_WEBHOOK_SECRET, payment_processor, invoice_watcher)
+    if STRIKE_WEBHOOK_SECRET and isinstance(payment_processor, Strike)
+    else None
+)
 
-encoding = tiktoken.encoding_for_model(OPENAI_MODEL)
 FILE_NAME = __name__
 no_group_error = "No group or group config"
 no_group_config_error = "No group config"
@@ -116,80 +144,96 @@ cancel_fail_msg = "Failed to cancel invoice"
 # ---------------------------------------------------------------------------------------
 
 
-async def get_live_price() -> int:
-    log_name: str = f"{FILE_NAME}: get_live_price"
-    response: Dict[CoinbasePrice] = await price_provider.get_bitcoin_price()
-    debug_bot.log(log_name, f"response={response}")
-    data = try_get(response, "data")
-    amount = try_get(data, "amount")
-    if not data or not amount:
-        error_message = try_get(response, "msg")
-        error_data = try_get(response, "data")
-        error_bot.log(log_name, f"response={response} error_message={error_message} error_data={error_data}")
-        return error(error_message, data=error_data)
-    debug_bot.log(log_name, f"data={data} \n amount={amount}")
-    return int(amount)
-
-
 async def usd_to_sat(usd_amount: int) -> int:
-    price_dict: Dict[CoinbasePrice] = mongo_abbot.find_prices()[-1]
-    btc_price_usd: int = try_get(price_dict, "amount")
-    if btc_price_usd:
-        if type(btc_price_usd) != int:
-            btc_price_usd: int = int(btc_price_usd)
-    else:
-        btc_price_usd: int = await get_live_price()
-    amount = int((usd_amount / int(btc_price_usd)) * SATOSHIS_PER_BTC)
+    btc_price_usd: float = await price_oracle.current()
+    amount = int((usd_amount / btc_price_usd) * SATOSHIS_PER_BTC)
     if amount <= 0:
         amount = 2500
     return amount
 
 
 async def sat_to_usd(sats_amount: int) -> int:
-    price_dict: Dict[CoinbasePrice] = mongo_abbot.find_prices()[-1]
-    btc_price_usd: int = try_get(price_dict, "amount")
-    if btc_price_usd:
-        if type(btc_price_usd) != int:
-            btc_price_usd: int = int(btc_price_usd)
-    else:
-        btc_price_usd: int = await get_live_price()
-    amount = round(float((sats_amount / SATOSHIS_PER_BTC) * int(btc_price_usd)), 2)
+    btc_price_usd: float = await price_oracle.current()
+    amount = round(float((sats_amount / SATOSHIS_PER_BTC) * btc_price_usd), 2)
     if amount <= 0:
         amount = 1
     return amount
 
 
-async def recalc_balance_sats(in_token_count: int, out_token_count: int, current_balance: int, bot: Bot):
+async def quote_cost_sats(
+    in_token_count: int,
+    out_token_count: int,
+    cost_mult: float = 1.0,
+    model: str = OPENAI_MODEL,
+) -> Dict:
+    """Price a turn in sats at the latest BTCUSD price: success(data=cost_sats, btcusd_price=price)"""
     try:
-        log_name: str = f"{FILE_NAME}: recalc_balance_sats"
-        btcusd_doc = mongo_abbot.find_prices()[-1]
-        debug_bot.log(log_name, f"btcusd_doc={btcusd_doc}")
-
-        timestamp: int = try_get(btcusd_doc, "_id", default=0)
-        debug_bot.log(log_name, f"timestamp={timestamp}")
-
-        btcusd_price: float = try_get(btcusd_doc, "amount")
-        debug_bot.log(log_name, f"btcusd_price={btcusd_price}")
-
-        now: int = int(time.time())
-        debug_bot.log(log_name, f"now={now}")
-        if btcusd_doc or now - timestamp >= 900:
-            debug_bot.log(log_name, f"now - timestamp={now - timestamp}")
-            btcusd_price: int = await get_live_price()
-        btcusd_price = float(btcusd_price)
-
-        cost_input_tokens = (in_token_count / ORG_PER_TOKEN_COST_DIV) * (ORG_INPUT_TOKEN_COST * ORG_TOKEN_COST_MULT)
-        cost_output_tokens = (out_token_count / ORG_PER_TOKEN_COST_DIV) * (ORG_OUTPUT_TOKEN_COST * ORG_TOKEN_COST_MULT)
-        total_token_cost_usd = cost_input_tokens + cost_output_tokens
+        log_name: str = f"{FILE_NAME}: quote_cost_sats"
+        btcusd_price: float = await price_oracle.current()
+        debug_bot.log(log_name, f"btcusd_price={btcusd_price} age={price_oracle.age:.0f}s")
+
+        total_token_cost_usd = model_cost_usd(model, in_token_count, out_token_count) * cost_mult
         total_token_cost_sats = (total_token_cost_usd / btcusd_price) * SATOSHIS_PER_BTC
-        if total_token_cost_sats > current_balance or current_balance == 0:
-            return 0
-        remaining_balance_sats = current_balance - total_token_cost_sats
-        return success(data=int(remaining_balance_sats), cost_sats=int(total_token_cost_sats))
+        return success(data=int(total_token_cost_sats), btcusd_price=btcusd_price)
     except AbbotException as abbot_exception:
         raise abbot_exception
 
 
+async def charge_group(
+    context: ContextTypes.DEFAULT_TYPE,
+    chat_id: int,
+    chat_title: str,
+    abbot: Abbot,
+    input_tokens: int,
+    output_tokens: int,
+    reason: str,
+    cost_mult: float = 1.0,
+    askers: Optional[List[Dict]] = None,
+) -> Dict:
+    """
+    Bill a turn to the group: quote it, then debit it through the ledger with an atomic, conditional $inc
+    askers, for a turn answering several users, splits the debit across them in the ledger entry
+    Returns the billing.debit response; its "drained" is True once the group is out of sats
+    """
+    log_name: str = f"{FILE_NAME}: charge_group"
+    try:
+        quote: Dict = await quote_cost_sats(input_tokens, output_tokens, cost_mult, abbot.billing_model)
+    except PriceUnavailableException as price_exception:
+        # the answer is already out; leave the turn unbilled rather than lose it, and flag it for a manual charge
+        unbilled = f"{log_name}: {price_exception}, turn left unbilled: group_id={chat_id} group_title={chat_title} "
+        unbilled = f"{unbilled}reason={reason} model={abbot.billing_model} tokens={input_tokens}/{output_tokens}"
+        error_bot.log(log_name, unbilled)
+        await context.bot.send_message(chat_id=ABBOT_SQUAWKS, text=unbilled)
+        return error("No BTCUSD price to bill the turn at", debited=0)
+    cost_sats: int = try_get(quote, "data", default=0)
+    response: Dict = await billing.debit(
+        chat_id,
+        cost_sats,
+        input_tokens,
+        output_tokens,
+        abbot.billing_model,
+        try_get(quote, "btcusd_price"),
+        cost_mult,
+        reason,
+        askers,
+    )
+    debug_bot.log(log_name, f"cost_sats={cost_sats} response={response}")
+    if try_get(response, "drained"):
+        abbot_squawk = f"Group balance: {try_get(response, 'data')}\n\ngroup_id={chat_id}\ngroup_title={chat_title}"
+        debug_bot.log(log_name, abbot_squawk)
+        await context.bot.send_message(chat_id=ABBOT_SQUAWKS, text=abbot_squawk)
+    return response
+
+
+def turn_update(abbot: Abbot, assistant_history_update: Dict) -> Dict:
+    """The group update closing a turn: the answer pushed to history, plus the rolling summary if it changed"""
+    update: Dict = {"$push": {"history": assistant_history_update}}
+    summary_update: Dict = abbot.summary_update()
+    if summary_update:
+        update["$set"] = summary_update
+    return update
+
+
 # def escape_markdown_v2(text):
 #     return "".join("\\" + char if char in ESCAPE_MARKDOWN_V2_CHARS else char for char in text)
 
@@ -237,7 +281,6 @@ async def handle_group_adds_abbot(update: Update, context: ContextTypes.DEFAULT_
                 return debug_bot.log(log_name, "Abbot not added to group")
         chat_id_filter = {"id": chat_id}
         default_history = [BOT_SYSTEM_OBJECT_GROUPS]
-        token_count: int = calculate_tokens(default_history)
         group_update = {
             "$set": {
                 "id": chat_id,
@@ -249,13 +292,14 @@ async def handle_group_adds_abbot(update: Update, context: ContextTypes.DEFAULT_
                 "messages": [],
                 "history": default_history,
                 "config": BOT_GROUP_CONFIG_DEFAULT,
-                "tokens": token_count,
             }
         }
-        group: TelegramGroup = mongo_abbot.group_does_exist(chat_id_filter)
+        group: TelegramGroup = await group_state_cache.group_does_exist(chat_id_filter)
         if group:
             group_update = {"$set": {"title": chat_title, "id": chat_id, "type": chat_type, "admins": group_admins}}
-        group: TelegramGroup = mongo_abbot.find_one_group_and_update(chat_id_filter, group_update)
+        group: TelegramGroup = await group_state_cache.find_one_group_and_update(
+            chat_id_filter, group_update, fields=GROUP_STATE_FIELDS
+        )
         debug_bot.log(log_name, f"group={group}")
         await context.bot.send_message(
             chat_id=ABBOT_SQUAWKS, text=f"{log_name}: Abbot added to new group: title={chat_title}, id={chat_id})"
@@ -382,10 +426,11 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
             debug_bot.log(log_name, f"admins={admins}")
 
         chat_id_filter = {"id": chat_id}
-        new_message_dict = message.to_dict()
+        await group_message_buffer.flush(chat_id)
+        new_message_dict = TelegramMessage(message).to_dict()
         intro_history_dict = {"role": "assistant", "content": INTRODUCTION}
         new_history_dict = {"role": "user", "content": f"@{username} said: {message_text}"}
-        group_exists: bool = mongo_abbot.group_does_exist(chat_id_filter)
+        group_exists: bool = await group_state_cache.group_does_exist(chat_id_filter)
         debug_bot.log(log_name, f"group_exists={group_exists}")
         if not group_exists:
             group_update = {
@@ -401,7 +446,9 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     "config": BOT_GROUP_CONFIG_STARTED_UNLEASHED,
                 }
             }
-            group: TelegramGroup = mongo_abbot.find_one_group_and_update(chat_id_filter, group_update)
+            group: TelegramGroup = await group_state_cache.find_one_group_and_update(
+                chat_id_filter, group_update, fields=GROUP_STATE_FIELDS
+            )
             debug_bot.log(log_name, f"group={group}")
         else:
             group_update = {
@@ -418,7 +465,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 },
             }
 
-        group_config: Dict = mongo_abbot.get_group_config(chat_id_filter)
+        group_config: Dict = await group_state_cache.get_group_config(chat_id_filter)
         debug_bot.log(log_name, f"group_config={group_config}")
         started: Dict = try_get(group_config, "started")
         if started:
@@ -429,7 +476,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return await message.reply_markdown_v2(already_started, disable_web_page_preview=True)
         debug_bot.log(log_name, f"started={started}")
 
-        current_sats: TelegramGroup = mongo_abbot.get_group_balance(chat_id_filter)
+        current_sats: TelegramGroup = await group_state_cache.get_group_balance(chat_id_filter)
         if current_sats == 0:
             group_msg = f"⚡️ Group: {chat_title} ⚡️ "
             sats_balance_msg = f"⚡️ SATs Balance: {current_sats} ⚡️"
@@ -443,39 +490,26 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         debug_bot.log(log_name, f"introduced={introduced}")
         if introduced:
             group_history: List[Dict] = try_get(group, "group_history")
-            abbot = Abbot(chat_id, "group", group_history)
-            answer, input_tokens, output_tokens, _ = abbot.chat_completion()
-
-            response: Dict = await recalc_balance_sats(input_tokens, output_tokens, current_sats, context.bot)
-            sats_remaining: int = try_get(response, "data")
-            if not successful(response):
-                sub_log_name = f"{log_name}: recalc_balance_sats"
-                error_bot.log(log_name, f"response={response}")
-                msg = f"{sub_log_name}: Failed to calculate remaining sats"
-                error_bot.log(log_name, msg)
-                error_bot.log(log_name, f"current_sats={current_sats}\nresponse={response}")
-                error_bot.log(log_name, f"chat_id={chat_id}\nchat_title={chat_title}")
-                await context.bot.send_message(chat_id=ABBOT_SQUAWKS, text=msg)
-
-            if not sats_remaining and current_sats > 0:
-                sats_remaining = current_sats - 250
-            else:
-                sats_remaining = 0
-                abbot_squawk = f"Group balance: {current_sats}\n\ngroup_id={chat_id}\ngroup_title={chat_title}"
+            abbot = Abbot(
+                chat_id,
+                "group",
+                group_history,
+                lifetime_history_len(group),
+                try_get(group, "summary"),
+                try_get(group, "tokens"),
+            )
+            abbot.route("start", current_sats)
+            answer, input_tokens, output_tokens, _ = await abbot.chat_completion()
+
+            response: Dict = await charge_group(
+                context, chat_id, chat_title, abbot, input_tokens, output_tokens, "start"
+            )
+            if try_get(response, "drained"):
                 answer = f"{answer}\n\n Note: You group is now out of SATs. Please run /fund to topup."
-                debug_bot.log(log_name, abbot_squawk)
-                await context.bot.send_message(chat_id=ABBOT_SQUAWKS, text=abbot_squawk)
-            debug_bot.log(log_name, f"sats_remaining={sats_remaining}")
 
             assistant_history_update = {"role": "assistant", "content": answer}
-            group_history = abbot.get_history()
-            token_count: int = calculate_tokens(group_history)
-            group: TelegramGroup = mongo_abbot.find_one_group_and_update(
-                chat_id_filter,
-                {
-                    "$set": {"balance": sats_remaining, "tokens": token_count},
-                    "$push": {"history": assistant_history_update},
-                },
+            group: TelegramGroup = await group_state_cache.find_one_group_and_update(
+                chat_id_filter, turn_update(abbot, assistant_history_update), fields=["balance"]
             )
             debug_bot.log(log_name, f"group={group}")
             await message.reply_text(answer)
@@ -483,6 +517,9 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await message.reply_photo(MATRIX_IMG_FILEPATH, f"Please wait while {BOT_NAME} is unplugged from the Matrix")
         time.sleep(3)
         await message.reply_markdown_v2(INTRODUCTION, disable_web_page_preview=True)
+    except (LLMBusyException, LLMUnavailableException) as llm_exception:
+        error_bot.log(log_name, f"{llm_exception}")
+        await message.reply_text(llm_exception.reply)
     except AbbotException as abbot_exception:
         await bot_squawk(f"{log_name}: {abbot_exception}", context)
 
@@ -516,9 +553,10 @@ async def stop(update: Update, context: ContextTypes.DEFAULT_TYPE):
         debug_bot.log(log_name, f"user={user}")
 
         chat_id_filter = {"id": chat_id}
-        new_message_dict = message.to_dict()
+        await group_message_buffer.flush(chat_id)
+        new_message_dict = TelegramMessage(message).to_dict()
         new_history_dict = {"role": "user", "content": f"@{username} said: {message_text}"}
-        group_exists: bool = mongo_abbot.group_does_exist(chat_id_filter)
+        group_exists: bool = await group_state_cache.group_does_exist(chat_id_filter)
         if not group_exists:
             group_dne_err = f"Group chat not onboarded"
             reply_msg = f"Did you run /start?"
@@ -527,7 +565,7 @@ async def stop(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return await context.bot.send_message(chat_id=ABBOT_SQUAWKS, text=group_dne_err)
         debug_bot.log(log_name, f"group_exists={group_exists}")
 
-        group: TelegramGroup = mongo_abbot.find_one_group_and_update(
+        group: TelegramGroup = await group_state_cache.find_one_group_and_update(
             chat_id_filter,
             {
                 "$set": {
@@ -541,6 +579,7 @@ async def stop(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     "history": new_history_dict,
                 },
             },
+            fields=["config"],
         )
         debug_bot.log(log_name, f"group={group}")
 
@@ -576,12 +615,10 @@ async def balance(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return await message.reply_text("/balance is disabled in DMs. Feel free to chat at will!")
 
         chat_id_filter = {"id": chat_id}
-        group: TelegramGroup = mongo_abbot.find_one_group(chat_id_filter)
-
-        group_balance = try_get(group, "balance", default=0)
+        group_balance = await group_state_cache.get_group_balance(chat_id_filter) or 0
         if group_balance and type(group_balance) == float:
-            group: TelegramGroup = mongo_abbot.find_one_dm_and_update(
-                chat_id_filter, {"$set": {"balance": int(group_balance)}}
+            group: TelegramGroup = await group_state_cache.find_one_group_and_update(
+                chat_id_filter, {"$set": {"balance": int(group_balance)}}, fields=["balance"]
             )
             group_balance = try_get(group, "balance", default=0)
         usd_balance = await sat_to_usd(group_balance)
@@ -590,6 +627,9 @@ async def balance(update: Update, context: ContextTypes.DEFAULT_TYPE):
         usd_balance_msg = f"💰 *USD Balance*\: {usd_balance} USD 💰"
         balance_msg = f"{group_msg}\n{sats_balance_msg}\n{usd_balance_msg}".replace(".", "\.")
         return await message.reply_markdown_v2(balance_msg)
+    except PriceUnavailableException as price_exception:
+        error_bot.log(log_name, f"{price_exception}")
+        await message.reply_text(price_exception.reply)
     except AbbotException as abbot_exception:
         await bot_squawk(f"{log_name}: {abbot_exception}", context)
 
@@ -629,18 +669,18 @@ async def unleash(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return await message.reply_text(reply_msg)
 
         chat_id_filter = {"id": chat_id}
-        group: TelegramGroup = mongo_abbot.find_one_group(chat_id_filter)
+        group: TelegramGroup = await group_state_cache.get_group_state(chat_id_filter)
         if not group:
             return await message.reply_text(f"{no_group_error} - Did you run /start{BOT_TELEGRAM_HANDLE}?")
         current_sats: int = try_get(group, "balance")
         if current_sats == 0:
             return await message.reply_text(f"You group SAT balance is 0. Please run /fund to topup.")
-        group_config: Dict = mongo_abbot.get_group_config(chat_id_filter)
+        group_config: Dict = try_get(group, "config")
         unleashed: bool = try_get(group_config, "unleashed")
         count: bool = try_get(group_config, "count")
         if not unleashed:
-            group: TelegramGroup = mongo_abbot.find_one_group_and_update(
-                chat_id_filter, {"$set": {"config.unleashed": True, "config.count": arg_count}}
+            group: TelegramGroup = await group_state_cache.find_one_group_and_update(
+                chat_id_filter, {"$set": {"config.unleashed": True, "config.count": arg_count}}, fields=["config"]
             )
 
         await message.reply_text(f"Abbot has been unleashed to respond every {arg_count} messages")
@@ -665,14 +705,13 @@ async def leash(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return await message.reply_text("/leash is disabled in DMs. Feel free to chat at will!")
 
         chat_id_filter = {"id": chat_id}
-        group: TelegramGroup = mongo_abbot.find_one_group(chat_id_filter)
-        if not group:
+        group_config: Dict = await group_state_cache.get_group_config(chat_id_filter)
+        if not group_config:
             return await message.reply_text(f"{no_group_error} - Did you run /start{BOT_TELEGRAM_HANDLE}?")
-        group_config: Dict = mongo_abbot.get_group_config(chat_id_filter)
         unleashed: bool = try_get(group_config, "unleashed")
         if unleashed:
-            group: TelegramGroup = mongo_abbot.find_one_group_and_update(
-                chat_id_filter, {"$set": {"config.unleashed": False, "config.count": 0}}
+            group: TelegramGroup = await group_state_cache.find_one_group_and_update(
+                chat_id_filter, {"$set": {"config.unleashed": False, "config.count": 0}}, fields=["config"]
             )
 
         await message.reply_text(f"Abbot has been leashed to not respond on message count")
@@ -680,6 +719,45 @@ async def leash(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await bot_squawk(f"{log_name}: {abbot_exception}", context)
 
 
+async def cache(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    try:
+        log_name: str = f"{FILE_NAME}: cache"
+        response: Dict = await parse_update_data(update, context)
+        if not successful(response):
+            debug_bot.log(log_name, f"Failed to parse_update_data response={response}")
+
+        update_data: Dict = try_get(response, "data")
+        debug_bot.log(log_name, f"update_data={update_data}")
+
+        message: Message = try_get(update_data, "message")
+        chat: Chat = try_get(update_data, "chat")
+        chat_id, _, chat_type = parse_group_chat_data(chat)
+        if chat_type == "private":
+            return await message.reply_text("/cache is disabled in DMs")
+
+        chat_id_filter = {"id": chat_id}
+        group_config: Dict = await group_state_cache.get_group_config(chat_id_filter)
+        if not group_config:
+            return await message.reply_text(f"{no_group_error} - Did you run /start{BOT_TELEGRAM_HANDLE}?")
+        args: List[str] = try_get(context, "args", default=[]) or []
+        if not args:
+            state: str = "on" if cache_enabled(group_config) else "off"
+            return await message.reply_text(f"Answer cache is {state}. Use /cache on or /cache off to change it")
+        if args[0].lower() not in ("on", "off"):
+            return await message.reply_text("Usage: /cache on or /cache off")
+        enabled: bool = args[0].lower() == "on"
+        await group_state_cache.find_one_group_and_update(
+            chat_id_filter, {"$set": {"config.answer_cache": enabled}}, fields=["config"]
+        )
+        if enabled:
+            return await message.reply_text(
+                "Answer cache on: common questions are answered from the cache at a discount"
+            )
+        await message.reply_text("Answer cache off: every question gets a fresh answer and none is cached")
+    except AbbotException as abbot_exception:
+        await bot_squawk(f"{log_name}: {abbot_exception}", context)
+
+
 async def status(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         log_name: str = f"{FILE_NAME}: status"
@@ -700,7 +778,7 @@ async def status(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return await message.reply_text("/status is disabled in DMs. Feel free to chat at will!")
 
         chat_id_filter = {"id": chat_id}
-        group_config: Dict = mongo_abbot.get_group_config(chat_id_filter)
+        group_config: Dict = await group_state_cache.get_group_config(chat_id_filter)
         if not group_config:
             abbot_squawk = f"{log_name}: {no_group_config_error}:"
             error_msg = f"id={chat_id}, title={chat_title}, group_config={group_config}"
@@ -829,45 +907,54 @@ async def fund(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await message.reply_photo(photo=qr_code(invoice), caption=sanitize_md_v2(description), parse_mode=MARKDOWN_V2)
         await message.reply_markdown_v2(f"`{invoice}`")
 
-        cancel_squawk = f"{cancel_fail_msg}: description={description}, invoice_id={invoice_id}"
-        is_paid = False
-        while expiration_in_sec >= 0 and not is_paid:
-            debug_bot.log(log_name, f"expiration_in_sec={expiration_in_sec}")
-            if expiration_in_sec == 0:
-                debug_bot.log(log_name, f"expiration_in_sec == 0, cancelling invoice_id={invoice_id}")
-                cancelled = await payment_processor.expire_invoice(invoice_id)
-                debug_bot.log(log_name, f"cancelled={cancelled}")
-                if not cancelled:
-                    cancel_reply = (
-                        f"{cancel_fail_msg}: Try again or pay to abbot@atlbitlab.com and contact {THE_ARCHITECT_HANDLE}"
-                    )
-                    await context.bot.send_message(chat_id=THE_ARCHITECT_ID, text=cancel_squawk)
-                    return await message.reply_text(cancel_reply)
-            is_paid = await payment_processor.invoice_is_paid(invoice_id)
-            debug_bot.log(log_name, f"is_paid={is_paid}")
-            expiration_in_sec -= 1
-            if expiration_in_sec % 10 == 0:
-                await message.reply_text(f"🕰️ Invoice expires in: {expiration_in_sec} seconds\n")
-            time.sleep(1)
-
-        if is_paid:
-            group: TelegramGroup = mongo_abbot.find_one_group_and_update(
-                {"id": chat.id}, {"$inc": {"balance": balance}}
-            )
-            if not group:
-                error_bot.log(log_name, f"not group")
-                return await context.bot.send_message(chat_id=ABBOT_SQUAWKS, text=group)
-            balance: int = try_get(group, "balance", default=amount)
-            await message.reply_text(f"Invoice Paid! ⚡️ {chat_title} balance: {balance} sats ⚡️")
-        else:
-            keyboard = [[InlineKeyboardButton("Yes", callback_data="1"), InlineKeyboardButton("No", callback_data="2")]]
-            await context.bot.send_message(chat_id=THE_ARCHITECT_ID, text=cancel_squawk)
-            keyboard_markup = InlineKeyboardMarkup(keyboard)
-            await message.reply_text(f"Invoice expired! Try again?", reply_markup=keyboard_markup)
+        invoice_watcher.register(
+            invoice_id,
+            chat.id,
+            balance,
+            expiration_in_sec,
+            partial(invoice_paid, context.bot, message),
+            partial(invoice_expired, context.bot, message),
+            chat_title=chat_title,
+            description=description,
+        )
+        debug_bot.log(log_name, f"watching invoice_id={invoice_id} expiration_in_sec={expiration_in_sec}")
+    except PriceUnavailableException as price_exception:
+        error_bot.log(log_name, f"{price_exception}")
+        await message.reply_text(price_exception.reply)
     except AbbotException as abbot_exception:
         await bot_squawk(f"{log_name}: {abbot_exception}", context)
 
 
+async def invoice_paid(bot: Bot, message: Message, invoice: WatchedInvoice):
+    """invoice_watcher callback: credit the group through the ledger and tell the chat"""
+    log_name: str = f"{FILE_NAME}: invoice_paid"
+    response: Dict = await billing.credit(invoice.chat_id, invoice.sats, invoice.invoice_id)
+    debug_bot.log(log_name, f"invoice_id={invoice.invoice_id} response={response}")
+    if try_get(response, "duplicate"):
+        return
+    if not successful(response):
+        error_bot.log(log_name, f"response={response}")
+        return await bot.send_message(chat_id=ABBOT_SQUAWKS, text=f"{log_name}: {response}")
+    balance: int = try_get(response, "data", default=invoice.sats)
+    chat_title: str = try_get(invoice.meta, "chat_title")
+    await message.reply_text(f"Invoice Paid! ⚡️ {chat_title} balance: {balance} sats ⚡️")
+
+
+async def invoice_expired(bot: Bot, message: Message, invoice: WatchedInvoice, cancelled: bool):
+    """invoice_watcher callback: offer to create a new invoice, or warn if the processor would not cancel it"""
+    log_name: str = f"{FILE_NAME}: invoice_expired"
+    description: str = try_get(invoice.meta, "description")
+    cancel_squawk = f"{cancel_fail_msg}: description={description}, invoice_id={invoice.invoice_id}"
+    debug_bot.log(log_name, f"invoice_id={invoice.invoice_id} cancelled={cancelled}")
+    await bot.send_message(chat_id=THE_ARCHITECT_ID, text=cancel_squawk)
+    if not cancelled:
+        cancel_reply = f"{cancel_fail_msg}: Try again or pay to abbot@atlbitlab.com and contact {THE_ARCHITECT_HANDLE}"
+        return await message.reply_text(cancel_reply)
+    keyboard = [[InlineKeyboardButton("Yes", callback_data="1"), InlineKeyboardButton("No", callback_data="2")]]
+    keyboard_markup = InlineKeyboardMarkup(keyboard)
+    await message.reply_text(f"Invoice expired! Try again?", reply_markup=keyboard_markup)
+
+
 async def fund_button(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         log_name: str = f"{FILE_NAME}: fund_button"
@@ -968,9 +1055,10 @@ async def handle_group_mention(update: Update, context: ContextTypes.DEFAULT_TYP
             debug_bot.log(log_name, f"admins={admins}")
 
         chat_id_filter = {"id": chat_id}
+        await group_message_buffer.flush(chat_id)
         stopped_err = f"{BOT_NAME} not started - Please run /start{BOT_TELEGRAM_HANDLE}"
 
-        group: TelegramGroup = mongo_abbot.find_one_group(chat_id_filter)
+        group: TelegramGroup = await group_state_cache.get_group_state(chat_id_filter)
         group_config: Dict = try_get(group, "config")
         if not group or not group_config:
             abbot_squawk = f"{log_name}: {no_group_error}: id={chat_id}, title={chat_title}"
@@ -1005,8 +1093,8 @@ async def handle_group_mention(update: Update, context: ContextTypes.DEFAULT_TYP
         elif username and not message_date:
             new_history_dict = {"role": "user", "content": f"@{username} said: {message_text}"}
 
-        new_message_dict = message.to_dict()
-        group: TelegramGroup = mongo_abbot.find_one_group_and_update(
+        new_message_dict = TelegramMessage(message).to_dict()
+        group: TelegramGroup = await group_state_cache.find_one_group_and_update(
             chat_id_filter,
             {
                 "$set": {
@@ -1020,6 +1108,8 @@ async def handle_group_mention(update: Update, context: ContextTypes.DEFAULT_TYP
                     "history": new_history_dict,
                 },
             },
+            fields=GROUP_TURN_FIELDS,
+            history_limit=HISTORY_WINDOW,
         )
         group_history: List[Dict] = try_get(group, "history")
         if not group or not group_history:
@@ -1033,58 +1123,23 @@ async def handle_group_mention(update: Update, context: ContextTypes.DEFAULT_TYP
         debug_bot.log(log_name, f"group={group}")
         debug_bot.log(log_name, f"group_config={group_config}")
 
-        current_sats: TelegramGroup = mongo_abbot.get_group_balance(chat_id_filter)
+        current_sats: int = try_get(group, "balance")
         if current_sats == 0:
             group_no_sats_msg = f"Your group is out of SATs. To continue using {BOT_NAME}, topup using /fund"
             abbot_squawk = f"Group balance: {current_sats}\n\ngroup_id={chat_id}\ngroup_title={chat_title}"
             await context.bot.send_message(chat_id=ABBOT_SQUAWKS, text=abbot_squawk)
             return await message.reply_text(group_no_sats_msg)
 
-        abbot = Abbot(chat_id, "group", group_history)
-        answer, input_tokens, output_tokens, _ = abbot.chat_completion()
-
-        response: Dict = await recalc_balance_sats(input_tokens, output_tokens, current_sats, context.bot)
-        sats_remaining: int = try_get(response, "data")
-        if not successful(response):
-            sub_log_name = f"{log_name}: recalc_balance_sats"
-            error_bot.log(log_name, f"response={response}")
-            msg = f"{sub_log_name}: Failed to calculate remaining sats"
-            msg = f"{msg}: current_sats={current_sats}\nresponse={response}\nchat=(id={chat_id}\ntitle=({chat_title})"
-            error_bot.log(log_name, msg)
-            await context.bot.send_message(chat_id=ABBOT_SQUAWKS, text=msg)
-
-        if not sats_remaining:
-            sats_remaining = current_sats - 250
-
-        if sats_remaining == 0:
-            abbot_squawk = f"Group balance: {current_sats}\n\ngroup_id={chat_id}\ngroup_title={chat_title}"
-            answer = f"{answer}\n\n Note: You group is now out of SATs. Please run /fund to topup."
-            debug_bot.log(log_name, abbot_squawk)
-            await context.bot.send_message(chat_id=ABBOT_SQUAWKS, text=abbot_squawk)
-
-        debug_bot.log(log_name, f"sats_remaining={sats_remaining}")
-
-        assistant_history_update = {
-            "role": "assistant",
-            "content": answer,
-        }
-        group_history = abbot.get_history()
-        token_count: int = calculate_tokens(group_history)
-        group: TelegramGroup = mongo_abbot.find_one_group_and_update(
-            chat_id_filter,
-            {
-                "$set": {"balance": sats_remaining, "tokens": token_count},
-                "$push": {"history": assistant_history_update},
-            },
-        )
-
-        debug_bot.log(log_name, f"group={group}")
-
-        if "`" in answer:
-            answer = f"`{answer}`"
-            await message.reply_text(answer, parse_mode=MARKDOWN_V2, disable_web_page_preview=True)
-        else:
-            await message.reply_text(answer)
+        mention: Dict = {"message": message, "user_id": user_id, "username": username, "text": message_text}
+        processor: Any = context.application.update_processor
+        queued: int = processor.queued(chat_id) if isinstance(processor, ChatOrderedUpdateProcessor) else 0
+        mentions: Optional[List[Dict]] = mention_batcher.join(chat_id, mention, queued)
+        if mentions is None:
+            debug_bot.log(log_name, f"mention batched: chat_id={chat_id} username={username}")
+            return
+        if not mention_batcher.is_open(chat_id):
+            return await answer_group_mentions(context, chat_id, chat_title, group_config, mentions)
+        context.application.create_task(batch_group_mentions(context, chat_id, chat_title, group_config), update=update)
     except AbbotException as abbot_exception:
         await bot_squawk(f"{log_name}: {abbot_exception}", context)
 
@@ -1134,9 +1189,10 @@ async def handle_group_reply(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
         if replied_to_bot and replied_to_abbot:
             chat_id_filter = {"id": chat_id}
+            await group_message_buffer.flush(chat_id)
             stopped_err = f"{BOT_NAME} not started - Please run /start{BOT_TELEGRAM_HANDLE}"
 
-            group: TelegramGroup = mongo_abbot.find_one_group(chat_id_filter)
+            group: TelegramGroup = await group_state_cache.get_group_state(chat_id_filter)
             group_config: Dict = try_get(group, "config")
             started: bool = try_get(group_config, "started")
             debug_bot.log(log_name, f"started={started}")
@@ -1171,8 +1227,8 @@ async def handle_group_reply(update: Update, context: ContextTypes.DEFAULT_TYPE)
             elif username and not message_date:
                 new_history_dict = {"role": "user", "content": f"@{username} said: {message_text}"}
 
-            new_message_dict = message.to_dict()
-            group: TelegramGroup = mongo_abbot.find_one_group_and_update(
+            new_message_dict = TelegramMessage(message).to_dict()
+            group: TelegramGroup = await group_state_cache.find_one_group_and_update(
                 chat_id_filter,
                 {
                     "$set": {
@@ -1186,6 +1242,8 @@ async def handle_group_reply(update: Update, context: ContextTypes.DEFAULT_TYPE)
                         "history": new_history_dict,
                     },
                 },
+                fields=GROUP_TURN_FIELDS,
+                history_limit=HISTORY_WINDOW,
             )
             group_history: List[Dict] = try_get(group, "history")
             if not group or not group_history:
@@ -1199,59 +1257,119 @@ async def handle_group_reply(update: Update, context: ContextTypes.DEFAULT_TYPE)
             debug_bot.log(log_name, f"new group={group}")
             debug_bot.log(log_name, f"new group_config={group_config}")
 
-            current_sats: TelegramGroup = mongo_abbot.get_group_balance(chat_id_filter)
+            current_sats: int = try_get(group, "balance")
             if current_sats == 0:
                 group_no_sats_msg = f"Your group is out of SATs. To continue using {BOT_NAME}, topup using /fund"
                 abbot_squawk = f"Group balance: {current_sats}\n\ngroup_id={chat_id}\ngroup_title={chat_title}"
                 await context.bot.send_message(chat_id=ABBOT_SQUAWKS, text=abbot_squawk)
                 return await message.reply_text(group_no_sats_msg)
 
-            abbot = Abbot(chat_id, "group", group_history)
-            answer, input_tokens, output_tokens, _ = abbot.chat_completion()
-
-            response: Dict = await recalc_balance_sats(input_tokens, output_tokens, current_sats, context.bot)
-            sats_remaining: int = try_get(response, "data")
-            cost_sats: int = try_get(response, "cost_sats")
-            debug_bot.log(log_name, f"sats_remaining={sats_remaining}")
-            debug_bot.log(log_name, f"cost_sats={cost_sats}")
-            if not successful(response):
-                error_bot.log(log_name, f"response={response}")
-                sub_log_name = f"{log_name}: recalc_balance_sats"
-                calc_failed_msg = f"{sub_log_name}: Failed to calculate remaining sats"
-                abbot_squawk = f"{calc_failed_msg}: group_id={chat_id}\ngroup_title=({chat_title})"
-                abbot_squawk = f"{abbot_squawk}: current_sats={current_sats}\nresponse={response}\n"
-                error_bot.log(log_name, abbot_squawk)
-                await context.bot.send_message(chat_id=ABBOT_SQUAWKS, text=abbot_squawk)
-            debug_bot.log(log_name, f"response={response}")
-
-            if not sats_remaining:
-                sats_remaining = current_sats - cost_sats
+            abbot = Abbot(
+                chat_id,
+                "group",
+                group_history,
+                lifetime_history_len(group),
+                try_get(group, "summary"),
+                try_get(group, "tokens"),
+            )
+            abbot.route("reply", current_sats)
+            reply, answer, input_tokens, output_tokens, _ = await stream_reply(message, abbot)
 
-            if sats_remaining == 0:
-                abbot_squawk = f"Group balance: {current_sats}\n\ngroup_id={chat_id}\ngroup_title={chat_title}"
+            response: Dict = await charge_group(
+                context, chat_id, chat_title, abbot, input_tokens, output_tokens, "reply"
+            )
+            if try_get(response, "drained"):
                 answer = f"{answer}\n\n Note: You group is now out of SATs. Please run /fund to topup."
-                debug_bot.log(log_name, abbot_squawk)
-                await context.bot.send_message(chat_id=ABBOT_SQUAWKS, text=abbot_squawk)
-            debug_bot.log(log_name, f"sats_remaining={sats_remaining}")
             assistant_history_update = {
                 "role": "assistant",
                 "content": answer,
             }
-            group_history = abbot.get_history()
-            token_count: int = calculate_tokens(group_history)
-            group: TelegramGroup = mongo_abbot.find_one_group_and_update(
-                chat_id_filter,
-                {
-                    "$set": {"balance": sats_remaining, "tokens": token_count},
-                    "$push": {"history": assistant_history_update},
-                },
+            group: TelegramGroup = await group_state_cache.find_one_group_and_update(
+                chat_id_filter, turn_update(abbot, assistant_history_update), fields=["balance"]
             )
             debug_bot.log(log_name, f"group={group}")
-            if "`" in answer:
-                answer = f"`{answer}`"
-                await message.reply_text(answer, parse_mode=MARKDOWN_V2, disable_web_page_preview=True)
-            else:
-                await message.reply_text(answer)
+            await finish_reply(reply, answer)
+    except (LLMBusyException, LLMUnavailableException) as llm_exception:
+        # stream_reply already edited llm_exception.reply into the placeholder
+        error_bot.log(log_name, f"{llm_exception}")
+    except AbbotException as abbot_exception:
+        await bot_squawk(f"{log_name}: {abbot_exception}", context)
+
+
+async def batch_group_mentions(context: ContextTypes.DEFAULT_TYPE, chat_id: int, chat_title: str, group_config: Dict):
+    """
+    Wait out the chat's batching window off the update's task, so the mentions behind it can run and join; the
+    closed batch is then answered back in the chat's update order, so its history push and debit never race
+    the chat's later updates
+    """
+    mentions: List[Dict] = await mention_batcher.close(chat_id)
+    if not mentions:
+        return
+    answer = answer_group_mentions(context, chat_id, chat_title, group_config, mentions)
+    processor: Any = context.application.update_processor
+    if isinstance(processor, ChatOrderedUpdateProcessor):
+        return await processor.run_ordered(chat_id, answer)
+    await answer
+
+
+async def answer_group_mentions(
+    context: ContextTypes.DEFAULT_TYPE, chat_id: int, chat_title: str, group_config: Dict, mentions: List[Dict]
+):
+    """
+    Answer one or more mentions with one completion
+    The reply goes to the latest mention and addresses every asker; the debit's ledger entry attributes an even
+    share of its sats to each asker
+    """
+    try:
+        log_name: str = f"{FILE_NAME}: answer_group_mentions"
+        message: Message = try_get(mentions, -1, "message")
+        chat_id_filter = {"id": chat_id}
+        group: TelegramGroup = await group_state_cache.find_one_group(
+            chat_id_filter, fields=GROUP_TURN_FIELDS, history_limit=HISTORY_WINDOW
+        )
+        group_history: List[Dict] = try_get(group, "history")
+        current_sats: int = try_get(group, "balance")
+        abbot = Abbot(
+            chat_id,
+            "group",
+            group_history,
+            lifetime_history_len(group),
+            try_get(group, "summary"),
+            try_get(group, "tokens"),
+        )
+        abbot.route("mention", current_sats)
+        if len(mentions) > 1:
+            askers: str = ", ".join(f"@{try_get(mention, 'username')}" for mention in mentions)
+            abbot.context.append({"role": "system", "content": f"{MENTION_BATCH_PROMPT} {askers}"})
+        use_cache: bool = len(mentions) == 1 and cache_enabled(group_config)
+        reply, answer, input_tokens, output_tokens, cache_hit = await answer_reply(
+            message, abbot, try_get(mentions, 0, "text"), use_cache
+        )
+
+        cost_mult: float = ANSWER_CACHE_COST_MULT if cache_hit else 1.0
+        askers: List[Dict] = [
+            {"user_id": try_get(mention, "user_id"), "username": try_get(mention, "username")} for mention in mentions
+        ]
+        response: Dict = await charge_group(
+            context, chat_id, chat_title, abbot, input_tokens, output_tokens, "mention", cost_mult, askers
+        )
+        if try_get(response, "drained"):
+            answer = f"{answer}\n\n Note: You group is now out of SATs. Please run /fund to topup."
+
+        assistant_history_update = {
+            "role": "assistant",
+            "content": answer,
+        }
+        group: TelegramGroup = await group_state_cache.find_one_group_and_update(
+            chat_id_filter, turn_update(abbot, assistant_history_update), fields=["balance"]
+        )
+
+        debug_bot.log(log_name, f"group={group}")
+
+        await finish_reply(reply, answer)
+    except (LLMBusyException, LLMUnavailableException) as llm_exception:
+        # stream_reply already edited llm_exception.reply into the placeholder
+        error_bot.log(log_name, f"{llm_exception}")
     except AbbotException as abbot_exception:
         await bot_squawk(f"{log_name}: {abbot_exception}", context)
 
@@ -1276,7 +1394,7 @@ async def handle_dm(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # sender: User = try_get(update_data, "user")
         # sender_id, sender_username, sender_first_name = parse_user_data(sender)
 
-        new_message_dict = message.to_dict()
+        new_message_dict = TelegramMessage(message).to_dict()
         chat_id_filter = {"id": chat_id}
         dm_update = {
             "$set": {
@@ -1288,7 +1406,7 @@ async def handle_dm(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 "history": [BOT_SYSTEM_OBJECT_DMS],
             }
         }
-        dm_exists: bool = mongo_abbot.find_one_dm(chat_id_filter)
+        dm_exists: bool = await async_mongo_abbot.dm_does_exist(chat_id_filter)
         if dm_exists:
             dm_update = {
                 "$set": {"id": chat_id, "username": username},
@@ -1297,23 +1415,26 @@ async def handle_dm(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     "history": {"role": "user", "content": message_text},
                 },
             }
-        dm: TelegramDM = mongo_abbot.find_one_dm_and_update(chat_id_filter, dm_update)
+        dm: TelegramDM = await async_mongo_abbot.find_one_dm_and_update(
+            chat_id_filter, dm_update, fields=["id", *CONTEXT_FIELDS], history_limit=HISTORY_WINDOW
+        )
         debug_bot.log(log_name, f"dm={dm}")
 
         dm_history: List = try_get(dm, "history")
-        abbot = Abbot(chat_id, "dm", dm_history)
-        answer, _, _, _ = abbot.chat_completion()
-
-        dm_history = abbot.get_history()
-        dm: TelegramDM = mongo_abbot.find_one_dm_and_update(
-            chat_id_filter,
-            {"$set": {"tokens": abbot.history_tokens}, "$push": {"history": {"role": "assistant", "content": answer}}},
+        abbot = Abbot(
+            chat_id, "dm", dm_history, lifetime_history_len(dm), try_get(dm, "summary"), try_get(dm, "tokens")
         )
-        if "`" in answer:
-            answer = f"`{answer}`"
-            await message.reply_text(answer, parse_mode=MARKDOWN_V2, disable_web_page_preview=True)
-        else:
-            await message.reply_text(answer)
+        abbot.route("dm")
+        reply, answer, _, _, _ = await answer_reply(message, abbot, message_text, use_cache=False)
+
+        dm_update = {"$push": {"history": {"role": "assistant", "content": answer}}}
+        if abbot.summary_update():
+            dm_update["$set"] = abbot.summary_update()
+        dm: TelegramDM = await async_mongo_abbot.find_one_dm_and_update(chat_id_filter, dm_update, fields=["tokens"])
+        await finish_reply(reply, answer)
+    except (LLMBusyException, LLMUnavailableException) as llm_exception:
+        # stream_reply already edited llm_exception.reply into the placeholder
+        error_bot.log(log_name, f"{llm_exception}")
     except AbbotException as abbot_exception:
         await bot_squawk(f"{log_name}: {abbot_exception}", context)
 
@@ -1338,6 +1459,7 @@ async def handle_group_kicks_bot(update: Update, context: ContextTypes.DEFAULT_T
         is_bot: bool = try_get(left_chat_member, "is_bot")
         username: bool = try_get(left_chat_member, "is_bot")
         if is_bot and username == BOT_TELEGRAM_HANDLE:
+            group_state_cache.invalidate(chat.id)
             return await context.bot.send_message(
                 chat_id=THE_ARCHITECT_ID, text=f"Bot kicked from group:\n\ntitle={chat.title}\nid={chat.id}"
             )
@@ -1398,89 +1520,73 @@ async def handle_group_default(update: Update, context: ContextTypes.DEFAULT_TYP
         group_admins: Any = [admin.to_dict() for admin in await chat.get_administrators()]
 
         chat_id_filter = {"id": chat_id}
-        group: TelegramGroup = mongo_abbot.find_one_group(chat_id_filter)
+        group_fields = [*GROUP_STATE_FIELDS, "history_len", "archived_history"]
+        group: TelegramGroup = await group_state_cache.find_one_group(chat_id_filter, fields=group_fields)
 
-        new_message_dict = message.to_dict()
+        new_message_dict = TelegramMessage(message).to_dict()
         new_history_dict = {"role": "user", "content": f"@{username} said: {message_text}"}
-        group_update = {
-            "$set": {
-                "created_at": datetime.now().isoformat(),
-                "title": chat_title,
-                "id": chat_id,
-                "type": chat_type,
-                "admins": group_admins,
-                "balance": 5000,
-                "messages": [new_message_dict],
-                "history": [BOT_SYSTEM_OBJECT_GROUPS],
-                "config": BOT_GROUP_CONFIG_DEFAULT,
-            }
-        }
-        if group:
-            group_history: List = try_get(group, "history")
-            group_history = [*group_history, new_history_dict]
-            token_count: int = calculate_tokens(group_history)
+        if not group:
             group_update = {
                 "$set": {
+                    "created_at": datetime.now().isoformat(),
                     "title": chat_title,
                     "id": chat_id,
                     "type": chat_type,
                     "admins": group_admins,
-                    "tokens": token_count,
-                },
-                "$push": {
-                    "messages": new_message_dict,
-                    "history": new_history_dict,
-                },
+                    "balance": 5000,
+                    "messages": [new_message_dict],
+                    "history": [BOT_SYSTEM_OBJECT_GROUPS, new_history_dict],
+                    "config": BOT_GROUP_CONFIG_DEFAULT,
+                }
             }
-
-        group: TelegramGroup = mongo_abbot.find_one_group_and_update(chat_id_filter, group_update)
-        group_id: int = try_get(group, "id")
-        group_title: str = try_get(group, "title")
-        msg = f"Existing group updated:\n\ngroup_id={group_id}\ngroup_title={group_title}"
-        await context.bot.send_message(chat_id=ABBOT_SQUAWKS, text=msg)
+            group: TelegramGroup = await group_state_cache.find_one_group_and_update(
+                chat_id_filter, group_update, fields=group_fields
+            )
+            history_len: int = lifetime_history_len(group) or 0
+            msg = f"New group created:\n\ngroup_id={chat_id}\ngroup_title={chat_title}"
+            await context.bot.send_message(chat_id=ABBOT_SQUAWKS, text=msg)
+        else:
+            group_set = {"title": chat_title, "id": chat_id, "type": chat_type, "admins": group_admins}
+            pending_count: int = await group_message_buffer.add(chat_id, group_set, new_message_dict, new_history_dict)
+            # lifetime count: archiving trims the history array, which would shift the unleash cadence
+            history_len: int = (lifetime_history_len(group) or 0) + pending_count
+        debug_bot.log(log_name, f"history_len={history_len}")
 
         group_config: Dict = try_get(group, "config")
         unleashed: Dict = try_get(group_config, "unleashed")
         count: Dict = try_get(group_config, "count")
         if unleashed and count > 0:
-            abbot = Abbot(chat_id, chat_type, group_history)
-            if abbot.history_len % count == 0:
-                current_sats: TelegramGroup = mongo_abbot.get_group_balance(chat_id_filter)
+            if history_len % count == 0:
+                current_sats: int = try_get(group, "balance")
                 if current_sats == 0:
                     return
                 debug_bot.log(log_name, f"current_sats={current_sats}")
 
-                answer, input_tokens, output_tokens, _ = abbot.chat_completion()
-
-                response: Dict = await recalc_balance_sats(input_tokens, output_tokens, current_sats, context.bot)
-                sats_remaining: int = try_get(response, "data")
-                if not successful(response):
-                    sub_log_name = f"{log_name}: recalc_balance_sats"
-                    error_bot.log(log_name, f"response={response}")
-                    msg = f"{sub_log_name}: Failed to calculate remaining sats"
-                    error_bot.log(log_name, msg)
-                    error_bot.log(log_name, f"current_sats={current_sats}\nresponse={response}")
-                    error_bot.log(log_name, f"chat_id={chat_id}\nchat_title={chat_title}")
-                    await context.bot.send_message(chat_id=ABBOT_SQUAWKS, text=msg)
-
-                if not sats_remaining and current_sats > 0:
-                    sats_remaining = current_sats - 250
-                else:
-                    sats_remaining = 0
-                    abbot_squawk = f"Group balance: {current_sats}\n\ngroup_id={chat_id}\ngroup_title={chat_title}"
+                await group_message_buffer.flush(chat_id)
+                group_context: TelegramGroup = await group_state_cache.find_one_group(
+                    chat_id_filter, fields=CONTEXT_FIELDS, history_limit=HISTORY_WINDOW
+                )
+                group_history: List[Dict] = try_get(group_context, "history", default=[])
+                abbot = Abbot(
+                    chat_id,
+                    chat_type,
+                    group_history,
+                    lifetime_history_len(group_context),
+                    try_get(group_context, "summary"),
+                    try_get(group_context, "tokens"),
+                )
+                abbot.route("unleash", current_sats)
+                answer, input_tokens, output_tokens, _ = await abbot.chat_completion()
+
+                response: Dict = await charge_group(
+                    context, chat_id, chat_title, abbot, input_tokens, output_tokens, "unleash"
+                )
+                if try_get(response, "drained"):
                     answer = f"{answer}\n\n Note: You group is now out of SATs. Please run /fund to topup."
-                    debug_bot.log(log_name, abbot_squawk)
-                    await context.bot.send_message(chat_id=ABBOT_SQUAWKS, text=abbot_squawk)
-                debug_bot.log(log_name, f"sats_remaining={sats_remaining}")
 
-                token_count: int = abbot.calculate_history_tokens()
                 assistant_history_update = {"role": "assistant", "content": answer}
-                group: TelegramGroup = mongo_abbot.find_one_group_and_update(
-                    chat_id_filter,
-                    {
-                        "$set": {"balance": sats_remaining, "tokens": token_count},
-                        "$push": {"history": assistant_history_update},
-                    },
+                group: TelegramGroup = await group_state_cache.find_one_group_and_update(
+                    chat_id_filter, turn_update(abbot, assistant_history_update), fields=["balance"]
                 )
                 debug_bot.log(log_name, f"group={group}")
                 if "`" in answer:
@@ -1488,6 +1594,9 @@ async def handle_group_default(update: Update, context: ContextTypes.DEFAULT_TYP
                     await message.reply_text(answer, parse_mode=MARKDOWN_V2, disable_web_page_preview=True)
                 else:
                     await message.reply_text(answer)
+    except (LLMBusyException, LLMUnavailableException) as llm_exception:
+        error_bot.log(log_name, f"{llm_exception}")
+        await message.reply_text(llm_exception.reply)
     except AbbotException as abbot_exception:
         await bot_squawk(f"{log_name}: {abbot_exception}", context)
 
@@ -1515,7 +1624,14 @@ class TelegramBotBuilder:
     def __init__(self):
         log_name: str = f"{FILE_NAME}: TelegramBotBuilder()"
         debug_bot.log(log_name, f"Telegram abbot initializing: name={BOT_NAME} handle={BOT_TELEGRAM_HANDLE}")
-        telegram_bot = ApplicationBuilder().token(self.BOT_TELEGRAM_TOKEN).build()
+        telegram_bot = (
+            ApplicationBuilder()
+            .token(self.BOT_TELEGRAM_TOKEN)
+            .concurrent_updates(ChatOrderedUpdateProcessor())
+            .post_init(self.post_init)
+            .post_shutdown(self.post_shutdown)
+            .build()
+        )
         debug_bot.log(log_name, f"Telegram abbot initialized")
 
         # Add command handlers
@@ -1535,6 +1651,7 @@ class TelegramBotBuilder:
                 CommandHandler("stop", stop),
                 CommandHandler("unleash", unleash),
                 CommandHandler("leash", leash),
+                CommandHandler("cache", cache),
                 CommandHandler("status", status),
                 CommandHandler("balance", balance),
                 CommandHandler("fund", fund),
@@ -1557,6 +1674,30 @@ class TelegramBotBuilder:
 
         self.telegram_bot = telegram_bot
 
+    async def post_init(self, application: Application):
+        log_name: str = f"{FILE_NAME}: TelegramBotBuilder.post_init"
+        debug_bot.log(log_name, f"Starting group message buffer: interval={group_message_buffer.flush_interval}s")
+        application.create_task(group_message_buffer.run())
+        debug_bot.log(log_name, f"Starting history archiver: keep={history_archiver.keep_count}")
+        application.create_task(history_archiver.run())
+        debug_bot.log(log_name, f"Starting price oracle: interval={price_oracle.refresh_interval}s")
+        application.create_task(price_oracle.run())
+        debug_bot.log(log_name, f"Starting invoice watcher")
+        application.create_task(invoice_watcher.run())
+        if strike_webhook:
+            debug_bot.log(log_name, f"Starting Strike webhook receiver: port={STRIKE_WEBHOOK_PORT}")
+            await strike_webhook.start(port=STRIKE_WEBHOOK_PORT)
+            if STRIKE_WEBHOOK_URL:
+                response: Dict = await payment_processor.subscribe_webhooks(STRIKE_WEBHOOK_URL, STRIKE_WEBHOOK_SECRET)
+                debug_bot.log(log_name, f"subscribe_webhooks response={response}")
+
+    async def post_shutdown(self, application: Application):
+        log_name: str = f"{FILE_NAME}: TelegramBotBuilder.post_shutdown"
+        debug_bot.log(log_name, f"Flushing group message buffer")
+        await group_message_buffer.flush()
+        if strike_webhook:
+            await strike_webhook.stop()
+
     def run(self):
         log_name: str = f"{FILE_NAME}: TelegramBotBuilder.run"
         debug_bot.log(log_name, f"Telegram abbot polling")
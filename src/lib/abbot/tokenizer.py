@@ -0,0 +1,65 @@
+from hashlib import blake2b
+from typing import Dict, Iterable, List, Optional
+
+import tiktoken
+from cachetools import LRUCache
+
+from constants import OPENAI_MODEL
+
+FILE_NAME = __name__
+
+TOKENIZER_CACHE_SIZE: int = 16384
+
+
+class Tokenizer:
+    """
+    The one place tiktoken encoders are loaded: lazily, once per encoding, shared by every model that uses it
+    Token counts are memoized in a bounded LRU keyed by encoding name and a hash of the content, so constant
+    strings like the system prompts are tokenized once per process
+    """
+
+    def __init__(self, default_model: str = OPENAI_MODEL, cache_size: int = TOKENIZER_CACHE_SIZE):
+        self.default_model: str = default_model
+        self.encoders: Dict[str, tiktoken.Encoding] = {}
+        self.counts: LRUCache = LRUCache(maxsize=cache_size)
+
+    def encoder(self, model: Optional[str] = None) -> tiktoken.Encoding:
+        model = model or self.default_model
+        if model not in self.encoders:
+            try:
+                self.encoders[model] = tiktoken.encoding_for_model(model)
+            except KeyError:
+                self.encoders[model] = self.encoder(self.default_model)
+        return self.encoders[model]
+
+    def encode(self, content: str, model: Optional[str] = None) -> List[int]:
+        return self.encoder(model).encode(content, allowed_special="all")
+
+    def count(self, content: Optional[str], model: Optional[str] = None) -> int:
+        if not content:
+            return 0
+        encoder: tiktoken.Encoding = self.encoder(model)
+        key = (encoder.name, blake2b(content.encode(), digest_size=16).digest())
+        count: Optional[int] = self.counts.get(key)
+        if count is None:
+            count = self.counts[key] = len(encoder.encode(content, allowed_special="all"))
+        return count
+
+    def count_many(self, contents: Iterable[Optional[str]], model: Optional[str] = None) -> List[int]:
+        """Counts for a batch of strings; cache misses are encoded together with encode_batch"""
+        contents = list(contents)
+        encoder: tiktoken.Encoding = self.encoder(model)
+        keys = [
+            (encoder.name, blake2b(content.encode(), digest_size=16).digest()) if content else None
+            for content in contents
+        ]
+        found: Dict = {key: self.counts[key] for key in keys if key and key in self.counts}
+        misses: Dict = {key: content for key, content in zip(keys, contents) if key and key not in found}
+        if misses:
+            encoded: List[List[int]] = encoder.encode_batch(list(misses.values()), allowed_special="all")
+            for key, tokens in zip(misses, encoded):
+                found[key] = self.counts[key] = len(tokens)
+        return [found[key] if key else 0 for key in keys]
+
+
+tokenizer = Tokenizer()
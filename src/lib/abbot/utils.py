@@ -1,17 +1,15 @@
 from re import L
 from typing import Dict, List, Optional
 
-import tiktoken
 from json import dumps
 from telegram.ext import ContextTypes
 from telegram import Message, Update, Chat, User
 
-from constants import ABBOT_SQUAWKS, OPENAI_MODEL, THE_ARCHITECT_ID
+from constants import ABBOT_SQUAWKS, THE_ARCHITECT_ID
 
 from ..utils import success, successful, try_get, error
 from ..logger import debug_bot, error_bot
-
-encoding = tiktoken.encoding_for_model(OPENAI_MODEL)
+from .tokenizer import tokenizer
 
 FILE_NAME = __name__
 
@@ -157,11 +155,17 @@ async def bot_squawk(abbot_squawk: str, context: ContextTypes.DEFAULT_TYPE) -> M
     await context.bot.send_message(chat_id=ABBOT_SQUAWKS, text=abbot_squawk)
 
 
+def count_tokens(content: Optional[str], model: Optional[str] = None) -> int:
+    return tokenizer.count(content, model)
+
+
+def entry_tokens(entry: Dict) -> int:
+    """Token count stored on a history entry; only entries written before counts were stored get tokenized"""
+    tokens: Optional[int] = try_get(entry, "tokens")
+    return tokens if tokens is not None else count_tokens(try_get(entry, "content"))
+
+
 def calculate_tokens(history: List) -> int:
-    total = 0
-    for data in history:
-        content = try_get(data, "content")
-        if not content:
-            continue
-        total += len(encoding.encode(content, allowed_special="all"))
-    return total
+    stored: List[Optional[int]] = [try_get(data, "tokens") for data in history]
+    unstored: List[str] = [try_get(data, "content") for data, tokens in zip(history, stored) if tokens is None]
+    return sum(tokens for tokens in stored if tokens is not None) + sum(tokenizer.count_many(unstored))
@@ -0,0 +1,56 @@
+import json
+from typing import Any, Dict
+
+from aiohttp import web
+
+from ..abbot.backend import LatencyModel, Recordings, ReplayCompletions
+from ..logger import debug_bot
+
+FILE_NAME = __name__
+
+LLM_SERVER_HOST: str = "127.0.0.1"
+LLM_SERVER_PORT: int = 8089
+
+
+class LLMServer:
+    """
+    Local OpenAI-compatible stand-in: POST /v1/chat/completions (plain or SSE streamed) and GET /v1/models,
+    answered from the replay recordings. Point OPENAI_BASE_URL at it to exercise the real client and HTTP path
+    offline, e.g. for load tests
+    """
+
+    def __init__(self, completions: ReplayCompletions):
+        self.completions: ReplayCompletions = completions
+        self.requests: int = 0
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self.chat_completions)
+        app.router.add_get("/v1/models", self.models)
+        return app
+
+    async def models(self, request: web.Request) -> web.Response:
+        models = {model for model in (pair.get("model") for pair in self.completions.recordings.load().values())}
+        data = [{"id": model, "object": "model", "owned_by": "replay"} for model in sorted(filter(None, models))]
+        return web.json_response({"object": "list", "data": data})
+
+    async def chat_completions(self, request: web.Request) -> web.StreamResponse:
+        log_name: str = f"{FILE_NAME}: LLMServer.chat_completions"
+        body: Dict = await request.json()
+        self.requests += 1
+        debug_bot.log(log_name, f"requests={self.requests} stream={bool(body.get('stream'))}")
+        completion: Any = await self.completions.create(**body)
+        if not body.get("stream"):
+            return web.json_response(completion)
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await response.prepare(request)
+        async for chunk in completion:
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+
+def run(host: str = LLM_SERVER_HOST, port: int = LLM_SERVER_PORT) -> None:
+    server = LLMServer(ReplayCompletions(Recordings(), LatencyModel()))
+    web.run_app(server.app(), host=host, port=port)
@@ -0,0 +1,93 @@
+import asyncio
+import hmac
+import json
+from collections import Counter
+from hashlib import sha256
+from typing import Dict, Optional, Set
+
+from aiohttp import web
+
+from ..invoice_watcher import InvoiceWatcher
+from ..logger import debug_bot, error_bot
+from ..payments import Strike
+from ..utils import try_get
+
+FILE_NAME = __name__
+
+STRIKE_WEBHOOK_PATH: str = "/strike/webhook"
+STRIKE_SIGNATURE_HEADER: str = "X-Webhook-Signature"
+STRIKE_INVOICE_UPDATED: str = "invoice.updated"
+
+
+def sign(secret: str, body: bytes) -> str:
+    """Strike signs each delivery with the hex HMAC-SHA256 of the raw body under the subscription secret"""
+    return hmac.new(secret.encode(), body, sha256).hexdigest()
+
+
+def verify(secret: str, body: bytes, signature: Optional[str]) -> bool:
+    return bool(signature) and hmac.compare_digest(sign(secret, body), signature.lower())
+
+
+class StrikeWebhook:
+    """
+    Receiver for Strike invoice.updated webhooks, so a paid invoice is credited the moment Strike reports it
+    Deliveries with a bad signature are refused. Others are acknowledged right away; the invoice's state is then
+    confirmed with one GET (webhook bodies carry only the invoice id) and a paid one is settled through the
+    invoice watcher, which keeps polling as the fallback for deliveries that never arrive
+    """
+
+    def __init__(self, secret: str, processor: Strike, watcher: InvoiceWatcher):
+        self.secret: str = secret
+        self.processor: Strike = processor
+        self.watcher: InvoiceWatcher = watcher
+        self.runner: Optional[web.AppRunner] = None
+        self.tasks: Set[asyncio.Task] = set()
+        self.metrics: Counter = Counter()
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(STRIKE_WEBHOOK_PATH, self.receive)
+        return app
+
+    async def receive(self, request: web.Request) -> web.Response:
+        log_name: str = f"{FILE_NAME}: StrikeWebhook.receive"
+        body: bytes = await request.read()
+        if not verify(self.secret, body, request.headers.get(STRIKE_SIGNATURE_HEADER)):
+            self.metrics["bad_signature"] += 1
+            error_bot.log(log_name, f"bad signature from {request.remote}")
+            return web.Response(status=401)
+        try:
+            event: Dict = json.loads(body)
+        except ValueError:
+            self.metrics["bad_body"] += 1
+            return web.Response(status=400)
+        self.metrics["received"] += 1
+        invoice_id: Optional[str] = try_get(event, "data", "entityId")
+        debug_bot.log(log_name, f"eventType={try_get(event, 'eventType')} invoice_id={invoice_id}")
+        if try_get(event, "eventType") == STRIKE_INVOICE_UPDATED and invoice_id in self.watcher.invoices:
+            task: asyncio.Task = asyncio.create_task(self.resolve(invoice_id))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+        return web.Response(status=200)
+
+    async def resolve(self, invoice_id: str) -> None:
+        log_name: str = f"{FILE_NAME}: StrikeWebhook.resolve"
+        try:
+            if await self.processor.invoice_is_paid(invoice_id):
+                settled: bool = await self.watcher.settle(invoice_id, source="webhook")
+                self.metrics["settled" if settled else "already_settled"] += 1
+        except Exception as exception:
+            self.metrics["errors"] += 1
+            error_bot.log(log_name, f"invoice_id={invoice_id} left to polling: {exception}")
+
+    async def start(self, host: str = "0.0.0.0", port: int = 8090) -> None:
+        self.runner = web.AppRunner(self.app())
+        await self.runner.setup()
+        await web.TCPSite(self.runner, host, port).start()
+        self.watcher.enable_push()
+        debug_bot.log(f"{FILE_NAME}: StrikeWebhook.start", f"listening on {host}:{port}{STRIKE_WEBHOOK_PATH}")
+
+    async def stop(self) -> None:
+        if self.runner:
+            await self.runner.cleanup()
+        debug_bot.log(f"{FILE_NAME}: StrikeWebhook.stop", f"{dict(self.metrics)}")
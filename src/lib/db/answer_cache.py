@@ -0,0 +1,218 @@
+import math
+import re
+import zlib
+from datetime import datetime, timedelta
+from hashlib import sha256
+from typing import Dict, List, Optional, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import DESCENDING
+
+from ..logger import debug_bot, error_bot
+from ..utils import try_get
+from ..abbot.config import BOT_TELEGRAM_HANDLE
+from .mongo_async import async_telegram_answers
+
+FILE_NAME = __name__
+
+ANSWER_CACHE_TTL_DAYS: int = 1
+ANSWER_CACHE_MAX_ENTRIES: int = 2000
+# cosine similarity of the hashed n-gram vectors above which two questions count as the same question
+ANSWER_CACHE_SIMILARITY: float = 0.9
+# questions shorter than this are too context dependent ("why?", "gm") to answer from the cache
+ANSWER_CACHE_MIN_WORDS: int = 4
+# cache hits are billed at this fraction of the tokens the original answer cost
+ANSWER_CACHE_COST_MULT: float = 0.1
+ANSWER_CACHE_DIMENSIONS: int = 1 << 18
+
+WORD_PATTERN = re.compile(r"[a-z0-9']+")
+
+
+def normalize_question(question: str) -> str:
+    """Lowercased words of the question, without the bot handle, punctuation or extra whitespace"""
+    question = (question or "").replace(BOT_TELEGRAM_HANDLE, " ").lower()
+    return " ".join(WORD_PATTERN.findall(question))
+
+
+def prompt_version(system_prompt: str, scope: int) -> str:
+    """
+    Answers are only served back in the chat (scope) that got them, since they were built from its context, and
+    only under the same system prompt; changing the prompt retires them
+    """
+    return sha256(f"{scope}:{system_prompt or ''}".encode()).hexdigest()[:16]
+
+
+def embed(normalized: str) -> Dict[int, float]:
+    """
+    Local, dependency-free embedding: word unigrams, word bigrams and character trigrams hashed into a sparse
+    vector and L2-normalized, so the dot product of two embeddings is their cosine similarity
+    """
+    words: List[str] = normalized.split()
+    padded: str = f" {normalized} "
+    features: List[str] = [
+        *(f"w:{word}" for word in words),
+        *(f"b:{first} {second}" for first, second in zip(words, words[1:])),
+        *(f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2)),
+    ]
+    vector: Dict[int, float] = {}
+    for feature in features:
+        index: int = zlib.crc32(feature.encode()) % ANSWER_CACHE_DIMENSIONS
+        vector[index] = vector.get(index, 0.0) + 1.0
+    norm: float = math.sqrt(sum(weight * weight for weight in vector.values())) or 1.0
+    return {index: weight / norm for index, weight in vector.items()}
+
+
+class AnswerCache:
+    """
+    Answers to standalone questions asked in groups, kept in Mongo so they survive restarts
+    Keyed on the normalized question plus the version of the chat and system prompt. A lookup first tries the exact key, then
+    the nearest previously answered question by cosine similarity over an in-memory inverted index of the
+    cached embeddings. Entries expire ttl_days after they were answered (a TTL index drops them in Mongo) and
+    beyond max_entries the least recently hit are evicted
+    """
+
+    def __init__(
+        self,
+        collection: AsyncIOMotorCollection,
+        ttl_days: int = ANSWER_CACHE_TTL_DAYS,
+        max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+        similarity: float = ANSWER_CACHE_SIMILARITY,
+    ):
+        self.collection: AsyncIOMotorCollection = collection
+        self.ttl: timedelta = timedelta(days=ttl_days)
+        self.max_entries: int = max_entries
+        self.similarity: float = similarity
+        self.loaded: bool = False
+        self.postings: Dict[Tuple[str, int], Dict[str, float]] = {}
+        self.vectors: Dict[str, Tuple[str, Dict[int, float]]] = {}
+        self.hits: int = 0
+        self.misses: int = 0
+
+    @staticmethod
+    def key(version: str, normalized: str) -> str:
+        return sha256(f"{version}:{normalized}".encode()).hexdigest()
+
+    def cacheable(self, normalized: str) -> bool:
+        return len(normalized.split()) >= ANSWER_CACHE_MIN_WORDS
+
+    # in-memory index
+    def index(self, key: str, version: str, vector: Dict[int, float]) -> None:
+        self.vectors[key] = (version, vector)
+        for feature, weight in vector.items():
+            self.postings.setdefault((version, feature), {})[key] = weight
+
+    def unindex(self, key: str) -> None:
+        version, vector = self.vectors.pop(key, (None, {}))
+        for feature in vector:
+            postings: Dict[str, float] = self.postings.get((version, feature), {})
+            postings.pop(key, None)
+            if not postings:
+                self.postings.pop((version, feature), None)
+
+    async def load(self) -> None:
+        """Rebuild the in-memory index from the live entries once per process"""
+        if self.loaded:
+            return
+        cursor = self.collection.find({"expires_at": {"$gt": datetime.now()}}, {"version": 1, "vector": 1})
+        async for doc in cursor.sort("last_hit_at", DESCENDING).limit(self.max_entries):
+            self.index(doc["_id"], doc["version"], {int(feature): weight for feature, weight in doc["vector"]})
+        self.loaded = True
+
+    def nearest(self, version: str, vector: Dict[int, float]) -> Tuple[Optional[str], float]:
+        scores: Dict[str, float] = {}
+        for feature, weight in vector.items():
+            for key, cached_weight in self.postings.get((version, feature), {}).items():
+                scores[key] = scores.get(key, 0.0) + weight * cached_weight
+        if not scores:
+            return None, 0.0
+        key: str = max(scores, key=scores.get)
+        return key, scores[key]
+
+    # lookups
+    async def lookup(self, question: str, system_prompt: str, scope: int) -> Optional[Dict]:
+        """Cached answer doc for the question, or None; a hit refreshes the entry's LRU position"""
+        log_name: str = f"{FILE_NAME}: AnswerCache.lookup"
+        normalized: str = normalize_question(question)
+        if not self.cacheable(normalized):
+            return None
+        version: str = prompt_version(system_prompt, scope)
+        key: str = self.key(version, normalized)
+        similarity: float = 1.0
+        await self.load()
+        if key not in self.vectors:
+            key, similarity = self.nearest(version, embed(normalized))
+        if not key or similarity < self.similarity:
+            self.misses += 1
+            return None
+        now: datetime = datetime.now()
+        doc: Optional[Dict] = await self.collection.find_one_and_update(
+            {"_id": key, "expires_at": {"$gt": now}},
+            {"$set": {"last_hit_at": now}, "$inc": {"hits": 1}},
+            {"vector": 0},
+        )
+        if not doc:
+            self.unindex(key)
+            self.misses += 1
+            return None
+        self.hits += 1
+        debug_bot.log(log_name, f"similarity={similarity:.3f} hits={self.hits} misses={self.misses}")
+        return doc
+
+    async def store(
+        self,
+        question: str,
+        system_prompt: str,
+        scope: int,
+        answer: str,
+        input_tokens: int,
+        output_tokens: int,
+        model: Optional[str] = None,
+    ) -> None:
+        """Remember a freshly generated answer, evicting the least recently hit entries past max_entries"""
+        log_name: str = f"{FILE_NAME}: AnswerCache.store"
+        normalized: str = normalize_question(question)
+        if not answer or not self.cacheable(normalized):
+            return
+        version: str = prompt_version(system_prompt, scope)
+        key: str = self.key(version, normalized)
+        vector: Dict[int, float] = embed(normalized)
+        now: datetime = datetime.now()
+        try:
+            await self.collection.replace_one(
+                {"_id": key},
+                {
+                    "version": version,
+                    "scope": scope,
+                    "question": normalized,
+                    "vector": [[feature, weight] for feature, weight in vector.items()],
+                    "answer": answer,
+                    "input_tokens": input_tokens,
+                    "output_tokens": output_tokens,
+                    "model": model,
+                    "hits": 0,
+                    "created_at": now,
+                    "last_hit_at": now,
+                    "expires_at": now + self.ttl,
+                },
+                upsert=True,
+            )
+            self.index(key, version, vector)
+            if len(self.vectors) > self.max_entries:
+                await self.evict(len(self.vectors) - self.max_entries)
+        except Exception as exception:
+            error_bot.log(log_name, f"failed to cache answer: {exception}")
+
+    async def evict(self, count: int) -> None:
+        cursor = self.collection.find({}, {"_id": 1}).sort("last_hit_at", 1).limit(count)
+        keys: List[str] = [doc["_id"] async for doc in cursor]
+        await self.collection.delete_many({"_id": {"$in": keys}})
+        for key in keys:
+            self.unindex(key)
+
+
+def cache_enabled(config: Optional[Dict]) -> bool:
+    """Groups opt out with /cache off; dms never use the cache, see answer_reply"""
+    return try_get(config, "answer_cache", default=True) is not False
+
+
+answer_cache = AnswerCache(async_telegram_answers)
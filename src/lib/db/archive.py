@@ -0,0 +1,254 @@
+import asyncio
+import gzip
+import json
+from datetime import datetime, timedelta
+from os import makedirs, remove
+from os.path import abspath, exists, join
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from bson import json_util
+from motor.motor_asyncio import AsyncIOMotorCollection
+
+from ..logger import debug_bot, error_bot
+from ..utils import error, success, try_get
+from ..abbot.env import ARCHIVE_INTERVAL, ARCHIVE_KEEP_COUNT, ARCHIVE_MAX_AGE_DAYS
+from .cache import GroupStateCache, group_state_cache
+from .mongo import HISTORY_WINDOW, LOG_FIELDS, LOG_SEQ_FIELDS
+from .mongo_async import AsyncMongoAbbot, async_mongo_abbot
+
+FILE_NAME = __name__
+
+ARCHIVE_DIR: str = abspath("src/data/archive")
+ARCHIVE_MANIFEST: str = "manifest.jsonl"
+ARCHIVED_FIELDS: Dict[str, str] = {"messages": "archived_messages", "history": "archived_history"}
+
+
+def segment_line(field: str, entry: Dict) -> str:
+    """History lines keep the {"role", "content"} shape of data/backup/chats; messages keep their stored form"""
+    if field == "history":
+        return json.dumps({"role": try_get(entry, "role"), "content": try_get(entry, "content")})
+    entry = {key: value for key, value in entry.items() if key not in ("_id", "chat_id", "seq", "created_at")}
+    return json_util.dumps(entry)
+
+
+class HistoryArchiver:
+    """
+    Moves cold messages/history out of Mongo into gzipped JSONL segments under ARCHIVE_DIR/<db>/<YYYY-MM-DD>/
+    Everything but the last keep_count entries of a chat is archived, and in append mode also anything older
+    than max_age_days (document mode entries carry no timestamp, so only the count applies there).
+    The last HISTORY_WINDOW entries always stay live. Each segment is written and listed in
+    ARCHIVE_DIR/<db>/manifest.jsonl, with its chat, field and seq range, before its entries are removed, so
+    iter_archived can stream a chat's archived entries back in order whenever the pass stops. A segment whose
+    trim lost a race is deleted again; the manifest skips missing segments and overlapping seqs
+    """
+
+    def __init__(
+        self,
+        mongo: AsyncMongoAbbot,
+        cache: Optional[GroupStateCache] = None,
+        root: str = ARCHIVE_DIR,
+        keep_count: int = ARCHIVE_KEEP_COUNT,
+        max_age_days: int = ARCHIVE_MAX_AGE_DAYS,
+        interval: float = ARCHIVE_INTERVAL,
+    ):
+        self.mongo: AsyncMongoAbbot = mongo
+        self.cache: Optional[GroupStateCache] = cache
+        self.root: str = join(root, mongo.groups.database.name)
+        self.keep_count: int = max(keep_count, HISTORY_WINDOW)
+        self.max_age: timedelta = timedelta(days=max_age_days)
+        self.interval: float = interval
+
+    # segments & manifest
+    def write_segment(self, kind: str, chat_id: int, field: str, date: str, first_seq: int, entries: List[Dict]):
+        directory: str = join(self.root, date)
+        makedirs(directory, exist_ok=True)
+        last_seq: int = first_seq + len(entries) - 1
+        path: str = join(directory, f"{kind}_{chat_id}_{field}_{first_seq}-{last_seq}.jsonl.gz")
+        with gzip.open(path, "wt", encoding="utf-8") as segment:
+            for entry in entries:
+                segment.write(f"{segment_line(field, entry)}\n")
+        return {
+            "kind": kind,
+            "chat_id": chat_id,
+            "field": field,
+            "date": date,
+            "path": path,
+            "first_seq": first_seq,
+            "last_seq": last_seq,
+            "count": len(entries),
+            "archived_at": datetime.now().isoformat(),
+        }
+
+    def record(self, segments: List[Dict]) -> None:
+        makedirs(self.root, exist_ok=True)
+        with open(join(self.root, ARCHIVE_MANIFEST), "a", encoding="utf-8") as manifest:
+            for segment in segments:
+                manifest.write(f"{json.dumps(segment)}\n")
+
+    def discard(self, segments: List[Dict]) -> None:
+        for segment in segments:
+            if exists(segment["path"]):
+                remove(segment["path"])
+
+    def manifest(self, chat_id: Optional[int] = None, field: Optional[str] = None) -> List[Dict]:
+        """Listed segments still on disk, latest listing per path, ordered by chat, field and seq"""
+        path: str = join(self.root, ARCHIVE_MANIFEST)
+        if not exists(path):
+            return []
+        with open(path, encoding="utf-8") as manifest:
+            listed: Dict[str, Dict] = {
+                segment["path"]: segment for segment in (json.loads(line) for line in manifest if line.strip())
+            }
+        segments: List[Dict] = [
+            segment
+            for segment in listed.values()
+            if (chat_id is None or segment["chat_id"] == chat_id)
+            and (field is None or segment["field"] == field)
+            and exists(segment["path"])
+        ]
+        return sorted(segments, key=lambda segment: (segment["chat_id"], segment["field"], segment["first_seq"]))
+
+    def iter_archived(self, chat_id: int, field: str = "history") -> Iterator[Dict]:
+        """
+        Stream a chat's archived entries back, oldest first, for export or replay
+        Segments re-archived after an interrupted pass overlap earlier ones; each seq is only yielded once
+        """
+        next_seq: Optional[int] = None
+        for segment in self.manifest(chat_id, field):
+            if next_seq is not None and segment["last_seq"] < next_seq:
+                continue
+            skip: int = max(next_seq - segment["first_seq"], 0) if next_seq is not None else 0
+            with gzip.open(segment["path"], "rt", encoding="utf-8") as lines:
+                for index, line in enumerate(lines):
+                    if index >= skip:
+                        yield json_util.loads(line)
+            next_seq = segment["last_seq"] + 1
+
+    # archiving
+    async def archive_document_chat(self, kind: str, collection: AsyncIOMotorCollection, doc: Dict) -> List[Dict]:
+        """Archive the oldest array entries, then trim them only if nothing was pushed since they were read"""
+        chat_id: int = try_get(doc, "id")
+        head: int = 1 if try_get(doc, "head", "role") == "system" else 0
+        counts: Dict[str, int] = {
+            "messages": max(try_get(doc, "messages_len", default=0) - self.keep_count, 0),
+            "history": max(try_get(doc, "history_len", default=0) - head - self.keep_count, 0),
+        }
+        counts = {field: count for field, count in counts.items() if count}
+        if not counts:
+            return []
+        skips: Dict[str, int] = {"messages": 0, "history": head}
+        projection: Dict = {"_id": 0, **{field: {"$slice": [skips[field], count]} for field, count in counts.items()}}
+        cold: Dict = await collection.find_one({"id": chat_id}, projection)
+        date: str = datetime.now().strftime("%Y-%m-%d")
+        segments: List[Dict] = [
+            await asyncio.to_thread(
+                self.write_segment,
+                kind,
+                chat_id,
+                field,
+                date,
+                try_get(doc, ARCHIVED_FIELDS[field], default=0),
+                cold[field],
+            )
+            for field in counts
+        ]
+        await asyncio.to_thread(self.record, segments)
+        trimmed: Dict = {}
+        for field, count in counts.items():
+            # the filter below pins the array at its read size, which bounds what is left after the cut
+            keep: Dict = {"$slice": [f"${field}", count + skips[field], doc[f"{field}_len"]]}
+            if skips[field]:
+                keep = {"$concatArrays": [{"$slice": [f"${field}", skips[field]]}, keep]}
+            trimmed[field] = keep
+            trimmed[ARCHIVED_FIELDS[field]] = {"$add": [{"$ifNull": [f"${ARCHIVED_FIELDS[field]}", 0]}, count]}
+        filter: Dict = {"id": chat_id, **{field: {"$size": doc[f"{field}_len"]} for field in counts}}
+        result = await collection.update_one(filter, [{"$set": trimmed}])
+        if not result.modified_count:
+            await asyncio.to_thread(self.discard, segments)
+            return []
+        return segments
+
+    async def archive_append_chat(self, kind: str, doc: Dict) -> List[Dict]:
+        """Archive log entries up to a seq cutoff by count and age, then delete exactly that seq range"""
+        chat_id: int = try_get(doc, "id")
+        cold_before: datetime = datetime.now() - self.max_age
+        segments: List[Dict] = []
+        for field in LOG_FIELDS:
+            log: AsyncIOMotorCollection = self.mongo.log_collection(field)
+            next_seq: int = try_get(doc, LOG_SEQ_FIELDS[field], default=0)
+            cutoff: int = next_seq - self.keep_count - 1
+            aged: Optional[Dict] = await log.find_one(
+                {"chat_id": chat_id, "created_at": {"$lt": cold_before}}, {"seq": 1}, sort=[("seq", -1)]
+            )
+            cutoff = min(max(cutoff, try_get(aged, "seq", default=-1)), next_seq - HISTORY_WINDOW - 1)
+            if cutoff < 0:
+                continue
+            cursor = log.find({"chat_id": chat_id, "seq": {"$lte": cutoff}}).sort("seq", 1)
+            entries: List[Dict] = await cursor.to_list(length=None)
+            if not entries:
+                continue
+            by_date: Dict[str, List[Dict]] = {}
+            for entry in entries:
+                by_date.setdefault(entry["created_at"].strftime("%Y-%m-%d"), []).append(entry)
+            field_segments: List[Dict] = []
+            for date, dated in by_date.items():
+                segment: Dict = await asyncio.to_thread(
+                    self.write_segment, kind, chat_id, field, date, dated[0]["seq"], dated
+                )
+                field_segments.append(segment)
+            await asyncio.to_thread(self.record, field_segments)
+            await log.delete_many({"chat_id": chat_id, "seq": {"$lte": entries[-1]["seq"]}})
+            segments.extend(field_segments)
+        return segments
+
+    def chat_collections(self) -> List[Tuple[str, AsyncIOMotorCollection]]:
+        return [("group", self.mongo.groups), ("dm", self.mongo.direct_messages)]
+
+    async def archive(self) -> Dict:
+        """One archiving pass over every group and dm"""
+        log_name: str = f"{FILE_NAME}: HistoryArchiver.archive"
+        segments: List[Dict] = []
+        try:
+            for kind, collection in self.chat_collections():
+                if self.mongo.append_mode():
+                    seq_fields: List[str] = list(LOG_SEQ_FIELDS.values())
+                    filter: Dict = {"$or": [{seq_field: {"$gt": HISTORY_WINDOW}} for seq_field in seq_fields]}
+                    projection: Dict = {"_id": 0, "id": 1, **{seq_field: 1 for seq_field in seq_fields}}
+                    async for doc in collection.find(filter, projection):
+                        chat_segments: List[Dict] = await self.archive_append_chat(kind, doc)
+                        self.finish(kind, try_get(doc, "id"), chat_segments, segments)
+                    continue
+                sizes: Dict = {f"{field}_len": {"$size": {"$ifNull": [f"${field}", []]}} for field in LOG_FIELDS}
+                filter: Dict = {"$expr": {"$or": [{"$gt": [size, self.keep_count + 1]} for size in sizes.values()]}}
+                projection: Dict = {
+                    "_id": 0,
+                    "id": 1,
+                    "head": {"$arrayElemAt": ["$history", 0]},
+                    **sizes,
+                    **{archived: 1 for archived in ARCHIVED_FIELDS.values()},
+                }
+                async for doc in collection.find(filter, projection):
+                    chat_segments: List[Dict] = await self.archive_document_chat(kind, collection, doc)
+                    self.finish(kind, try_get(doc, "id"), chat_segments, segments)
+        except Exception as exception:
+            error_bot.log(log_name, f"archiving stopped after {len(segments)} segments: {exception}")
+            return error("Archiving failed", data=segments, exception=str(exception))
+        archived: int = sum(segment["count"] for segment in segments)
+        debug_bot.log(log_name, f"archived {archived} entries into {len(segments)} segments")
+        return success("Archived", data=segments, count=archived)
+
+    def finish(self, kind: str, chat_id: int, chat_segments: List[Dict], segments: List[Dict]) -> None:
+        if not chat_segments:
+            return
+        segments.extend(chat_segments)
+        if self.cache and kind == "group":
+            self.cache.invalidate(chat_id, ["history", "history_len", "archived_history"])
+
+    async def run(self) -> None:
+        """Archive on an interval until cancelled"""
+        while True:
+            await self.archive()
+            await asyncio.sleep(self.interval)
+
+
+history_archiver = HistoryArchiver(async_mongo_abbot, group_state_cache)
@@ -0,0 +1,98 @@
+import asyncio
+from typing import Dict, Optional
+
+from ..logger import debug_bot, error_bot
+from ..utils import try_get
+from .mongo import LOG_FIELDS
+from .mongo_async import AsyncMongoAbbot
+from .cache import GroupStateCache, group_state_cache
+
+FILE_NAME = __name__
+
+GROUP_BUFFER_MAX_PENDING: int = 25
+GROUP_BUFFER_MAX_TOTAL: int = 500
+GROUP_BUFFER_FLUSH_INTERVAL: float = 5.0
+
+
+class GroupMessageBuffer:
+    """
+    Write-behind buffer for passive group messages
+    Messages that Abbot does not answer are held in memory per chat and written with one bulk write
+    every flush_interval seconds, when a chat or the whole buffer reaches its size threshold, or when a
+    turn needs the up-to-date history (flush(chat_id) before mention, reply and unleash completions)
+    """
+
+    def __init__(
+        self,
+        mongo: GroupStateCache | AsyncMongoAbbot,
+        max_pending: int = GROUP_BUFFER_MAX_PENDING,
+        max_total: int = GROUP_BUFFER_MAX_TOTAL,
+        flush_interval: float = GROUP_BUFFER_FLUSH_INTERVAL,
+    ):
+        self.mongo: GroupStateCache | AsyncMongoAbbot = mongo
+        self.max_pending: int = max_pending
+        self.max_total: int = max_total
+        self.flush_interval: float = flush_interval
+        self.pending: Dict[int, Dict] = {}
+        self.total: int = 0
+
+    def pending_count(self, chat_id: int) -> int:
+        return len(try_get(self.pending, chat_id, "history", default=[]))
+
+    async def add(self, chat_id: int, set_fields: Dict, message: Dict, history_entry: Dict) -> int:
+        """Buffer one passive message; returns how many history entries are pending for the chat"""
+        push: Dict = self.pending.setdefault(chat_id, {"$set": {}, "messages": [], "history": []})
+        push["$set"].update(set_fields)
+        push["messages"].append(message)
+        push["history"].append(history_entry)
+        self.total += 1
+        pending_count: int = len(push["history"])
+        if self.total >= self.max_total:
+            await self.flush()
+        elif pending_count >= self.max_pending:
+            await self.flush(chat_id)
+        return pending_count
+
+    async def flush(self, chat_id: Optional[int] = None) -> bool:
+        """Write pending messages for one chat, or every chat when chat_id is None"""
+        log_name: str = f"{FILE_NAME}: GroupMessageBuffer.flush"
+        if chat_id is None:
+            pushes, self.pending = self.pending, {}
+        elif chat_id in self.pending:
+            pushes = {chat_id: self.pending.pop(chat_id)}
+        else:
+            return True
+        if not pushes:
+            return True
+        flushed: int = sum(len(push["history"]) for push in pushes.values())
+        self.total -= flushed
+        try:
+            await self.mongo.bulk_push_groups(pushes)
+            debug_bot.log(log_name, f"flushed {flushed} messages for {len(pushes)} chats")
+            return True
+        except Exception as exception:
+            error_bot.log(log_name, f"bulk write failed, requeueing {flushed} messages: {exception}")
+            self.requeue(pushes)
+            return False
+
+    def requeue(self, pushes: Dict[int, Dict]) -> None:
+        for chat_id, push in pushes.items():
+            pending: Optional[Dict] = self.pending.get(chat_id)
+            if pending:
+                push["$set"].update(pending["$set"])
+                for field in LOG_FIELDS:
+                    push[field].extend(pending[field])
+            self.pending[chat_id] = push
+        self.total = sum(len(push["history"]) for push in self.pending.values())
+
+    async def run(self) -> None:
+        """Flush on an interval until cancelled, then flush what is left"""
+        try:
+            while True:
+                await asyncio.sleep(self.flush_interval)
+                await self.flush()
+        finally:
+            await self.flush()
+
+
+group_message_buffer = GroupMessageBuffer(group_state_cache)
@@ -0,0 +1,208 @@
+from copy import deepcopy
+from typing import Dict, Iterable, List, Optional
+
+from cachetools import LRUCache
+
+from ..logger import debug_bot
+from ..utils import try_get
+from .mongo import HISTORY_WINDOW, GROUP_STATE_FIELDS, TelegramGroup, stamp_history_tokens
+from .mongo_async import AsyncMongoAbbot, async_mongo_abbot
+
+FILE_NAME = __name__
+
+GROUP_CACHE_MAX_CHATS: int = 1024
+GROUP_CACHE_FIELDS = (
+    "id",
+    "title",
+    "config",
+    "balance",
+    "admins",
+    "history",
+    "history_len",
+    "archived_history",
+    "summary",
+    "tokens",
+)
+
+
+class GroupStateCache:
+    """
+    Write-through, LRU-bounded per-chat cache in front of AsyncMongoAbbot for group state
+    Caches config, balance, title, admins, the rolling summary, history counts and the last HISTORY_WINDOW
+    history entries.
+    Reads are served from memory when every requested field is cached; every write goes to Mongo first and
+    the cached copy is then updated from the returned doc and the update itself, so a handler never reads
+    back state it just wrote. Call invalidate(chat_id) when a group doc is changed outside this process
+    """
+
+    def __init__(self, mongo: AsyncMongoAbbot, max_chats: int = GROUP_CACHE_MAX_CHATS):
+        self.mongo: AsyncMongoAbbot = mongo
+        self.states: LRUCache = LRUCache(maxsize=max_chats)
+        self.hits: int = 0
+        self.misses: int = 0
+
+    @staticmethod
+    def chat_id(filter: Dict) -> Optional[int]:
+        """Only plain {"id": chat_id} lookups are cacheable"""
+        return try_get(filter, "id") if list(filter.keys()) == ["id"] else None
+
+    def invalidate(self, chat_id: Optional[int] = None, fields: Optional[Iterable[str]] = None) -> None:
+        """Drop cached state for one chat (optionally only some fields), or for every chat when chat_id is None"""
+        if chat_id is None:
+            self.states.clear()
+        elif fields is None:
+            self.states.pop(chat_id, None)
+        else:
+            state: Dict = self.states.get(chat_id) or {}
+            for field in fields:
+                state.pop(field, None)
+
+    def cached(self, chat_id: Optional[int], fields: Iterable[str], history_limit: Optional[int]) -> Optional[Dict]:
+        if chat_id is None or chat_id not in self.states:
+            return None
+        if "history" in fields and (history_limit is None or history_limit > HISTORY_WINDOW):
+            return None
+        state: Dict = self.states[chat_id]
+        if any(field not in state for field in fields):
+            return None
+        doc: Dict = {field: deepcopy(state[field]) for field in fields}
+        history: Optional[List[Dict]] = try_get(doc, "history")
+        if history and len(history) > history_limit + 1:
+            doc["history"] = [history[0], *history[-history_limit:]]
+        return doc
+
+    def store(self, chat_id: Optional[int], doc: Optional[Dict], history_limit: Optional[int] = None) -> None:
+        """Merge the cacheable fields of a doc read from (or returned by) Mongo into the chat's state"""
+        if chat_id is None or not doc:
+            return
+        state: Dict = self.states.get(chat_id) or {}
+        for field in GROUP_CACHE_FIELDS:
+            if field not in doc:
+                continue
+            if field != "history":
+                state[field] = deepcopy(doc[field])
+            elif history_limit is None or history_limit >= HISTORY_WINDOW:
+                state[field] = self.tail(doc[field])
+        self.states[chat_id] = state
+
+    @staticmethod
+    def tail(history: Optional[List[Dict]]) -> Optional[List[Dict]]:
+        if not history or len(history) <= HISTORY_WINDOW + 1:
+            return deepcopy(history)
+        return deepcopy([history[0], *history[-HISTORY_WINDOW:]])
+
+    def apply(self, chat_id: Optional[int], update: Dict) -> None:
+        """Replay a successful update against the cached state; fields it cannot replay are dropped"""
+        state: Optional[Dict] = self.states.get(chat_id) if chat_id is not None else None
+        if state is None:
+            return
+        for op, values in update.items():
+            for path, value in values.items():
+                field, _, subfield = path.partition(".")
+                if op == "$push" and path == "history":
+                    entries: List[Dict] = try_get(value, "$each") if isinstance(value, dict) else None
+                    entries = entries if entries is not None else [value]
+                    if "history" in state:
+                        state["history"] = self.tail([*(state["history"] or []), *deepcopy(entries)])
+                    if "history_len" in state:
+                        state["history_len"] += len(entries)
+                    continue
+                if field not in GROUP_CACHE_FIELDS or field not in state:
+                    continue
+                if op == "$set" and not subfield:
+                    state[field] = deepcopy(value)
+                    if field == "history":
+                        state[field] = self.tail(value)
+                        state["history_len"] = len(value)
+                elif op == "$set" and isinstance(state[field], dict) and "." not in subfield:
+                    state[field] = {**state[field], subfield: deepcopy(value)}
+                elif op == "$inc" and not subfield and isinstance(state[field], int):
+                    state[field] += value
+                else:
+                    state.pop(field, None)
+
+    # reads
+    async def find_one_group(
+        self, filter: Dict, fields: Optional[Iterable[str]] = None, history_limit: Optional[int] = None
+    ) -> Optional[TelegramGroup]:
+        chat_id: Optional[int] = self.chat_id(filter)
+        if fields is not None:
+            doc: Optional[Dict] = self.cached(chat_id, fields, history_limit)
+            if doc is not None:
+                self.hits += 1
+                return doc
+        self.misses += 1
+        group: Optional[TelegramGroup] = await self.mongo.find_one_group(filter, fields, history_limit)
+        self.store(chat_id, group, history_limit)
+        return group
+
+    async def group_does_exist(self, filter: Dict) -> bool:
+        chat_id: Optional[int] = self.chat_id(filter)
+        if chat_id is not None and chat_id in self.states:
+            self.hits += 1
+            return True
+        return await self.mongo.group_does_exist(filter)
+
+    async def get_group_config(self, filter: Dict) -> Optional[Dict]:
+        group: Optional[TelegramGroup] = await self.find_one_group(filter, fields=["config"])
+        return try_get(group, "config")
+
+    async def get_group_balance(self, filter: Dict) -> int:
+        group: Optional[TelegramGroup] = await self.find_one_group(filter, fields=["balance"])
+        return try_get(group, "balance")
+
+    async def get_group_state(self, filter: Dict) -> Optional[TelegramGroup]:
+        return await self.find_one_group(filter, fields=GROUP_STATE_FIELDS)
+
+    async def get_group_history(self, filter: Dict, limit: Optional[int] = None) -> List[Dict]:
+        group: Optional[TelegramGroup] = await self.find_one_group(filter, fields=["history"], history_limit=limit)
+        return try_get(group, "history", default=[])
+
+    # writes
+    async def find_one_group_and_update(
+        self, filter: Dict, update: Dict, fields: Optional[Iterable[str]] = None, history_limit: Optional[int] = None
+    ) -> Optional[TelegramGroup]:
+        chat_id: Optional[int] = self.chat_id(filter)
+        update = stamp_history_tokens(update)
+        group: Optional[TelegramGroup] = await self.mongo.find_one_group_and_update(
+            filter, update, fields, history_limit
+        )
+        self.apply(chat_id, update)
+        self.store(chat_id, group, history_limit)
+        return group
+
+    async def update_one_group(self, filter: Dict, update: Dict):
+        update = stamp_history_tokens(update)
+        result = await self.mongo.update_one_group(filter, update)
+        self.apply(self.chat_id(filter), update)
+        return result
+
+    async def inc_group_balance(
+        self, chat_id: int, sats: int, minimum: Optional[int] = None
+    ) -> Optional[TelegramGroup]:
+        """
+        Atomically $inc a group's balance by sats; with minimum set the update only applies while the balance is
+        at least minimum, so a debit can never take it below zero. Never upserts: returns None when the group does
+        not exist or the condition did not hold
+        """
+        filter: Dict = {"id": chat_id} if minimum is None else {"id": chat_id, "balance": {"$gte": minimum}}
+        group: Optional[TelegramGroup] = await self.mongo.inc_one_group(filter, {"balance": sats})
+        if group:
+            self.store(chat_id, group)
+        return group
+
+    async def bulk_push_groups(self, pushes: Dict[int, Dict]):
+        """Write-through for GroupMessageBuffer flushes"""
+        log_name: str = f"{FILE_NAME}: GroupStateCache.bulk_push_groups"
+        result = await self.mongo.bulk_push_groups(pushes)
+        for chat_id, push in pushes.items():
+            update: Dict = {"$set": try_get(push, "$set", default={})}
+            history: List[Dict] = try_get(push, "history", default=[])
+            if history:
+                update["$push"] = {"history": {"$each": history}}
+            self.apply(chat_id, stamp_history_tokens(update))
+        debug_bot.log(log_name, f"chats={len(self.states)} hits={self.hits} misses={self.misses}")
+        return result
+
+
+group_state_cache = GroupStateCache(async_mongo_abbot)
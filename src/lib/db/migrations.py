@@ -0,0 +1,340 @@
+from datetime import datetime, timedelta
+from time import perf_counter
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from pymongo import ASCENDING, DESCENDING, IndexModel, ReplaceOne
+from pymongo.collection import Collection
+from pymongo.errors import BulkWriteError, OperationFailure
+
+from ..abbot.env import DATABASE_STORAGE_MODE
+from ..logger import debug_bot, error_bot
+from ..utils import error, success, successful, try_get
+from .mongo import (
+    LOG_FIELDS,
+    LOG_INDEX,
+    LOG_SEQ_FIELDS,
+    STORAGE_MODE_APPEND,
+    btcusd,
+    btcusd_1h,
+    btcusd_1m,
+    btcusd_ticks,
+    nostr_channel_invites,
+    nostr_channels,
+    nostr_dms,
+    telegram_answers,
+    telegram_db,
+    telegram_dms,
+    telegram_groups,
+    telegram_history,
+    telegram_ledger,
+    telegram_messages,
+    build_log_docs,
+)
+from .prices import (
+    PRICE_MINUTE_TTL_DAYS,
+    PRICE_PAIR,
+    PRICE_TICK_INDEX,
+    PRICE_TICK_TTL_DAYS,
+    as_datetime,
+    ohlc_buckets,
+)
+
+FILE_NAME = __name__
+
+# queries slower than this when explained against a local mongod are reported as slow
+SLOW_QUERY_MS: int = 50
+
+migrations_collection: Collection = telegram_db.get_collection("migrations")
+
+
+class IndexSpec:
+    """
+    One required index: the collection it lives on, its key, options, and the query shape it serves
+    The probe is explained by index_report to catch collection scans and slow plans
+    """
+
+    def __init__(
+        self,
+        collection: Collection,
+        keys: List[Tuple[str, int]],
+        probe: Dict,
+        sort: Optional[List[Tuple[str, int]]] = None,
+        builtin: bool = False,
+        **options,
+    ):
+        self.collection: Collection = collection
+        self.keys: List[Tuple[str, int]] = keys
+        self.probe: Dict = probe
+        self.sort: Optional[List[Tuple[str, int]]] = sort
+        self.builtin: bool = builtin
+        self.options: Dict = options
+
+    @property
+    def namespace(self) -> str:
+        return self.collection.full_name
+
+    def model(self) -> IndexModel:
+        return IndexModel(self.keys, **self.options)
+
+    def exists(self, index_information: Dict) -> bool:
+        return any([tuple(key) for key in try_get(index, "key")] == self.keys for index in index_information.values())
+
+
+# legacy price docs and the OHLC buckets are keyed by time, so the default _id index serves latest/range reads
+INDEX_SPECS: List[IndexSpec] = [
+    IndexSpec(telegram_groups, [("id", ASCENDING)], {"id": 0}, unique=True, name="id_unique"),
+    IndexSpec(telegram_dms, [("id", ASCENDING)], {"id": 0}, unique=True, name="id_unique"),
+    IndexSpec(telegram_messages, LOG_INDEX, {"chat_id": 0}, [("seq", DESCENDING)], unique=True, name="chat_seq"),
+    IndexSpec(telegram_history, LOG_INDEX, {"chat_id": 0}, [("seq", DESCENDING)], unique=True, name="chat_seq"),
+    IndexSpec(nostr_channels, [("id", ASCENDING)], {"id": ""}, unique=True, name="event_id_unique"),
+    IndexSpec(nostr_dms, [("id", ASCENDING)], {"id": ""}, unique=True, name="event_id_unique"),
+    IndexSpec(nostr_channel_invites, [("id", ASCENDING)], {"id": ""}, unique=True, name="event_id_unique"),
+    IndexSpec(
+        telegram_answers, [("expires_at", ASCENDING)], {"expires_at": None}, expireAfterSeconds=0, name="expires_ttl"
+    ),
+    IndexSpec(telegram_answers, [("last_hit_at", ASCENDING)], {}, [("last_hit_at", ASCENDING)], name="last_hit"),
+    IndexSpec(
+        telegram_ledger,
+        [("chat_id", ASCENDING), ("created_at", DESCENDING)],
+        {"chat_id": 0},
+        [("created_at", DESCENDING)],
+        name="chat_created",
+    ),
+    IndexSpec(btcusd, [("_id", ASCENDING)], {}, [("_id", DESCENDING)], builtin=True),
+    IndexSpec(btcusd_ticks, PRICE_TICK_INDEX, {"pair": PRICE_PAIR}, [("ts", DESCENDING)], name="pair_ts"),
+    IndexSpec(
+        btcusd_1m,
+        [("ts", ASCENDING)],
+        {"ts": None},
+        expireAfterSeconds=PRICE_MINUTE_TTL_DAYS * 86400,
+        name="ts_ttl",
+    ),
+    IndexSpec(btcusd_1m, [("_id", ASCENDING)], {}, [("_id", DESCENDING)], builtin=True),
+    IndexSpec(btcusd_1h, [("_id", ASCENDING)], {}, [("_id", DESCENDING)], builtin=True),
+]
+
+
+def ensure_indexes(specs: List[IndexSpec] = INDEX_SPECS) -> Dict:
+    """Create every declared index that is missing; create_indexes is a no-op for ones that already exist"""
+    log_name: str = f"{FILE_NAME}: ensure_indexes"
+    by_collection: Dict[str, Tuple[Collection, List[IndexModel]]] = {}
+    for spec in specs:
+        if spec.builtin:
+            continue
+        _, models = by_collection.setdefault(spec.namespace, (spec.collection, []))
+        models.append(spec.model())
+    created: Dict[str, List[str]] = {}
+    failed: Dict[str, str] = {}
+    for namespace, (collection, models) in by_collection.items():
+        try:
+            created[namespace] = collection.create_indexes(models)
+        except OperationFailure as exception:
+            failed[namespace] = str(exception)
+            error_bot.log(log_name, f"{namespace}: {exception}")
+    if failed:
+        return error("Failed to create indexes", data=failed)
+    debug_bot.log(log_name, f"indexes ensured on {len(created)} collections")
+    return success("Indexes ensured", data=created)
+
+
+def winning_stages(plan: Dict) -> List[str]:
+    stages: List[str] = [try_get(plan, "stage")]
+    if try_get(plan, "inputStage"):
+        stages.extend(winning_stages(plan["inputStage"]))
+    for input_stage in try_get(plan, "inputStages", default=[]):
+        stages.extend(winning_stages(input_stage))
+    return stages
+
+
+def index_report(specs: List[IndexSpec] = INDEX_SPECS, slow_query_ms: int = SLOW_QUERY_MS) -> Dict:
+    """
+    Check every declared index exists and that its probe query is served by an index in reasonable time
+    Returns error with data={"missing": [...], "slow": [...]} if anything needs attention
+    """
+    log_name: str = f"{FILE_NAME}: index_report"
+    missing: List[str] = []
+    slow: List[str] = []
+    for spec in specs:
+        label: str = f"{spec.namespace} {spec.keys}"
+        if not spec.exists(spec.collection.index_information()):
+            missing.append(label)
+        cursor = spec.collection.find(spec.probe)
+        if spec.sort:
+            cursor = cursor.sort(spec.sort).limit(1)
+        explained: Dict = cursor.explain()
+        stages: List[str] = winning_stages(try_get(explained, "queryPlanner", "winningPlan", default={}))
+        millis: int = try_get(explained, "executionStats", "executionTimeMillis", default=0)
+        if "COLLSCAN" in stages:
+            slow.append(f"{label} collection scan")
+        elif millis > slow_query_ms:
+            slow.append(f"{label} {millis}ms")
+    for label in missing:
+        error_bot.log(log_name, f"missing index {label}")
+    for label in slow:
+        error_bot.log(log_name, f"slow query {label}")
+    if missing or slow:
+        return error("Indexes need attention", data={"missing": missing, "slow": slow})
+    debug_bot.log(log_name, f"{len(specs)} indexes present and used")
+    return success("Indexes ok", data={"missing": missing, "slow": slow})
+
+
+def legacy_prices() -> Iterator[Tuple[datetime, float]]:
+    for doc in btcusd.find({}, {"amount": 1}).sort("_id", ASCENDING):
+        if try_get(doc, "amount") is not None:
+            yield as_datetime(doc["_id"]), float(doc["amount"])
+
+
+def create_price_series() -> Dict:
+    """
+    Create prices.btcusd_ticks as a time-series collection with a TTL, then backfill the OHLC buckets (and ticks
+    still inside the TTL) from the legacy prices.btcusd collection, which is no longer written and can be dropped
+    An empty plain collection of the same name (left by index creation on a fresh db) is replaced
+    """
+    log_name: str = f"{FILE_NAME}: create_price_series"
+    database = btcusd_ticks.database
+    existing: Optional[Dict] = next(database.list_collections(filter={"name": btcusd_ticks.name}), None)
+    if existing and try_get(existing, "type") != "timeseries":
+        if btcusd_ticks.estimated_document_count():
+            return error(f"{btcusd_ticks.full_name} exists and is not a time-series collection")
+        btcusd_ticks.drop()
+        existing = None
+    try:
+        if not existing:
+            database.create_collection(
+                btcusd_ticks.name,
+                timeseries={"timeField": "ts", "metaField": "pair", "granularity": "seconds"},
+                expireAfterSeconds=PRICE_TICK_TTL_DAYS * 86400,
+            )
+        btcusd_ticks.create_index(PRICE_TICK_INDEX, name="pair_ts")
+        if btcusd_ticks.count_documents({}, limit=1):
+            return success("Price series already populated", data=0)
+        ticks: List[Tuple[datetime, float]] = list(legacy_prices())
+        for collection, resolution in ((btcusd_1m, "1m"), (btcusd_1h, "1h")):
+            buckets: List[Dict] = list(ohlc_buckets(ticks, resolution).values())
+            if buckets:
+                collection.bulk_write([ReplaceOne({"_id": bucket["_id"]}, bucket, upsert=True) for bucket in buckets])
+        cutoff: datetime = as_datetime(datetime.now().timestamp()) - timedelta(days=PRICE_TICK_TTL_DAYS)
+        recent: List[Dict] = [{"ts": at, "pair": PRICE_PAIR, "amount": price} for at, price in ticks if at >= cutoff]
+        if recent:
+            btcusd_ticks.insert_many(recent, ordered=False)
+    except OperationFailure as exception:
+        error_bot.log(log_name, f"{exception}")
+        return error("Failed to create price series", data=str(exception))
+    debug_bot.log(log_name, f"backfilled {len(ticks)} legacy prices, {len(recent)} as ticks")
+    return success("Price series created", data=len(ticks))
+
+
+def append_mode() -> bool:
+    return DATABASE_STORAGE_MODE == STORAGE_MODE_APPEND
+
+
+def backfill_append_logs() -> Dict:
+    """
+    Copy the messages/history arrays of telegram chats written in document mode into the log collections and
+    seed their seq counters, so switching a deployment to append mode keeps every chat's context
+    Only logs without a counter are backfilled: chats created in append mode, or already backfilled, are skipped.
+    The arrays are left on the docs (append mode never reads them) so switching back loses nothing
+    """
+    log_name: str = f"{FILE_NAME}: backfill_append_logs"
+    logs: Dict[str, Collection] = {"messages": telegram_messages, "history": telegram_history}
+    backfilled: Dict[str, int] = {field: 0 for field in LOG_FIELDS}
+    created_at: datetime = datetime.now()
+    for chats in (telegram_groups, telegram_dms):
+        pending: Dict = {"$or": [{LOG_SEQ_FIELDS[field]: {"$exists": False}} for field in LOG_FIELDS]}
+        projection: Dict = {
+            "id": 1,
+            **{field: 1 for field in LOG_FIELDS},
+            **{seq: 1 for seq in LOG_SEQ_FIELDS.values()},
+        }
+        for doc in chats.find(pending, projection):
+            for field in LOG_FIELDS:
+                seq_field: str = LOG_SEQ_FIELDS[field]
+                if seq_field in doc:
+                    continue
+                entries: List[Dict] = [
+                    entry for entry in try_get(doc, field, default=[]) or [] if try_get(entry, "role") != "system"
+                ]
+                log_docs: List[Dict] = build_log_docs(
+                    {"id": try_get(doc, "id"), seq_field: len(entries)}, {field: entries}, created_at
+                )[field]
+                try:
+                    if log_docs:
+                        logs[field].insert_many(log_docs, ordered=False)
+                except BulkWriteError as exception:
+                    # a rerun after a partial backfill: the (chat_id, seq) entries already copied are kept
+                    duplicates: bool = all(write_error["code"] == 11000 for write_error in exception.details["writeErrors"])
+                    if not duplicates:
+                        error_bot.log(log_name, f"chat_id={try_get(doc, 'id')} {field}: {exception.details}")
+                        return error("Failed to backfill append logs", data=backfilled)
+                chats.update_one(
+                    {"_id": doc["_id"], seq_field: {"$exists": False}}, {"$set": {seq_field: len(entries)}}
+                )
+                backfilled[field] += len(log_docs)
+    debug_bot.log(log_name, f"backfilled {backfilled}")
+    return success("Append logs backfilled", data=backfilled)
+
+
+class Migration:
+    """
+    A numbered, idempotent schema change; applied once and recorded in the migrations collection
+    A migration with a condition stays pending, unapplied and unrecorded, until the condition holds
+    """
+
+    def __init__(self, version: int, name: str, apply: Callable[[], Dict], when: Optional[Callable[[], bool]] = None):
+        self.version: int = version
+        self.name: str = name
+        self.apply: Callable[[], Dict] = apply
+        self.when: Optional[Callable[[], bool]] = when
+
+    def due(self) -> bool:
+        return self.when is None or self.when()
+
+
+# append new migrations with the next version; never renumber or edit one that has shipped
+MIGRATIONS: List[Migration] = [
+    Migration(1, "create_indexes", ensure_indexes),
+    Migration(2, "create_price_series", create_price_series),
+    Migration(3, "backfill_append_logs", backfill_append_logs, when=append_mode),
+]
+
+
+def applied_versions() -> List[int]:
+    return [try_get(doc, "_id") for doc in migrations_collection.find({}, {"_id": 1}).sort("_id", ASCENDING)]
+
+
+def run_migrations(migrations: List[Migration] = MIGRATIONS) -> Dict:
+    """Apply pending migrations in version order, stopping at the first failure"""
+    log_name: str = f"{FILE_NAME}: run_migrations"
+    applied: List[int] = applied_versions()
+    ran: List[int] = []
+    for migration in sorted(migrations, key=lambda migration: migration.version):
+        if migration.version in applied or not migration.due():
+            continue
+        debug_bot.log(log_name, f"applying {migration.version} {migration.name}")
+        started: float = perf_counter()
+        result: Dict = migration.apply()
+        if not successful(result):
+            error_bot.log(log_name, f"migration {migration.version} {migration.name} failed: {result}")
+            return error(f"Migration {migration.version} {migration.name} failed", data=ran, result=result)
+        migrations_collection.insert_one(
+            {
+                "_id": migration.version,
+                "name": migration.name,
+                "applied_at": datetime.now(),
+                "duration_ms": int((perf_counter() - started) * 1000),
+            }
+        )
+        ran.append(migration.version)
+    debug_bot.log(log_name, f"schema at version {max([*applied, *ran], default=0)}, applied {ran}")
+    return success("Migrations applied", data=ran)
+
+
+def bootstrap() -> Dict:
+    """Startup step: run pending migrations, make sure declared indexes exist, then report on them"""
+    migrated: Dict = run_migrations()
+    if not successful(migrated):
+        return migrated
+    ensured: Dict = ensure_indexes()
+    if not successful(ensured):
+        return ensured
+    return index_report()
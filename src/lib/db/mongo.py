@@ -1,22 +1,26 @@
+import zlib
 from abc import abstractmethod
 from datetime import datetime
 from cli_args import TELEGRAM_MODE, TEST_MODE, DEV_MODE
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 
 from nostr_sdk import PublicKey, EventId, Event
 
 from telegram import Chat, ChatMember, Message
 
-from pymongo import MongoClient
+from pymongo import ASCENDING, DESCENDING, MongoClient, ReturnDocument, UpdateOne
 from pymongo.collection import Collection
 from pymongo.cursor import Cursor
-from pymongo.results import InsertOneResult, InsertManyResult, UpdateResult
+from pymongo.results import BulkWriteResult, InsertOneResult, InsertManyResult, UpdateResult
+import bson
+from bson.binary import Binary
 from bson.typings import _DocumentType
 
 from ..logger import debug_bot
 from ..utils import success, to_dict, try_get
-from ..abbot.env import DATABASE_CONNECTION_STRING
+from ..abbot.env import DATABASE_CONNECTION_STRING, DATABASE_STORAGE_MODE, DATABASE_STORE_RAW_MESSAGES
 from ..abbot.config import BOT_SYSTEM_OBJECT_GROUPS, BOT_SYSTEM_OBJECT_DMS
+from ..abbot.utils import count_tokens
 
 client = MongoClient(host=DATABASE_CONNECTION_STRING)
 
@@ -40,12 +44,136 @@ nostr_channel_invites = nostr_db.get_collection("channel_invite")
 telegram_db = client.get_database(telegram_db_name)
 telegram_groups = telegram_db.get_collection("group")
 telegram_dms = telegram_db.get_collection("dm")
+telegram_messages = telegram_db.get_collection("message")
+telegram_history = telegram_db.get_collection("history")
+telegram_answers = telegram_db.get_collection("answer")
+telegram_ledger = telegram_db.get_collection("ledger")
 
 bitcoin_prices = client.get_database("bitcoin_prices")
 btcusd = bitcoin_prices.get_collection("btcusd")
 
 db_prices = client.get_database("prices")
 btcusd = db_prices.get_collection("btcusd")
+btcusd_ticks = db_prices.get_collection("btcusd_ticks")
+btcusd_1m = db_prices.get_collection("btcusd_1m")
+btcusd_1h = db_prices.get_collection("btcusd_1h")
+
+# "document" keeps messages/history as arrays on the group/dm doc
+# "append" writes them to the message/history collections keyed by (chat_id, seq)
+STORAGE_MODE_DOCUMENT = "document"
+STORAGE_MODE_APPEND = "append"
+STORAGE_MODES = (STORAGE_MODE_DOCUMENT, STORAGE_MODE_APPEND)
+HISTORY_WINDOW: int = 100
+LOG_FIELDS: Tuple[str, ...] = ("messages", "history")
+LOG_SEQ_FIELDS: Dict[str, str] = {"messages": "messages_seq", "history": "history_seq"}
+LOG_INDEX = [("chat_id", ASCENDING), ("seq", ASCENDING)]
+HISTORY_ENTRY_FIELDS: Tuple[str, ...] = ("role", "content", "tokens")
+LOG_RANGE_PROJECTION: Dict = {"_id": 0, "chat_id": 0, "created_at": 0}
+SEQ_PROJECTION: Dict = {"_id": 0, "id": 1, **{seq_field: 1 for seq_field in LOG_SEQ_FIELDS.values()}}
+
+# common read shapes for find_one_group/find_one_group_and_update(fields=...)
+GROUP_STATE_FIELDS: Tuple[str, ...] = ("id", "title", "config", "balance")
+CONTEXT_FIELDS: Tuple[str, ...] = ("history", "history_len", "archived_history", "summary", "tokens")
+GROUP_TURN_FIELDS: Tuple[str, ...] = ("id", "config", "balance", *CONTEXT_FIELDS)
+
+
+def split_log_update(update: Dict) -> Tuple[Dict, Dict[str, List[Dict]], Set[str]]:
+    """
+    Pull the messages/history writes out of a group/dm update so they can be written to the log collections.
+    $push extends a log: the returned update reserves the seq range for the appended entries via $inc. $set
+    replaces a log, as it replaces the array in document mode: the field is returned in `replaced`, its
+    counter is $set to the new length and the caller deletes the chat's old entries before writing the new
+    ones from seq 0. System entries are not stored, they are prepended on read.
+    """
+    update: Dict = {op: dict(fields) if isinstance(fields, dict) else fields for op, fields in update.items()}
+    entries: Dict[str, List[Dict]] = {field: [] for field in LOG_FIELDS}
+    replaced: Set[str] = set()
+    for op in ("$set", "$push"):
+        fields: Dict = update.get(op)
+        if not fields:
+            continue
+        for field in LOG_FIELDS:
+            if field not in fields:
+                continue
+            value = fields.pop(field)
+            if op == "$push":
+                value = value.get("$each", [value]) if isinstance(value, dict) else [value]
+            else:
+                replaced.add(field)
+            entries[field].extend(entry for entry in value if try_get(entry, "role") != "system")
+        if not fields:
+            update.pop(op)
+    seq_set = {LOG_SEQ_FIELDS[field]: len(entries[field]) for field in replaced}
+    if seq_set:
+        update["$set"] = {**update.get("$set", {}), **seq_set}
+    seq_inc = {LOG_SEQ_FIELDS[field]: len(value) for field, value in entries.items() if value and field not in replaced}
+    if seq_inc:
+        update["$inc"] = {**update.get("$inc", {}), **seq_inc}
+    return update, entries, replaced
+
+
+def stamp_history_tokens(update: Dict) -> Dict:
+    """
+    Stamp every history entry an update writes with its token count (in place) and keep the chat's running
+    "tokens" total: $inc by the pushed entries, or $set to the total of a seeded history. System entries are
+    not counted. Updates that already write "tokens" are returned as is, so stamping twice is harmless
+    """
+    total: int = 0
+    for op in ("$set", "$push"):
+        value = try_get(update, op, "history")
+        if value is None:
+            continue
+        entries: List[Dict] = value if op == "$set" else value.get("$each", [value])
+        for entry in entries:
+            if try_get(entry, "role") == "system":
+                continue
+            if "tokens" not in entry:
+                entry["tokens"] = count_tokens(try_get(entry, "content"))
+            total += entry["tokens"]
+    if "tokens" in try_get(update, "$set", default={}) or "tokens" in try_get(update, "$inc", default={}):
+        return update
+    if try_get(update, "$set", "history") is not None:
+        return {**update, "$set": {**update["$set"], "tokens": total}}
+    if total:
+        return {**update, "$inc": {**try_get(update, "$inc", default={}), "tokens": total}}
+    return update
+
+
+def build_log_docs(doc: Optional[Dict], entries: Dict[str, List[Dict]], created_at: datetime) -> Dict[str, List[Dict]]:
+    """Turn split entries into log docs using the seq range reserved on the chat doc returned by the update"""
+    chat_id: int = try_get(doc, "id")
+    log_docs: Dict[str, List[Dict]] = {field: [] for field in LOG_FIELDS}
+    if chat_id is None:
+        return log_docs
+    for field, field_entries in entries.items():
+        first_seq: int = try_get(doc, LOG_SEQ_FIELDS[field], default=len(field_entries)) - len(field_entries)
+        log_docs[field] = [
+            {**entry, "chat_id": chat_id, "seq": first_seq + offset, "created_at": created_at}
+            for offset, entry in enumerate(field_entries)
+        ]
+    return log_docs
+
+
+def bulk_push_updates(pushes: Dict[int, Dict]) -> Dict[int, Dict]:
+    updates: Dict[int, Dict] = {}
+    for chat_id, push in pushes.items():
+        update: Dict = {"$push": {field: {"$each": try_get(push, field, default=[])} for field in LOG_FIELDS}}
+        if try_get(push, "$set"):
+            update["$set"] = push["$set"]
+        updates[chat_id] = stamp_history_tokens(update)
+    return updates
+
+
+def log_range_filter(chat_id: int, start_seq: Optional[int] = None, end_seq: Optional[int] = None) -> Dict:
+    filter: Dict = {"chat_id": chat_id}
+    seq_range: Dict = {}
+    if start_seq is not None:
+        seq_range["$gte"] = start_seq
+    if end_seq is not None:
+        seq_range["$lt"] = end_seq
+    if seq_range:
+        filter["seq"] = seq_range
+    return filter
 
 
 @to_dict
@@ -86,6 +214,43 @@ class MongoNostrEvent(NostrEvent, GroupConfig):
 
 
 # ====== Telegram Types ======
+@to_dict
+class TelegramMessage:
+    """
+    Slim stored form of a telegram Message: ids, author, timestamp, text, reply and entity offsets
+    The full message.to_dict() payload is kept zlib-compressed in `raw` when DATABASE_STORE_RAW_MESSAGES;
+    it is only decoded on request via decode_raw_message
+    """
+
+    def __init__(self, message: Message, store_raw: bool = DATABASE_STORE_RAW_MESSAGES):
+        self.message_id: int = message.message_id
+        self.chat_id: int = message.chat.id
+        self.from_id: Optional[int] = message.from_user.id if message.from_user else None
+        self.date: int = int(message.date.timestamp())
+        self.text: Optional[str] = message.text or message.caption
+        if message.reply_to_message:
+            self.reply_to_id: int = message.reply_to_message.message_id
+        entities = message.entities or message.caption_entities
+        if entities:
+            self.entities: List[Dict] = [
+                {"type": entity.type, "offset": entity.offset, "length": entity.length} for entity in entities
+            ]
+        if store_raw:
+            self.raw: Binary = Binary(zlib.compress(bson.encode(message.to_dict())))
+
+    @abstractmethod
+    def to_dict(self):
+        pass
+
+
+def decode_raw_message(message: Dict) -> Optional[Dict]:
+    """Full telegram payload of a stored message; legacy docs stored it verbatim"""
+    raw: Optional[bytes] = try_get(message, "raw")
+    if raw is not None:
+        return bson.decode(zlib.decompress(raw))
+    return message if try_get(message, "chat") else None
+
+
 @to_dict
 class TelegramDM:
     def __init__(self, message: Message):
@@ -93,7 +258,7 @@ class TelegramDM:
         self.id: int = message.chat.id
         self.username: str = message.from_user.username
         self.type: str = message.chat.type
-        self.messages = [message.to_dict()]
+        self.messages = [TelegramMessage(message).to_dict()]
         self.history = [BOT_SYSTEM_OBJECT_DMS]
 
     @abstractmethod
@@ -109,7 +274,7 @@ class TelegramGroup(GroupConfig):
         self.type: str = message.chat.type
         self.admins: List = admins
         self.balance: int = 5000
-        self.messages = [message.to_dict()]
+        self.messages = [TelegramMessage(message).to_dict()]
         self.history = [BOT_SYSTEM_OBJECT_GROUPS]
         self.config = GroupConfig(introduced=False, started=False, unleashed=False, count=None)
 
@@ -144,11 +309,16 @@ class MongoTelegram:
 
 @to_dict
 class MongoAbbot(MongoNostr, MongoTelegram):
-    def __init__(self, db_name):
+    def __init__(self, db_name, storage_mode: str = STORAGE_MODE_DOCUMENT):
+        assert storage_mode in STORAGE_MODES, f"storage_mode must be one of {', '.join(STORAGE_MODES)}"
         self.db_name = db_name
+        self.storage_mode = STORAGE_MODE_DOCUMENT
         if db_name == "telegram":
             self.groups: Collection[_DocumentType] = telegram_groups
             self.direct_messages: Collection[_DocumentType] = telegram_dms
+            self.message_log: Collection[_DocumentType] = telegram_messages
+            self.history_log: Collection[_DocumentType] = telegram_history
+            self.storage_mode = storage_mode
         elif db_name == "nostr":
             self.groups: Collection[_DocumentType] = nostr_channels
             self.direct_messages: Collection[_DocumentType] = nostr_dms
@@ -186,28 +356,30 @@ class MongoAbbot(MongoNostr, MongoTelegram):
     def find_groups_cursor(self, filter: Dict) -> Cursor:
         return self.groups.find(filter, {"_id": 0})
 
-    def find_one_group(self, filter: Dict) -> Optional[_DocumentType]:
-        return self.groups.find_one(filter, {"_id": 0})
-
-    def find_one_group_and_update(self, filter: Dict, update: Dict) -> Optional[_DocumentType]:
-        return self.groups.find_one_and_update(
-            filter,
-            update,
-            return_document=True,
-            upsert=True,
-            projection={"_id": 0},
+    def find_one_group(
+        self, filter: Dict, fields: Optional[Iterable[str]] = None, history_limit: Optional[int] = None
+    ) -> Optional[_DocumentType]:
+        group = self.groups.find_one(filter, self.projection(fields, history_limit))
+        return self.hydrate(group, BOT_SYSTEM_OBJECT_GROUPS, fields, history_limit)
+
+    def find_one_group_and_update(
+        self, filter: Dict, update: Dict, fields: Optional[Iterable[str]] = None, history_limit: Optional[int] = None
+    ) -> Optional[_DocumentType]:
+        return self.find_one_and_update_log(
+            self.groups, filter, update, BOT_SYSTEM_OBJECT_GROUPS, fields, history_limit
         )
 
-    def find_one_dm(self, filter: Dict) -> Optional[_DocumentType]:
-        return self.direct_messages.find_one(filter, {"_id": 0})
-
-    def find_one_dm_and_update(self, filter: Dict, update: Dict) -> Optional[_DocumentType]:
-        return self.direct_messages.find_one_and_update(
-            filter,
-            update,
-            return_document=True,
-            upsert=True,
-            projection={"_id": 0},
+    def find_one_dm(
+        self, filter: Dict, fields: Optional[Iterable[str]] = None, history_limit: Optional[int] = None
+    ) -> Optional[_DocumentType]:
+        dm = self.direct_messages.find_one(filter, self.projection(fields, history_limit))
+        return self.hydrate(dm, BOT_SYSTEM_OBJECT_DMS, fields, history_limit)
+
+    def find_one_dm_and_update(
+        self, filter: Dict, update: Dict, fields: Optional[Iterable[str]] = None, history_limit: Optional[int] = None
+    ) -> Optional[_DocumentType]:
+        return self.find_one_and_update_log(
+            self.direct_messages, filter, update, BOT_SYSTEM_OBJECT_DMS, fields, history_limit
         )
 
     def find_dms(self, filter: Dict) -> List[Optional[_DocumentType]]:
@@ -219,41 +391,217 @@ class MongoAbbot(MongoNostr, MongoTelegram):
     # update docs
     def update_one(self, collection: str, filter: Dict, update: Dict) -> UpdateResult:
         if collection == "dm":
-            return self.update_one_dm(filter, update, return_document=True, upsert=True)
+            return self.update_one_dm(filter, update)
         else:
-            return self.update_one_group(filter, update, return_document=True, upsert=True)
+            return self.update_one_group(filter, update)
 
     def update_one_group(self, filter: Dict, update: Dict) -> UpdateResult:
-        return self.groups.update_one(filter, update, return_document=True, upsert=True)
+        return self.update_one_log(self.groups, filter, update)
 
     def update_one_dm(self, filter, update: Dict) -> UpdateResult:
-        return self.direct_messages.update_one(filter, update, return_document=True, upsert=True)
+        return self.update_one_log(self.direct_messages, filter, update)
+
+    def bulk_push_groups(self, pushes: Dict[int, Dict]) -> Optional[BulkWriteResult]:
+        """
+        Apply buffered writes for many groups at once
+        pushes maps chat_id => {"$set": {...}, "messages": [...], "history": [...]}
+        Document mode sends a single bulk_write; append mode reserves each chat's seq range and then
+        inserts all entries with one insert_many per log collection
+        """
+        if not pushes:
+            return None
+        updates: Dict[int, Dict] = bulk_push_updates(pushes)
+        if not self.append_mode():
+            operations = [UpdateOne({"id": chat_id}, update, upsert=True) for chat_id, update in updates.items()]
+            return self.groups.bulk_write(operations, ordered=False)
+        log_docs: Dict[str, List[Dict]] = {field: [] for field in LOG_FIELDS}
+        created_at = datetime.now()
+        for chat_id, update in updates.items():
+            update, entries, _ = split_log_update(update)
+            group: Optional[_DocumentType] = self.groups.find_one_and_update(
+                {"id": chat_id}, update, return_document=ReturnDocument.AFTER, upsert=True, projection=SEQ_PROJECTION
+            )
+            for field, docs in build_log_docs(group, entries, created_at).items():
+                log_docs[field].extend(docs)
+        for field, docs in log_docs.items():
+            if docs:
+                self.log_collection(field).insert_many(docs, ordered=False)
+        return None
+
+    # append-only message/history log
+    def append_mode(self) -> bool:
+        return self.storage_mode == STORAGE_MODE_APPEND
+
+    def doc_projection(self) -> Dict:
+        if self.append_mode():
+            return {"_id": 0, "messages": 0, "history": 0}
+        return {"_id": 0}
+
+    def projection(self, fields: Optional[Iterable[str]] = None, history_limit: Optional[int] = None) -> Dict:
+        """
+        Build a read projection: `fields` limits the doc to those keys and `history_limit` keeps only the
+        last N history entries via $slice. "history_len" is the size of the history without shipping it.
+        In append mode the log arrays are never projected; hydrate() reads them from the log collections
+        """
+        if fields is None:
+            projection: Dict = self.doc_projection()
+            if history_limit is not None and not self.append_mode():
+                projection["history"] = {"$slice": -history_limit}
+            return projection
+        projection: Dict = {"_id": 0}
+        for field in fields:
+            if self.append_mode() and field in (*LOG_FIELDS, "history_len"):
+                continue
+            if field == "history_len":
+                projection[field] = {"$size": {"$ifNull": ["$history", []]}}
+            elif field == "history" and history_limit is not None:
+                projection[field] = {"$slice": -history_limit}
+            else:
+                projection[field] = 1
+        if self.append_mode():
+            projection.update(SEQ_PROJECTION)
+        return projection
+
+    def needs_history_window(self, doc: Optional[_DocumentType], fields: Optional[Iterable[str]] = None) -> bool:
+        return bool(doc) and self.append_mode() and (fields is None or "history" in fields)
+
+    def merge_history(
+        self,
+        doc: Optional[_DocumentType],
+        system_object: Dict,
+        fields: Optional[Iterable[str]] = None,
+        history_limit: Optional[int] = None,
+        window: Optional[List[Dict]] = None,
+    ) -> Optional[_DocumentType]:
+        """Shape a read the same way in both storage modes: system object first, history_len on request"""
+        if not doc:
+            return doc
+        if not self.append_mode():
+            history: List[Dict] = try_get(doc, "history")
+            if history_limit is not None and history and try_get(history, 0, "role") != "system":
+                doc["history"] = [system_object, *history]
+            return doc
+        doc = dict(doc)
+        if fields is None or "history_len" in fields:
+            doc["history_len"] = try_get(doc, "history_seq", default=0) + 1
+        if window is not None:
+            doc["history"] = [system_object, *window]
+        return doc
+
+    def hydrate(
+        self,
+        doc: Optional[_DocumentType],
+        system_object: Dict,
+        fields: Optional[Iterable[str]] = None,
+        history_limit: Optional[int] = None,
+    ) -> Optional[_DocumentType]:
+        window: Optional[List[Dict]] = None
+        if self.needs_history_window(doc, fields):
+            window = self.find_history_window(try_get(doc, "id"), history_limit or HISTORY_WINDOW)
+        return self.merge_history(doc, system_object, fields, history_limit, window)
+
+    def log_collection(self, field: str) -> Collection[_DocumentType]:
+        return self.message_log if field == "messages" else self.history_log
+
+    def find_one_and_update_log(
+        self,
+        collection: Collection[_DocumentType],
+        filter: Dict,
+        update: Dict,
+        system_object: Dict,
+        fields: Optional[Iterable[str]] = None,
+        history_limit: Optional[int] = None,
+    ) -> Optional[_DocumentType]:
+        update = stamp_history_tokens(update)
+        if self.append_mode():
+            update, entries, replaced = split_log_update(update)
+        doc: Optional[_DocumentType] = collection.find_one_and_update(
+            filter,
+            update,
+            return_document=ReturnDocument.AFTER,
+            upsert=True,
+            projection=self.projection(fields, history_limit),
+        )
+        if self.append_mode():
+            self.append_log_entries(doc, entries, replaced)
+        return self.hydrate(doc, system_object, fields, history_limit)
+
+    def update_one_log(self, collection: Collection[_DocumentType], filter: Dict, update: Dict) -> UpdateResult:
+        update = stamp_history_tokens(update)
+        if not self.append_mode():
+            return collection.update_one(filter, update, upsert=True)
+        update, entries, replaced = split_log_update(update)
+        if not any(entries.values()) and not replaced:
+            return collection.update_one(filter, update, upsert=True)
+        doc: Optional[_DocumentType] = collection.find_one_and_update(
+            filter, update, return_document=ReturnDocument.AFTER, upsert=True, projection=SEQ_PROJECTION
+        )
+        self.append_log_entries(doc, entries, replaced)
+        return UpdateResult({"n": 1, "nModified": 1, "ok": 1}, acknowledged=doc is not None)
+
+    def append_log_entries(
+        self, doc: Optional[_DocumentType], entries: Dict[str, List[Dict]], replaced: Iterable[str] = ()
+    ) -> None:
+        """Write split entries at the seqs reserved on doc, first dropping the old entries of replaced logs"""
+        for field in replaced:
+            if try_get(doc, "id") is not None:
+                self.log_collection(field).delete_many({"chat_id": doc["id"]})
+        for field, docs in build_log_docs(doc, entries, datetime.now()).items():
+            if docs:
+                self.log_collection(field).insert_many(docs, ordered=False)
+
+    def find_log_range(
+        self,
+        field: str,
+        chat_id: int,
+        start_seq: Optional[int] = None,
+        end_seq: Optional[int] = None,
+        limit: Optional[int] = None,
+    ) -> List[Dict]:
+        """
+        Read entries chat_id:[start_seq, end_seq) from a log collection in seq order
+        With a limit, the newest `limit` entries of that range are returned
+        """
+        filter: Dict = log_range_filter(chat_id, start_seq, end_seq)
+        if limit is None:
+            cursor: Cursor = self.log_collection(field).find(filter, LOG_RANGE_PROJECTION).sort("seq", ASCENDING)
+            return [entry for entry in cursor]
+        cursor: Cursor = self.log_collection(field).find(filter, LOG_RANGE_PROJECTION).sort("seq", DESCENDING)
+        return [entry for entry in cursor.limit(limit)][::-1]
+
+    def find_history_window(self, chat_id: int, limit: int = HISTORY_WINDOW) -> List[Dict]:
+        window: List[Dict] = self.find_log_range("history", chat_id, limit=limit)
+        return [{key: entry[key] for key in HISTORY_ENTRY_FIELDS if key in entry} for entry in window]
+
+    def find_messages_window(self, chat_id: int, limit: int = HISTORY_WINDOW) -> List[Dict]:
+        return self.find_log_range("messages", chat_id, limit=limit)
 
     # custom reads
     def get_group_config(self, filter: {}) -> Optional[_DocumentType]:
-        group: TelegramGroup = self.find_one_group(filter)
+        group: TelegramGroup = self.find_one_group(filter, fields=["config"])
         return try_get(group, "config")
 
     def get_group_balance(self, filter: {}) -> int:
-        group: TelegramGroup = self.find_one_group(filter)
+        group: TelegramGroup = self.find_one_group(filter, fields=["balance"])
         return try_get(group, "balance")
 
-    def get_group_history(self, filter: {}) -> int:
-        group: TelegramGroup = self.find_one_group(filter)
+    def get_group_state(self, filter: {}) -> Optional[_DocumentType]:
+        return self.find_one_group(filter, fields=GROUP_STATE_FIELDS)
+
+    def get_group_history(self, filter: {}, limit: Optional[int] = None) -> List[Dict]:
+        group: TelegramGroup = self.find_one_group(filter, fields=["history"], history_limit=limit)
         return try_get(group, "history", default=[])
 
-    def get_dm_history(self, filter) -> int:
-        dm: TelegramDM = self.find_one_dm(filter)
+    def get_dm_history(self, filter, limit: Optional[int] = None) -> List[Dict]:
+        dm: TelegramDM = self.find_one_dm(filter, fields=["history"], history_limit=limit)
         return try_get(dm, "history", default=[])
 
-    def group_does_exist(self, filter) -> int:
-        group: TelegramGroup = self.find_one_group(filter)
-        return group != None
+    def group_does_exist(self, filter) -> bool:
+        return self.groups.find_one(filter, {"_id": 1}) != None
 
-    def dm_does_exist(self, filter) -> int:
-        dm: TelegramDM = self.find_one_dm(filter)
-        return dm != None
+    def dm_does_exist(self, filter) -> bool:
+        return self.direct_messages.find_one(filter, {"_id": 1}) != None
 
 
 db_name = "telegram" if TELEGRAM_MODE else "nostr"
-mongo_abbot = MongoAbbot(db_name)
+mongo_abbot = MongoAbbot(db_name, DATABASE_STORAGE_MODE)
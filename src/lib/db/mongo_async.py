@@ -0,0 +1,288 @@
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection, AsyncIOMotorCursor
+from pymongo import ASCENDING, DESCENDING, ReturnDocument, UpdateOne
+from pymongo.results import BulkWriteResult, InsertOneResult, InsertManyResult, UpdateResult
+from bson.typings import _DocumentType
+
+from ..utils import to_dict, try_get
+from ..abbot.env import DATABASE_CONNECTION_STRING, DATABASE_STORAGE_MODE
+from ..abbot.config import BOT_SYSTEM_OBJECT_GROUPS, BOT_SYSTEM_OBJECT_DMS
+from .mongo import (
+    HISTORY_ENTRY_FIELDS,
+    HISTORY_WINDOW,
+    GROUP_STATE_FIELDS,
+    LOG_FIELDS,
+    LOG_RANGE_PROJECTION,
+    SEQ_PROJECTION,
+    STORAGE_MODE_DOCUMENT,
+    STORAGE_MODES,
+    MongoAbbot,
+    TelegramDM,
+    TelegramGroup,
+    build_log_docs,
+    bulk_push_updates,
+    db_name,
+    log_range_filter,
+    nostr_db_name,
+    split_log_update,
+    stamp_history_tokens,
+    telegram_db_name,
+)
+
+async_client = AsyncIOMotorClient(host=DATABASE_CONNECTION_STRING)
+
+async_nostr_db = async_client.get_database(nostr_db_name)
+async_nostr_channels = async_nostr_db.get_collection("channel")
+async_nostr_dms = async_nostr_db.get_collection("dm")
+
+async_telegram_db = async_client.get_database(telegram_db_name)
+async_telegram_groups = async_telegram_db.get_collection("group")
+async_telegram_dms = async_telegram_db.get_collection("dm")
+async_telegram_messages = async_telegram_db.get_collection("message")
+async_telegram_history = async_telegram_db.get_collection("history")
+async_telegram_answers = async_telegram_db.get_collection("answer")
+async_telegram_ledger = async_telegram_db.get_collection("ledger")
+
+async_db_prices = async_client.get_database("prices")
+async_btcusd = async_db_prices.get_collection("btcusd")
+async_btcusd_ticks = async_db_prices.get_collection("btcusd_ticks")
+async_btcusd_1m = async_db_prices.get_collection("btcusd_1m")
+async_btcusd_1h = async_db_prices.get_collection("btcusd_1h")
+
+
+@to_dict
+class AsyncMongoAbbot(MongoAbbot):
+    """
+    Motor twin of MongoAbbot with the same method surface; every method that talks to Mongo is awaitable
+    so handlers never block the event loop on a round trip. Projection and history shaping are inherited
+    """
+
+    def __init__(self, db_name, storage_mode: str = STORAGE_MODE_DOCUMENT):
+        assert storage_mode in STORAGE_MODES, f"storage_mode must be one of {', '.join(STORAGE_MODES)}"
+        self.db_name = db_name
+        self.storage_mode = STORAGE_MODE_DOCUMENT
+        if db_name == "telegram":
+            self.groups: AsyncIOMotorCollection = async_telegram_groups
+            self.direct_messages: AsyncIOMotorCollection = async_telegram_dms
+            self.message_log: AsyncIOMotorCollection = async_telegram_messages
+            self.history_log: AsyncIOMotorCollection = async_telegram_history
+            self.storage_mode = storage_mode
+        elif db_name == "nostr":
+            self.groups: AsyncIOMotorCollection = async_nostr_channels
+            self.direct_messages: AsyncIOMotorCollection = async_nostr_dms
+
+    async def insert_one_price(self, price: Dict) -> InsertOneResult:
+        return await async_btcusd.insert_one(price)
+
+    def find_prices_cursor(self) -> AsyncIOMotorCursor:
+        return async_btcusd.find()
+
+    async def find_prices(self) -> List:
+        return await async_btcusd.find().to_list(length=None)
+
+    # create docs
+    async def insert_one_group(self, channel: Dict) -> InsertOneResult:
+        return await self.groups.insert_one(channel)
+
+    async def insert_many_groups(self, groups: List[Dict]) -> InsertManyResult:
+        return await self.groups.insert_many(groups)
+
+    async def insert_one_dm(self, direct_message: Dict) -> InsertOneResult:
+        return await self.direct_messages.insert_one(direct_message)
+
+    async def insert_many_dms(self, direct_messages: List[Dict]) -> InsertManyResult:
+        return await self.direct_messages.insert_many(direct_messages)
+
+    # read
+    async def find_groups(self, filter: Dict) -> List[Optional[_DocumentType]]:
+        return await self.groups.find(filter, {"_id": 0}).to_list(length=None)
+
+    def find_groups_cursor(self, filter: Dict) -> AsyncIOMotorCursor:
+        return self.groups.find(filter, {"_id": 0})
+
+    async def find_one_group(
+        self, filter: Dict, fields: Optional[Iterable[str]] = None, history_limit: Optional[int] = None
+    ) -> Optional[_DocumentType]:
+        group = await self.groups.find_one(filter, self.projection(fields, history_limit))
+        return await self.hydrate(group, BOT_SYSTEM_OBJECT_GROUPS, fields, history_limit)
+
+    async def find_one_group_and_update(
+        self, filter: Dict, update: Dict, fields: Optional[Iterable[str]] = None, history_limit: Optional[int] = None
+    ) -> Optional[_DocumentType]:
+        return await self.find_one_and_update_log(
+            self.groups, filter, update, BOT_SYSTEM_OBJECT_GROUPS, fields, history_limit
+        )
+
+    async def inc_one_group(self, filter: Dict, inc: Dict) -> Optional[_DocumentType]:
+        """$inc counters on an existing group doc, never upserting; None when no doc matches the filter"""
+        return await self.groups.find_one_and_update(
+            filter,
+            {"$inc": inc},
+            return_document=ReturnDocument.AFTER,
+            projection={"_id": 0, **{field: 1 for field in inc}},
+        )
+
+    async def find_one_dm(
+        self, filter: Dict, fields: Optional[Iterable[str]] = None, history_limit: Optional[int] = None
+    ) -> Optional[_DocumentType]:
+        dm = await self.direct_messages.find_one(filter, self.projection(fields, history_limit))
+        return await self.hydrate(dm, BOT_SYSTEM_OBJECT_DMS, fields, history_limit)
+
+    async def find_one_dm_and_update(
+        self, filter: Dict, update: Dict, fields: Optional[Iterable[str]] = None, history_limit: Optional[int] = None
+    ) -> Optional[_DocumentType]:
+        return await self.find_one_and_update_log(
+            self.direct_messages, filter, update, BOT_SYSTEM_OBJECT_DMS, fields, history_limit
+        )
+
+    async def find_dms(self, filter: Dict) -> List[Optional[_DocumentType]]:
+        return await self.direct_messages.find(filter, {"_id": 0}).to_list(length=None)
+
+    def find_dms_cursor(self, filter: Dict) -> AsyncIOMotorCursor:
+        return self.direct_messages.find(filter, {"_id": 0})
+
+    # update docs
+    async def update_one(self, collection: str, filter: Dict, update: Dict) -> UpdateResult:
+        if collection == "dm":
+            return await self.update_one_dm(filter, update)
+        else:
+            return await self.update_one_group(filter, update)
+
+    async def update_one_group(self, filter: Dict, update: Dict) -> UpdateResult:
+        return await self.update_one_log(self.groups, filter, update)
+
+    async def update_one_dm(self, filter, update: Dict) -> UpdateResult:
+        return await self.update_one_log(self.direct_messages, filter, update)
+
+    async def bulk_push_groups(self, pushes: Dict[int, Dict]) -> Optional[BulkWriteResult]:
+        if not pushes:
+            return None
+        updates: Dict[int, Dict] = bulk_push_updates(pushes)
+        if not self.append_mode():
+            operations = [UpdateOne({"id": chat_id}, update, upsert=True) for chat_id, update in updates.items()]
+            return await self.groups.bulk_write(operations, ordered=False)
+        log_docs: Dict[str, List[Dict]] = {field: [] for field in LOG_FIELDS}
+        created_at = datetime.now()
+        for chat_id, update in updates.items():
+            update, entries, _ = split_log_update(update)
+            group: Optional[_DocumentType] = await self.groups.find_one_and_update(
+                {"id": chat_id}, update, return_document=ReturnDocument.AFTER, upsert=True, projection=SEQ_PROJECTION
+            )
+            for field, docs in build_log_docs(group, entries, created_at).items():
+                log_docs[field].extend(docs)
+        for field, docs in log_docs.items():
+            if docs:
+                await self.log_collection(field).insert_many(docs, ordered=False)
+        return None
+
+    # append-only message/history log
+    async def hydrate(
+        self,
+        doc: Optional[_DocumentType],
+        system_object: Dict,
+        fields: Optional[Iterable[str]] = None,
+        history_limit: Optional[int] = None,
+    ) -> Optional[_DocumentType]:
+        window: Optional[List[Dict]] = None
+        if self.needs_history_window(doc, fields):
+            window = await self.find_history_window(try_get(doc, "id"), history_limit or HISTORY_WINDOW)
+        return self.merge_history(doc, system_object, fields, history_limit, window)
+
+    async def find_one_and_update_log(
+        self,
+        collection: AsyncIOMotorCollection,
+        filter: Dict,
+        update: Dict,
+        system_object: Dict,
+        fields: Optional[Iterable[str]] = None,
+        history_limit: Optional[int] = None,
+    ) -> Optional[_DocumentType]:
+        update = stamp_history_tokens(update)
+        if self.append_mode():
+            update, entries, replaced = split_log_update(update)
+        doc: Optional[_DocumentType] = await collection.find_one_and_update(
+            filter,
+            update,
+            return_document=ReturnDocument.AFTER,
+            upsert=True,
+            projection=self.projection(fields, history_limit),
+        )
+        if self.append_mode():
+            await self.append_log_entries(doc, entries, replaced)
+        return await self.hydrate(doc, system_object, fields, history_limit)
+
+    async def update_one_log(self, collection: AsyncIOMotorCollection, filter: Dict, update: Dict) -> UpdateResult:
+        update = stamp_history_tokens(update)
+        if not self.append_mode():
+            return await collection.update_one(filter, update, upsert=True)
+        update, entries, replaced = split_log_update(update)
+        if not any(entries.values()) and not replaced:
+            return await collection.update_one(filter, update, upsert=True)
+        doc: Optional[_DocumentType] = await collection.find_one_and_update(
+            filter, update, return_document=ReturnDocument.AFTER, upsert=True, projection=SEQ_PROJECTION
+        )
+        await self.append_log_entries(doc, entries, replaced)
+        return UpdateResult({"n": 1, "nModified": 1, "ok": 1}, acknowledged=doc is not None)
+
+    async def append_log_entries(
+        self, doc: Optional[_DocumentType], entries: Dict[str, List[Dict]], replaced: Iterable[str] = ()
+    ) -> None:
+        for field in replaced:
+            if try_get(doc, "id") is not None:
+                await self.log_collection(field).delete_many({"chat_id": doc["id"]})
+        for field, docs in build_log_docs(doc, entries, datetime.now()).items():
+            if docs:
+                await self.log_collection(field).insert_many(docs, ordered=False)
+
+    async def find_log_range(
+        self,
+        field: str,
+        chat_id: int,
+        start_seq: Optional[int] = None,
+        end_seq: Optional[int] = None,
+        limit: Optional[int] = None,
+    ) -> List[Dict]:
+        filter: Dict = log_range_filter(chat_id, start_seq, end_seq)
+        if limit is None:
+            cursor = self.log_collection(field).find(filter, LOG_RANGE_PROJECTION).sort("seq", ASCENDING)
+            return await cursor.to_list(length=None)
+        cursor = self.log_collection(field).find(filter, LOG_RANGE_PROJECTION).sort("seq", DESCENDING)
+        return (await cursor.limit(limit).to_list(length=None))[::-1]
+
+    async def find_history_window(self, chat_id: int, limit: int = HISTORY_WINDOW) -> List[Dict]:
+        window: List[Dict] = await self.find_log_range("history", chat_id, limit=limit)
+        return [{key: entry[key] for key in HISTORY_ENTRY_FIELDS if key in entry} for entry in window]
+
+    async def find_messages_window(self, chat_id: int, limit: int = HISTORY_WINDOW) -> List[Dict]:
+        return await self.find_log_range("messages", chat_id, limit=limit)
+
+    # custom reads
+    async def get_group_config(self, filter: {}) -> Optional[_DocumentType]:
+        group: TelegramGroup = await self.find_one_group(filter, fields=["config"])
+        return try_get(group, "config")
+
+    async def get_group_balance(self, filter: {}) -> int:
+        group: TelegramGroup = await self.find_one_group(filter, fields=["balance"])
+        return try_get(group, "balance")
+
+    async def get_group_state(self, filter: {}) -> Optional[_DocumentType]:
+        return await self.find_one_group(filter, fields=GROUP_STATE_FIELDS)
+
+    async def get_group_history(self, filter: {}, limit: Optional[int] = None) -> List[Dict]:
+        group: TelegramGroup = await self.find_one_group(filter, fields=["history"], history_limit=limit)
+        return try_get(group, "history", default=[])
+
+    async def get_dm_history(self, filter, limit: Optional[int] = None) -> List[Dict]:
+        dm: TelegramDM = await self.find_one_dm(filter, fields=["history"], history_limit=limit)
+        return try_get(dm, "history", default=[])
+
+    async def group_does_exist(self, filter) -> bool:
+        return await self.groups.find_one(filter, {"_id": 1}) != None
+
+    async def dm_does_exist(self, filter) -> bool:
+        return await self.direct_messages.find_one(filter, {"_id": 1}) != None
+
+
+async_mongo_abbot = AsyncMongoAbbot(db_name, DATABASE_STORAGE_MODE)
@@ -0,0 +1,143 @@
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import ASCENDING, DESCENDING
+
+from ..logger import debug_bot, error_bot
+from ..utils import error, success, try_get
+from .mongo_async import async_btcusd_1h, async_btcusd_1m, async_btcusd_ticks
+
+FILE_NAME = __name__
+
+PRICE_PAIR: str = "BTC-USD"
+# raw ticks live in a time-series collection and expire after this many days; minute buckets after
+# PRICE_MINUTE_TTL_DAYS, hour buckets are kept
+PRICE_TICK_TTL_DAYS: int = 7
+PRICE_MINUTE_TTL_DAYS: int = 90
+PRICE_RESOLUTIONS: Dict[str, int] = {"1m": 60, "1h": 3600}
+PRICE_TICK_INDEX: List[Tuple[str, int]] = [("pair", ASCENDING), ("ts", DESCENDING)]
+
+
+def as_datetime(at: datetime | int | float) -> datetime:
+    """Unix seconds or a datetime, as a naive UTC datetime (what pymongo hands back)"""
+    if isinstance(at, datetime):
+        return at.astimezone(timezone.utc).replace(tzinfo=None) if at.tzinfo else at
+    return datetime.fromtimestamp(at, timezone.utc).replace(tzinfo=None)
+
+
+def bucket_start(at: datetime, resolution: str) -> datetime:
+    seconds: int = PRICE_RESOLUTIONS[resolution]
+    epoch: int = int(at.replace(tzinfo=timezone.utc).timestamp())
+    return as_datetime(epoch - epoch % seconds)
+
+
+def bucket_update(price: float, at: datetime) -> Dict:
+    """Fold one price into an OHLC bucket doc; ticks arrive in time order, so the first sets open, the last close"""
+    return {
+        "$setOnInsert": {"open": price, "open_at": at},
+        "$max": {"high": price},
+        "$min": {"low": price},
+        "$set": {"close": price, "close_at": at},
+        "$inc": {"count": 1},
+    }
+
+
+def ohlc_buckets(ticks: Iterable[Tuple[datetime, float]], resolution: str) -> Dict[datetime, Dict]:
+    """Whole OHLC bucket docs for a time-ordered run of (at, price) ticks; used to backfill"""
+    buckets: Dict[datetime, Dict] = {}
+    for at, price in ticks:
+        start: datetime = bucket_start(at, resolution)
+        bucket: Optional[Dict] = buckets.get(start)
+        if bucket is None:
+            buckets[start] = {
+                "_id": start,
+                "ts": start,
+                "open": price,
+                "open_at": at,
+                "high": price,
+                "low": price,
+                "count": 0,
+            }
+            bucket = buckets[start]
+        bucket["high"] = max(bucket["high"], price)
+        bucket["low"] = min(bucket["low"], price)
+        bucket["close"], bucket["close_at"] = price, at
+        bucket["count"] += 1
+    return buckets
+
+
+class PriceStore:
+    """
+    BTCUSD history: raw ticks in a time-series collection with a TTL, downsampled as they are written into minute
+    and hour OHLC buckets keyed by bucket start
+    price_at(at) is a single index lookup: the newest tick at or before at, or once ticks have expired the latest
+    bucket close at or before at. Collection setup (time-series options, TTLs, indexes) is done by migrations
+    """
+
+    def __init__(
+        self,
+        ticks: AsyncIOMotorCollection,
+        minutes: AsyncIOMotorCollection,
+        hours: AsyncIOMotorCollection,
+        pair: str = PRICE_PAIR,
+    ):
+        self.ticks: AsyncIOMotorCollection = ticks
+        self.buckets: Dict[str, AsyncIOMotorCollection] = {"1m": minutes, "1h": hours}
+        self.pair: str = pair
+
+    async def record(self, price: float, at: datetime | int | float) -> Dict:
+        """Store a tick and fold it into its minute and hour buckets"""
+        log_name: str = f"{FILE_NAME}: PriceStore.record"
+        at = as_datetime(at)
+        price = float(price)
+        try:
+            await self.ticks.insert_one({"ts": at, "pair": self.pair, "amount": price})
+            for resolution, collection in self.buckets.items():
+                start: datetime = bucket_start(at, resolution)
+                update: Dict = bucket_update(price, at)
+                update["$setOnInsert"]["ts"] = start
+                await collection.update_one({"_id": start}, update, upsert=True)
+            return success(data=at)
+        except Exception as exception:
+            error_bot.log(log_name, f"failed to record price={price} at={at}: {exception}")
+            return error("Failed to record price", data=str(exception))
+
+    async def latest(self) -> Optional[Dict]:
+        """Newest tick as {"_id": unix seconds, "amount"}, the shape price docs have always had"""
+        tick: Optional[Dict] = await self.ticks.find_one({"pair": self.pair}, sort=[("ts", DESCENDING)])
+        if not tick:
+            return None
+        return {"_id": int(tick["ts"].replace(tzinfo=timezone.utc).timestamp()), "amount": tick["amount"]}
+
+    async def price_at(self, at: datetime | int | float) -> Optional[Dict]:
+        """
+        The price in effect at a timestamp, never one quoted after it: {"amount", "at", "resolution"}
+        Ticks expire oldest first, so any tick at or before the timestamp is the newest price known for it. Past the
+        tick TTL it comes from the minute, then hour, bucket holding the timestamp: its close if quoted by then, else
+        its open if quoted by then, else the close of the bucket before it. None if nothing that old was ever stored
+        """
+        at = as_datetime(at)
+        tick: Optional[Dict] = await self.ticks.find_one(
+            {"pair": self.pair, "ts": {"$lte": at}}, sort=[("ts", DESCENDING)]
+        )
+        if tick:
+            return {"amount": tick["amount"], "at": tick["ts"], "resolution": "tick"}
+        for resolution, collection in self.buckets.items():
+            bucket: Optional[Dict] = await collection.find_one({"_id": {"$lte": at}}, sort=[("_id", DESCENDING)])
+            if bucket and try_get(bucket, "close_at", default=at) > at:
+                if try_get(bucket, "open_at", default=at) <= at:
+                    return {"amount": bucket["open"], "at": bucket["open_at"], "resolution": resolution}
+                bucket = await collection.find_one({"_id": {"$lt": bucket["_id"]}}, sort=[("_id", DESCENDING)])
+            if bucket:
+                return {"amount": bucket["close"], "at": try_get(bucket, "close_at"), "resolution": resolution}
+        debug_bot.log(f"{FILE_NAME}: PriceStore.price_at", f"no price at or before {at}")
+        return None
+
+    async def ohlc(self, resolution: str, start: datetime | int | float, end: datetime | int | float) -> List[Dict]:
+        """OHLC buckets of a resolution ("1m" or "1h") starting in [start, end), oldest first"""
+        cursor = self.buckets[resolution].find({"_id": {"$gte": as_datetime(start), "$lt": as_datetime(end)}})
+        return await cursor.sort("_id", ASCENDING).to_list(length=None)
+
+
+price_store = PriceStore(async_btcusd_ticks, async_btcusd_1m, async_btcusd_1h)
@@ -0,0 +1,182 @@
+import asyncio
+import heapq
+import time
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from lib.logger import debug_bot, error_bot
+from lib.payments import PaymentProcessor
+
+FILE_NAME = __name__
+
+# a new invoice is checked after INVOICE_CHECK_MIN seconds; each unpaid check stretches the interval by
+# INVOICE_CHECK_GROWTH up to INVOICE_CHECK_MAX, and failed checks are retried after INVOICE_CHECK_MAX
+INVOICE_CHECK_MIN: float = 2.0
+INVOICE_CHECK_MAX: float = 20.0
+INVOICE_CHECK_GROWTH: float = 1.5
+# with webhooks on, payments are pushed and polling is only the fallback for webhooks that never arrive
+INVOICE_PUSH_CHECK_MIN: float = 15.0
+INVOICE_PUSH_CHECK_MAX: float = 60.0
+# checks falling due within this many seconds of each other go out together, at most this many at once
+INVOICE_BATCH_WINDOW: float = 1.0
+INVOICE_BATCH_SIZE: int = 20
+
+
+class WatchedInvoice:
+    """An open invoice, the sats it credits to a chat, and what to call once it is paid or expired"""
+
+    def __init__(
+        self,
+        invoice_id: str,
+        chat_id: int,
+        sats: int,
+        expires_at: float,
+        on_paid: Callable[["WatchedInvoice"], Awaitable[Any]],
+        on_expired: Callable[["WatchedInvoice", bool], Awaitable[Any]],
+        interval: float = INVOICE_CHECK_MIN,
+        **meta,
+    ):
+        self.invoice_id: str = invoice_id
+        self.chat_id: int = chat_id
+        self.sats: int = sats
+        self.expires_at: float = expires_at
+        self.on_paid = on_paid
+        self.on_expired = on_expired
+        self.meta: Dict = meta
+        self.interval: float = interval
+        self.due: float = min(time.monotonic() + self.interval, expires_at)
+        self.checks: int = 0
+        self.settling: bool = False
+
+
+class InvoiceWatcher:
+    """
+    One background task watching every open invoice, instead of a polling loop per /fund
+    Invoices sit in a heap ordered by when each is next due: its next status check, or its expiry if that comes
+    first. The run loop sleeps until the earliest due time (or a new registration), then checks every invoice
+    due within INVOICE_BATCH_WINDOW concurrently. Unpaid invoices are checked less and less often; paid ones fire
+    on_paid, and ones past expiry are cancelled with the processor and fire on_expired
+    """
+
+    def __init__(self, processor: PaymentProcessor):
+        self.processor: PaymentProcessor = processor
+        self.invoices: Dict[str, WatchedInvoice] = {}
+        self.schedule: List[Tuple[float, int, str]] = []
+        self.sequence: int = 0
+        self.wake: asyncio.Event = asyncio.Event()
+        self.metrics: Counter = Counter()
+        self.check_min: float = INVOICE_CHECK_MIN
+        self.check_max: float = INVOICE_CHECK_MAX
+
+    def enable_push(self) -> None:
+        """Payments now arrive by webhook (settle); keep polling, but only as a slow fallback"""
+        self.check_min = INVOICE_PUSH_CHECK_MIN
+        self.check_max = INVOICE_PUSH_CHECK_MAX
+
+    def push(self, invoice: WatchedInvoice) -> None:
+        self.sequence += 1
+        heapq.heappush(self.schedule, (invoice.due, self.sequence, invoice.invoice_id))
+
+    def register(
+        self,
+        invoice_id: str,
+        chat_id: int,
+        sats: int,
+        expires_in: float,
+        on_paid: Callable[[WatchedInvoice], Awaitable[Any]],
+        on_expired: Callable[[WatchedInvoice, bool], Awaitable[Any]],
+        **meta,
+    ) -> WatchedInvoice:
+        """Start watching an invoice; returns immediately, the callbacks fire from the run loop"""
+        expires_at: float = time.monotonic() + expires_in
+        invoice = WatchedInvoice(invoice_id, chat_id, sats, expires_at, on_paid, on_expired, self.check_min, **meta)
+        self.invoices[invoice_id] = invoice
+        self.push(invoice)
+        self.metrics["registered"] += 1
+        self.wake.set()
+        debug_bot.log(f"{FILE_NAME}: InvoiceWatcher.register", f"invoice_id={invoice_id} open={len(self.invoices)}")
+        return invoice
+
+    def due(self, now: float) -> List[WatchedInvoice]:
+        """Pop the invoices due within the batch window; stale heap entries (rescheduled or settled) are skipped"""
+        batch: List[WatchedInvoice] = []
+        while self.schedule and len(batch) < INVOICE_BATCH_SIZE:
+            due, _, invoice_id = self.schedule[0]
+            if due > now + INVOICE_BATCH_WINDOW:
+                break
+            heapq.heappop(self.schedule)
+            invoice: Optional[WatchedInvoice] = self.invoices.get(invoice_id)
+            if invoice and invoice.due == due:
+                batch.append(invoice)
+        return batch
+
+    async def settle(self, invoice_id: str, source: str = "poll") -> bool:
+        """
+        Fire a paid invoice's on_paid and stop watching it; False if it was not (or no longer) being watched, or is
+        already being settled. If on_paid raises, the invoice stays watched and the next check settles it again
+        (on_paid must be idempotent, as Billing.credit is per invoice_id)
+        """
+        invoice: Optional[WatchedInvoice] = self.invoices.get(invoice_id)
+        if not invoice or invoice.settling:
+            return False
+        invoice.settling = True
+        try:
+            await invoice.on_paid(invoice)
+        finally:
+            invoice.settling = False
+        self.invoices.pop(invoice_id, None)
+        self.metrics[f"paid_{source}"] += 1
+        return True
+
+    async def expire(self, invoice: WatchedInvoice) -> None:
+        self.invoices.pop(invoice.invoice_id, None)
+        self.metrics["expired"] += 1
+        cancelled: bool = bool(await self.processor.expire_invoice(invoice.invoice_id))
+        await invoice.on_expired(invoice, cancelled)
+
+    async def check(self, invoice: WatchedInvoice) -> None:
+        log_name: str = f"{FILE_NAME}: InvoiceWatcher.check"
+        now: float = time.monotonic()
+        paid: bool = False
+        try:
+            invoice.checks += 1
+            self.metrics["checks"] += 1
+            paid = bool(await self.processor.invoice_is_paid(invoice.invoice_id))
+            if paid:
+                # still watched after this if a webhook is settling it right now; checked again in case that fails
+                await self.settle(invoice.invoice_id)
+            elif now >= invoice.expires_at:
+                await self.expire(invoice)
+                return
+            else:
+                invoice.interval = min(invoice.interval * INVOICE_CHECK_GROWTH, self.check_max)
+        except Exception as exception:
+            self.metrics["errors"] += 1
+            error_bot.log(log_name, f"invoice_id={invoice.invoice_id} check failed: {exception}")
+            # a paid invoice is kept until on_paid succeeds, however long past expiry
+            if not paid and now >= invoice.expires_at + self.check_max:
+                self.invoices.pop(invoice.invoice_id, None)
+                return
+            invoice.interval = self.check_max
+        if invoice.invoice_id in self.invoices:
+            # always check once more right at expiry before giving up on the invoice
+            due: float = now + invoice.interval
+            invoice.due = due if due < invoice.expires_at or now >= invoice.expires_at else invoice.expires_at
+            self.push(invoice)
+
+    async def run(self) -> None:
+        """Check invoices as they fall due until cancelled"""
+        log_name: str = f"{FILE_NAME}: InvoiceWatcher.run"
+        while True:
+            self.wake.clear()
+            now: float = time.monotonic()
+            batch: List[WatchedInvoice] = self.due(now)
+            if batch:
+                await asyncio.gather(*(self.check(invoice) for invoice in batch))
+                debug_bot.log(log_name, f"checked={len(batch)} open={len(self.invoices)} {dict(self.metrics)}")
+                continue
+            timeout: Optional[float] = self.schedule[0][0] - now if self.schedule else None
+            try:
+                await asyncio.wait_for(self.wake.wait(), timeout)
+            except TimeoutError:
+                pass
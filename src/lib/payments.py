@@ -4,13 +4,11 @@ from abc import ABC, abstractmethod
 import time
 import httpx
 from httpx import Response
-from pymongo.results import InsertOneResult
 
-from lib.db.mongo import mongo_abbot
+from lib.db.prices import price_store
 from lib.logger import debug_bot, error_bot
-from lib.db.utils import successful_insert_one
-from lib.abbot.env import PAYMENT_PROCESSOR_KIND, PRICE_PROVIDER_KIND, LNBITS_BASE_URL
-from lib.utils import error, success, successful_response, try_get
+from lib.abbot.env import PAYMENT_PROCESSOR_KIND, PRICE_PROVIDER_KIND, LNBITS_BASE_URL, STRIKE_BASE_URL
+from lib.utils import error, success, successful, successful_response, try_get
 
 
 class PaymentProcessor(ABC):
@@ -38,11 +36,11 @@ class Strike(PaymentProcessor):
 
     CHAT_ID_INVOICE_ID_MAP = {}
 
-    def __init__(self, api_key):
+    def __init__(self, api_key, base_url=STRIKE_BASE_URL):
         super().__init__()
         assert api_key is not None, "a Strike API key must be supplied"
         self._client = httpx.AsyncClient(
-            base_url="https://api.strike.me/v1",
+            base_url=base_url,
             headers={
                 "Content-Type": "application/json",
                 "Accept": "application/json",
@@ -92,6 +90,27 @@ class Strike(PaymentProcessor):
         resp_data: Dict = resp.json()
         return try_get(resp_data, "state") == "CANCELLED"
 
+    async def subscribe_webhooks(self, webhook_url, secret):
+        """Subscribe webhook_url to invoice.updated events, unless a subscription for it already exists"""
+        resp: Response = await self._client.get("/subscriptions")
+        subscriptions = resp.json() if successful_response(resp) else []
+        if any(try_get(subscription, "webhookUrl") == webhook_url for subscription in subscriptions or []):
+            return success("Webhook already subscribed")
+        resp = await self._client.post(
+            "/subscriptions",
+            json={
+                "webhookUrl": webhook_url,
+                "webhookVersion": "v1",
+                "secret": secret,
+                "enabled": True,
+                "eventTypes": ["invoice.updated"],
+            },
+        )
+        debug_bot.log(__name__, f"strike => subscribe_webhooks => resp={resp.text}")
+        if resp.status_code not in (200, 201):
+            return error("Failed to subscribe webhook", data=resp.text)
+        return success("Webhook subscribed", data=resp.json())
+
     async def get_bitcoin_price(self):
         # TODO: implement
         raise NotImplementedError("")
@@ -254,11 +273,11 @@ class Coinbase(Provider):
             return error("No response data", data=json)
         price_data = {**resp_data, "_id": int(time.time())}
         price_doc: CoinbasePrice = CoinbasePrice(**price_data).to_dict()
-        insert_result: InsertOneResult = mongo_abbot.insert_one_price(price_doc)
-        if not successful_insert_one(insert_result):
+        record_result: Dict = await price_store.record(price_doc["amount"], price_doc["_id"])
+        if not successful(record_result):
             error_message = f"response={response} \n json={json} \n resp_data={resp_data}"
             error_message = f"{error_message} \n price_data={price_data} \n price_doc={price_doc}"
-            error_message = f"{error_message} \n insert_result={insert_result}"
+            error_message = f"{error_message} \n record_result={record_result}"
             error_bot.log(log_name, error_message)
         return success(data=price_doc, amount=try_get(price_doc, "amount"))
 
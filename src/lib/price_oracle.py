@@ -0,0 +1,120 @@
+import asyncio
+import time
+from collections import Counter
+from typing import Dict, Optional
+
+from lib.abbot.env import PRICE_REFRESH_INTERVAL
+from lib.abbot.exceptions.exception import AbbotException
+from lib.db.prices import PriceStore, price_store
+from lib.logger import debug_bot, error_bot
+from lib.payments import Provider, init_price_provider
+from lib.utils import try_get
+
+FILE_NAME = __name__
+
+# a quote older than this is still served, but the read kicks off a refresh (stale-while-revalidate)
+PRICE_STALE_AFTER: float = 900.0
+# a failed refresh is retried after this many seconds instead of waiting out the full interval
+PRICE_RETRY_INTERVAL: float = 15.0
+
+
+class PriceUnavailableException(AbbotException):
+    reply: str = "I can't get the bitcoin price right now. Please try again in a few minutes."
+
+
+class PriceOracle:
+    """
+    The latest BTCUSD quote, held in memory and refreshed from the price provider by a background task
+    Reads are a field access: billing never waits on the network or Mongo once a price has been seen. The oracle
+    is seeded from the newest stored price at startup; a quote older than stale_after is still served while a
+    single refresh runs in the background, and a failed refresh keeps the last good quote
+    """
+
+    def __init__(
+        self,
+        provider: Provider,
+        store: PriceStore,
+        refresh_interval: float = PRICE_REFRESH_INTERVAL,
+        stale_after: float = PRICE_STALE_AFTER,
+    ):
+        self.provider: Provider = provider
+        self.store: PriceStore = store
+        self.refresh_interval: float = refresh_interval
+        self.stale_after: float = stale_after
+        self.price: Optional[float] = None
+        self.timestamp: int = 0
+        self.refreshing: Optional[asyncio.Task] = None
+        self.metrics: Counter = Counter()
+
+    def set(self, price: float, timestamp: int) -> None:
+        self.price = float(price)
+        self.timestamp = int(timestamp)
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.timestamp
+
+    def get(self) -> Optional[float]:
+        """The latest quote, or None before the first one; a stale quote also schedules a background refresh"""
+        self.metrics["reads"] += 1
+        if self.price is not None and self.age >= self.stale_after:
+            self.metrics["stale_reads"] += 1
+            self.revalidate()
+        return self.price
+
+    def revalidate(self) -> None:
+        if self.refreshing is None or self.refreshing.done():
+            self.refreshing = asyncio.create_task(self.refresh())
+
+    async def current(self) -> float:
+        """
+        get(), but on a cold start falls back to the newest stored price, then waits for a refresh, instead of
+        returning None; raises PriceUnavailableException if there is still no quote
+        """
+        if self.get() is None:
+            await self.load()
+        if self.price is None:
+            self.revalidate()
+            await asyncio.shield(self.refreshing)
+        if self.price is None:
+            self.metrics["unavailable"] += 1
+            raise PriceUnavailableException("No BTCUSD price available")
+        return self.price
+
+    async def load(self) -> None:
+        """Seed from the newest stored price, so the bot can bill before its first refresh completes"""
+        log_name: str = f"{FILE_NAME}: PriceOracle.load"
+        try:
+            doc: Optional[Dict] = await self.store.latest()
+            if doc and self.price is None:
+                self.set(try_get(doc, "amount"), try_get(doc, "_id", default=0))
+            debug_bot.log(log_name, f"price={self.price} age={self.age:.0f}s")
+        except Exception as exception:
+            error_bot.log(log_name, f"failed to load stored price: {exception}")
+
+    async def refresh(self) -> bool:
+        log_name: str = f"{FILE_NAME}: PriceOracle.refresh"
+        try:
+            response: Dict = await self.provider.get_bitcoin_price()
+            amount: Optional[float] = try_get(response, "amount")
+            if not amount:
+                raise ValueError(f"no amount in response={response}")
+            self.set(amount, try_get(response, "data", "_id", default=time.time()))
+            self.metrics["refreshes"] += 1
+            return True
+        except Exception as exception:
+            self.metrics["failed_refreshes"] += 1
+            error_bot.log(log_name, f"keeping price={self.price} age={self.age:.0f}s: {exception}")
+            return False
+
+    async def run(self) -> None:
+        """Refresh every refresh_interval seconds until cancelled"""
+        log_name: str = f"{FILE_NAME}: PriceOracle.run"
+        await self.load()
+        while True:
+            refreshed: bool = await self.refresh()
+            debug_bot.log(log_name, f"price={self.price} {dict(self.metrics)}")
+            await asyncio.sleep(self.refresh_interval if refreshed else PRICE_RETRY_INTERVAL)
+
+
+price_oracle = PriceOracle(init_price_provider(), price_store)
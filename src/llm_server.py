@@ -0,0 +1,9 @@
+from sys import argv
+
+from lib.api.llm_server import LLM_SERVER_PORT, run
+
+# python src/llm_server.py [--dev | --test] [port]
+# serves the recordings in src/data/llm as an OpenAI-compatible API; set OPENAI_BASE_URL=http://127.0.0.1:<port>/v1
+if __name__ == "__main__":
+    ports = [arg for arg in argv[1:] if arg.isdigit()]
+    run(port=int(ports[0]) if ports else LLM_SERVER_PORT)
@@ -1,6 +1,7 @@
 from cli_args import DEV_MODE, TEST_MODE, TELEGRAM_MODE, NOSTR_MODE
 from lib.abbot.exceptions.exception import AbbotException
 from lib.logger import debug_bot
+from lib.db.migrations import bootstrap
 
 # from lib.abbot.nostr_bot import NostrBotBuilder
 from lib.abbot.telegram_bot import TelegramBotBuilder
@@ -11,6 +12,7 @@ if __name__ == "__main__":
         #     raise AbbotException(
         #         "Do not run in production mode unless you are sure: python src/main.py [--telegram | --nostr] [--dev | --test]"
         #     )
+        bootstrap()
         if TELEGRAM_MODE:
             telegram_abbot: TelegramBotBuilder = TelegramBotBuilder()
             telegram_abbot.run()
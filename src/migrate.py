@@ -0,0 +1,16 @@
+from sys import argv, exit
+
+from lib.db.migrations import bootstrap, index_report
+from lib.utils import successful, try_get
+
+# python src/migrate.py [--dev | --test] [--check]
+# --check only reports missing/slow indexes, without migrating or creating anything
+if __name__ == "__main__":
+    result = index_report() if "--check" in argv[1:] else bootstrap()
+    print(try_get(result, "msg"))
+    for kind in ("missing", "slow"):
+        for label in try_get(result, "data", kind, default=[]):
+            print(f"  {kind}: {label}")
+    if try_get(result, "result"):
+        print(f"  {try_get(result, 'result')}")
+    exit(0 if successful(result) else 1)
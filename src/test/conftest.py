@@ -0,0 +1,76 @@
+import os
+import sys
+from pathlib import Path
+
+import dotenv
+
+# python -m pytest -q src/test   (from the repo root, where the bot runs from)
+SRC = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(SRC))
+os.makedirs(SRC / "data" / "logs", exist_ok=True)
+
+# lib.abbot.env asserts its required settings at import; tests never reach the services behind them
+TEST_ENV = {
+    "BOT_NOSTR_SK": "test",
+    "TEST_BOT_TELEGRAM_TOKEN": "test",
+    "OPENAI_API_KEY": "test",
+    "OPENAI_ORG_ID": "test",
+    "VECTOR_DATABASE_API_KEY": "test",
+    "PAYMENT_PROCESSOR_KIND": "strike",
+    "PAYMENT_PROCESSOR_TOKEN": "test",
+    "PRICE_PROVIDER_KIND": "coinbase",
+    "LNBITS_BASE_URL": "http://127.0.0.1",
+    "DATABASE_KIND": "mongo",
+    "DATABASE_CONNECTION_STRING": "mongodb://127.0.0.1:27017",
+    "LLM_BACKEND": "replay",
+}
+_dotenv_values = dotenv.dotenv_values
+dotenv.dotenv_values = lambda *args, **kwargs: {**TEST_ENV, **_dotenv_values(*args, **kwargs)}
+
+
+class AsyncCursor:
+    """Async-iterable facade over a mongomock cursor, standing in for a motor cursor"""
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def sort(self, *args, **kwargs):
+        return AsyncCursor(self.cursor.sort(*args, **kwargs))
+
+    def limit(self, count):
+        return AsyncCursor(self.cursor.limit(count))
+
+    async def to_list(self, length=None):
+        return list(self.cursor)[:length]
+
+    async def __aiter__(self):
+        for doc in self.cursor:
+            yield doc
+
+
+class AsyncCollection:
+    """Awaitable facade over a mongomock collection, standing in for a motor collection"""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def __getattr__(self, name):
+        attr = getattr(self.collection, name)
+        if not callable(attr):
+            return attr
+
+        async def call(*args, **kwargs):
+            return attr(*args, **kwargs)
+
+        return call
+
+    def find(self, *args, **kwargs):
+        return AsyncCursor(self.collection.find(*args, **kwargs))
+
+    async def find_one_and_update(self, filter, update, *args, **kwargs):
+        # mongomock re-applies filter to the post-image, so a guarded $inc that leaves the doc outside its own
+        # filter comes back None; mongod returns the updated doc, so match first and update by _id
+        matched = self.collection.find_one(filter, {"_id": 1})
+        if matched is None:
+            return self.collection.find_one_and_update(filter, update, *args, **kwargs)
+        return self.collection.find_one_and_update({"_id": matched["_id"]}, update, *args, **kwargs)
@@ -0,0 +1,114 @@
+import hmac
+import json
+import uuid
+from collections import Counter
+from hashlib import sha256
+from sys import argv
+
+import aiohttp
+from aiohttp import web
+
+# python src/test/fake_strike.py [port] [webhook_url] [webhook_secret]
+# a local stand-in for the Strike invoice API; run the bot with STRIKE_BASE_URL=http://127.0.0.1:<port>/v1
+#   POST /pay/<invoice_id>            marks an invoice paid and delivers a signed invoice.updated webhook
+#   POST /pay/<invoice_id>?webhook=0  marks it paid without a webhook, to exercise the polling fallback
+#   GET  /stats                       request counts, e.g. how many GET /v1/invoices/<id> polls were made
+EXPIRATION_IN_SEC = 600
+
+invoices = {}
+subscriptions = []
+stats = Counter()
+
+
+async def create_invoice(request):
+    body = await request.json()
+    invoice_id = str(uuid.uuid4())
+    invoices[invoice_id] = {
+        "invoiceId": invoice_id,
+        "correlationId": body.get("correlationId"),
+        "description": body.get("description"),
+        "amount": body.get("amount"),
+        "state": "UNPAID",
+    }
+    stats["create"] += 1
+    return web.json_response(invoices[invoice_id], status=201)
+
+
+async def quote_invoice(request):
+    invoice_id = request.match_info["invoice_id"]
+    stats["quote"] += 1
+    return web.json_response(
+        {"quoteId": str(uuid.uuid4()), "lnInvoice": f"lnbcfake{invoice_id}", "expirationInSec": EXPIRATION_IN_SEC}
+    )
+
+
+async def get_invoice(request):
+    invoice_id = request.match_info["invoice_id"]
+    stats["get"] += 1
+    if invoice_id not in invoices:
+        return web.json_response({"error": "not found"}, status=404)
+    return web.json_response(invoices[invoice_id])
+
+
+async def cancel_invoice(request):
+    invoice = invoices.get(request.match_info["invoice_id"])
+    stats["cancel"] += 1
+    if invoice and invoice["state"] == "UNPAID":
+        invoice["state"] = "CANCELLED"
+    return web.json_response(invoice or {})
+
+
+async def list_subscriptions(request):
+    return web.json_response(subscriptions)
+
+
+async def create_subscription(request):
+    subscription = {"id": str(uuid.uuid4()), **(await request.json())}
+    subscriptions.append(subscription)
+    return web.json_response(subscription, status=201)
+
+
+async def pay_invoice(request):
+    invoice = invoices.get(request.match_info["invoice_id"])
+    if not invoice:
+        return web.json_response({"error": "not found"}, status=404)
+    invoice["state"] = "PAID"
+    delivered = []
+    if request.query.get("webhook") != "0":
+        event = {
+            "id": str(uuid.uuid4()),
+            "eventType": "invoice.updated",
+            "webhookVersion": "v1",
+            "data": {"entityId": invoice["invoiceId"], "changes": ["state"]},
+        }
+        body = json.dumps(event).encode()
+        async with aiohttp.ClientSession() as session:
+            for subscription in subscriptions:
+                signature = hmac.new(subscription["secret"].encode(), body, sha256).hexdigest().upper()
+                async with session.post(
+                    subscription["webhookUrl"],
+                    data=body,
+                    headers={"Content-Type": "application/json", "X-Webhook-Signature": signature},
+                ) as response:
+                    delivered.append({"url": subscription["webhookUrl"], "status": response.status})
+    return web.json_response({"invoice": invoice, "delivered": delivered})
+
+
+async def get_stats(request):
+    return web.json_response(stats)
+
+
+if __name__ == "__main__":
+    port = int(argv[1]) if len(argv) > 1 else 8091
+    if len(argv) > 3:
+        subscriptions.append({"id": "cli", "webhookUrl": argv[2], "secret": argv[3], "eventTypes": ["invoice.updated"]})
+    app = web.Application()
+    app.router.add_post("/v1/invoices", create_invoice)
+    app.router.add_post("/v1/invoices/{invoice_id}/quote", quote_invoice)
+    app.router.add_get("/v1/invoices/{invoice_id}", get_invoice)
+    app.router.add_patch("/v1/invoices/{invoice_id}/cancel", cancel_invoice)
+    app.router.add_get("/v1/subscriptions", list_subscriptions)
+    app.router.add_post("/v1/subscriptions", create_subscription)
+    app.router.add_post("/pay/{invoice_id}", pay_invoice)
+    app.router.add_get("/stats", get_stats)
+    web.run_app(app, port=port)
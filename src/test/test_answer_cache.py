@@ -0,0 +1,121 @@
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import mongomock
+import pytest
+
+from conftest import AsyncCollection
+from lib.abbot.telegram import stream_reply
+from lib.db.answer_cache import AnswerCache
+
+QUESTION = "what is the difference between bitcoin and the lightning network"
+ANSWER = "lightning is a layer on top of bitcoin"
+GROUP_ID = -100
+
+
+@pytest.fixture
+def collection():
+    return mongomock.MongoClient().telegram.answer
+
+
+@pytest.fixture
+def cache(collection):
+    return AnswerCache(AsyncCollection(collection))
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_hit_carries_the_model_that_answered(cache):
+    async def store_and_lookup():
+        await cache.store(QUESTION, "v1", GROUP_ID, ANSWER, 120, 40, "gpt-4")
+        return await cache.lookup(QUESTION, "v1", GROUP_ID)
+
+    cached = run(store_and_lookup())
+    assert cached["answer"] == ANSWER
+    assert (cached["input_tokens"], cached["output_tokens"], cached["model"]) == (120, 40, "gpt-4")
+
+
+def test_similar_question_hits(cache):
+    async def store_and_lookup():
+        await cache.store(QUESTION, "v1", GROUP_ID, ANSWER, 120, 40, "gpt-4")
+        return await cache.lookup(f"{QUESTION}?", "v1", GROUP_ID)
+
+    assert run(store_and_lookup())["answer"] == ANSWER
+
+
+@pytest.mark.parametrize("system_prompt, scope", [("v2", GROUP_ID), ("v1", -200)])
+def test_other_prompt_or_chat_misses(cache, system_prompt, scope):
+    async def store_and_lookup():
+        await cache.store(QUESTION, "v1", GROUP_ID, ANSWER, 120, 40, "gpt-4")
+        return await cache.lookup(QUESTION, system_prompt, scope)
+
+    assert run(store_and_lookup()) is None
+    assert cache.misses == 1
+
+
+def test_expired_entry_misses_and_is_unindexed(cache, collection):
+    run(cache.store(QUESTION, "v1", GROUP_ID, ANSWER, 120, 40, "gpt-4"))
+    collection.update_many({}, {"$set": {"expires_at": datetime.now() - timedelta(seconds=1)}})
+    assert run(cache.lookup(QUESTION, "v1", GROUP_ID)) is None
+    assert not cache.vectors
+
+
+def test_least_recently_hit_entries_are_evicted(collection):
+    cache = AnswerCache(AsyncCollection(collection), max_entries=2)
+    questions = [f"{QUESTION} number {word}" for word in ("one", "two", "three")]
+
+    async def fill():
+        await cache.store(questions[0], "v1", GROUP_ID, ANSWER, 1, 1)
+        await cache.store(questions[1], "v1", GROUP_ID, ANSWER, 1, 1)
+        await asyncio.sleep(0.01)
+        await cache.lookup(questions[0], "v1", GROUP_ID)
+        await cache.store(questions[2], "v1", GROUP_ID, ANSWER, 1, 1)
+
+    run(fill())
+    assert sorted(doc["question"] for doc in collection.find()) == sorted([questions[0], questions[2]])
+    assert len(cache.vectors) == 2
+
+
+class FakeMessage:
+    async def reply_text(self, text):
+        return SimpleNamespace(text=text)
+
+
+def fake_abbot(chat_id):
+    def cached_completion(answer, input_tokens, output_tokens, model=None):
+        return answer, input_tokens, output_tokens, input_tokens + output_tokens
+
+    return SimpleNamespace(
+        id=chat_id,
+        model="gpt-4",
+        context=SimpleNamespace(system={"content": "v1"}),
+        cached_completion=cached_completion,
+    )
+
+
+@pytest.fixture
+def answered(monkeypatch, cache):
+    async def fresh_reply(message, abbot):
+        return "reply", "fresh answer", 100, 30, 130
+
+    monkeypatch.setattr(stream_reply, "answer_cache", cache)
+    monkeypatch.setattr(stream_reply, "stream_reply", fresh_reply)
+    return cache
+
+
+def test_group_answer_is_cached_and_served(answered):
+    first = run(stream_reply.answer_reply(FakeMessage(), fake_abbot(GROUP_ID), QUESTION, use_cache=True))
+    second = run(stream_reply.answer_reply(FakeMessage(), fake_abbot(GROUP_ID), QUESTION, use_cache=True))
+    assert first[1:] == ("fresh answer", 100, 30, False)
+    assert second[1:] == ("fresh answer", 100, 30, True)
+
+
+def test_dm_never_stores_or_serves(answered, collection):
+    dm_id = 42
+    run(answered.store(QUESTION, "v1", dm_id, ANSWER, 120, 40, "gpt-4"))
+    result = run(stream_reply.answer_reply(FakeMessage(), fake_abbot(dm_id), QUESTION))
+    assert result[1:] == ("fresh answer", 100, 30, False)
+    assert collection.count_documents({}) == 1 and answered.hits == 0
@@ -0,0 +1,128 @@
+import asyncio
+
+import mongomock
+import pytest
+from pymongo import ASCENDING
+
+from conftest import AsyncCollection
+from lib.abbot.config import BOT_SYSTEM_OBJECT_GROUPS
+from lib.db.mongo import LOG_INDEX, MongoAbbot, split_log_update
+from lib.db.mongo_async import AsyncMongoAbbot
+
+CHAT_ID = -100
+SYSTEM = {"role": "system", "content": "you are abbot"}
+
+
+def turn(text, role="user"):
+    return {"role": role, "content": text, "tokens": 1}
+
+
+def contents(entries):
+    return [entry["content"] for entry in entries]
+
+
+def test_split_push_appends_and_reserves_seqs():
+    update, entries, replaced = split_log_update(
+        {"$push": {"history": {"$each": [turn("a"), turn("b")]}, "messages": {"text": "a"}}, "$set": {"title": "t"}}
+    )
+    assert update == {"$set": {"title": "t"}, "$inc": {"history_seq": 2, "messages_seq": 1}}
+    assert contents(entries["history"]) == ["a", "b"] and entries["messages"] == [{"text": "a"}]
+    assert not replaced
+
+
+def test_split_set_replaces_and_resets_the_counter():
+    update, entries, replaced = split_log_update({"$set": {"history": [SYSTEM, turn("a")]}, "$inc": {"tokens": 1}})
+    assert update == {"$set": {"history_seq": 1}, "$inc": {"tokens": 1}}
+    assert contents(entries["history"]) == ["a"] and replaced == {"history"}
+
+
+@pytest.fixture
+def db():
+    db = mongomock.MongoClient().telegram
+    for name in ("message", "history"):
+        db[name].create_index(LOG_INDEX, unique=True, name="chat_seq")
+    return db
+
+
+@pytest.fixture
+def mongo(db):
+    mongo = AsyncMongoAbbot("telegram", "append")
+    mongo.groups = AsyncCollection(db.group)
+    mongo.direct_messages = AsyncCollection(db.dm)
+    mongo.message_log = AsyncCollection(db.message)
+    mongo.history_log = AsyncCollection(db.history)
+    return mongo
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def logged(db, chat_id=CHAT_ID):
+    return [(entry["seq"], entry["content"]) for entry in db.history.find({"chat_id": chat_id}).sort("seq", ASCENDING)]
+
+
+def test_writes_go_to_the_log_and_reads_hydrate_the_window(mongo, db):
+    filter = {"id": CHAT_ID}
+
+    async def flow():
+        await mongo.find_one_group_and_update(filter, {"$set": {"title": "t"}, "$push": {"history": turn("a")}})
+        await mongo.update_one_group(filter, {"$push": {"history": {"$each": [turn("b"), turn("c", "assistant")]}}})
+        return await mongo.find_one_group(filter, fields=["title", "history", "history_len"], history_limit=2)
+
+    group = run(flow())
+    assert logged(db) == [(0, "a"), (1, "b"), (2, "c")]
+    assert "history" not in db.group.find_one(filter) and db.group.find_one(filter)["history_seq"] == 3
+    assert group["title"] == "t" and group["history_len"] == 4
+    assert group["history"][0] == BOT_SYSTEM_OBJECT_GROUPS and contents(group["history"][1:]) == ["b", "c"]
+
+
+def test_set_history_replaces_the_log(mongo, db):
+    filter = {"id": CHAT_ID}
+
+    async def flow():
+        await mongo.update_one_group(filter, {"$push": {"history": {"$each": [turn("a"), turn("b"), turn("c")]}}})
+        await mongo.find_one_group_and_update(filter, {"$set": {"history": [SYSTEM, turn("fresh")]}})
+        await mongo.update_one_group(filter, {"$push": {"history": turn("next")}})
+        return await mongo.find_one_group(filter, fields=["history", "history_len"])
+
+    group = run(flow())
+    assert logged(db) == [(0, "fresh"), (1, "next")]
+    assert contents(group["history"][1:]) == ["fresh", "next"] and group["history_len"] == 3
+
+
+def test_clearing_history_empties_the_log(mongo, db):
+    filter = {"id": CHAT_ID}
+
+    async def flow():
+        await mongo.update_one_group(filter, {"$push": {"history": {"$each": [turn("a"), turn("b")]}}})
+        await mongo.update_one_group(filter, {"$set": {"history": [SYSTEM]}})
+        return await mongo.find_one_group(filter, fields=["history", "history_len"])
+
+    group = run(flow())
+    assert logged(db) == []
+    assert group["history"] == [BOT_SYSTEM_OBJECT_GROUPS] and group["history_len"] == 1
+    assert db.group.find_one(filter)["history_seq"] == 0
+
+
+def test_bulk_push_appends_per_chat(mongo, db):
+    pushes = {
+        CHAT_ID: {"$set": {"title": "t"}, "messages": [{"text": "a"}], "history": [turn("a")]},
+        -200: {"$set": {}, "messages": [{"text": "b"}], "history": [turn("b")]},
+    }
+    run(mongo.bulk_push_groups(pushes))
+    run(mongo.bulk_push_groups({CHAT_ID: {"messages": [{"text": "c"}], "history": [turn("c")]}}))
+    assert logged(db) == [(0, "a"), (1, "c")] and logged(db, -200) == [(0, "b")]
+    assert [entry["seq"] for entry in db.message.find({"chat_id": CHAT_ID})] == [0, 1]
+    assert db.group.find_one({"id": CHAT_ID})["title"] == "t"
+
+
+def test_sync_twin_replaces_the_log_too(db):
+    mongo = MongoAbbot("telegram", "append")
+    mongo.groups, mongo.message_log, mongo.history_log = db.group, db.message, db.history
+    filter = {"id": CHAT_ID}
+    mongo.update_one_group(filter, {"$push": {"history": {"$each": [turn("a"), turn("b")]}}})
+    mongo.update_one_group(filter, {"$set": {"history": [SYSTEM, turn("fresh")]}})
+    group = mongo.find_one_group(filter, fields=["history", "history_len"])
+    assert logged(db) == [(0, "fresh")]
+    assert contents(group["history"][1:]) == ["fresh"] and group["history_len"] == 2
@@ -0,0 +1,179 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import mongomock
+import pytest
+
+from conftest import AsyncCollection
+from lib.db.archive import HistoryArchiver
+from lib.db.mongo import HISTORY_WINDOW, LOG_INDEX
+from lib.db.mongo_async import AsyncMongoAbbot
+
+CHAT_ID = -100
+SYSTEM = {"role": "system", "content": "you are abbot"}
+
+
+def turns(first, last):
+    return [{"role": "user", "content": f"turn {seq}"} for seq in range(first, last)]
+
+
+def contents(entries):
+    return [entry["content"] for entry in entries]
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+@pytest.fixture
+def db():
+    db = mongomock.MongoClient().telegram
+    for name in ("message", "history"):
+        db[name].create_index(LOG_INDEX, unique=True, name="chat_seq")
+    return db
+
+
+def mongo_for(db, storage_mode, groups=None):
+    mongo = AsyncMongoAbbot("telegram", storage_mode)
+    mongo.groups = groups or AsyncCollection(db.group)
+    mongo.direct_messages = AsyncCollection(db.dm)
+    mongo.message_log = AsyncCollection(db.message)
+    mongo.history_log = AsyncCollection(db.history)
+    return mongo
+
+
+# append mode
+def seed_log(db, count, aged=0):
+    now, old = datetime.now(), datetime.now() - timedelta(days=100)
+    db.history.insert_many(
+        [
+            {"chat_id": CHAT_ID, "seq": seq, "created_at": old if seq < aged else now, **turn}
+            for seq, turn in enumerate(turns(0, count))
+        ]
+    )
+    db.group.insert_one({"id": CHAT_ID, "history_seq": count, "messages_seq": 0})
+
+
+def test_append_mode_archives_past_keep_count(db, tmp_path):
+    seed_log(db, HISTORY_WINDOW + 30)
+    archiver = HistoryArchiver(mongo_for(db, "append"), root=str(tmp_path), keep_count=HISTORY_WINDOW + 10)
+    result = run(archiver.archive())
+    assert result["status"] == "success" and result["count"] == 20
+    assert [entry["seq"] for entry in db.history.find()][0] == 20
+    [segment] = archiver.manifest(CHAT_ID, "history")
+    assert (segment["kind"], segment["first_seq"], segment["last_seq"], segment["count"]) == ("group", 0, 19, 20)
+    assert contents(archiver.iter_archived(CHAT_ID)) == contents(turns(0, 20))
+
+
+def test_append_mode_archives_aged_entries_but_keeps_the_window(db, tmp_path):
+    seed_log(db, HISTORY_WINDOW + 30, aged=HISTORY_WINDOW)
+    archiver = HistoryArchiver(mongo_for(db, "append"), root=str(tmp_path), keep_count=HISTORY_WINDOW + 10)
+    run(archiver.archive())
+    assert db.history.count_documents({}) == HISTORY_WINDOW
+    assert contents(archiver.iter_archived(CHAT_ID)) == contents(turns(0, 30))
+
+
+def test_append_mode_interrupted_pass_is_listed_and_not_repeated(db, tmp_path, monkeypatch):
+    seed_log(db, HISTORY_WINDOW + 30)
+    mongo = mongo_for(db, "append")
+    archiver = HistoryArchiver(mongo, root=str(tmp_path), keep_count=HISTORY_WINDOW + 10)
+
+    async def lost_connection(*args, **kwargs):
+        raise ConnectionError("mongo went away")
+
+    monkeypatch.setattr(mongo.history_log, "delete_many", lost_connection, raising=False)
+    assert run(archiver.archive())["status"] == "error"
+    assert len(archiver.manifest(CHAT_ID, "history")) == 1
+    monkeypatch.undo()
+    db.history.insert_many(
+        [
+            {
+                "chat_id": CHAT_ID,
+                "seq": HISTORY_WINDOW + 30 + seq,
+                "created_at": datetime.now(),
+                "role": "user",
+                "content": f"turn {HISTORY_WINDOW + 30 + seq}",
+            }
+            for seq in range(5)
+        ]
+    )
+    db.group.update_one({"id": CHAT_ID}, {"$inc": {"history_seq": 5}})
+    assert run(archiver.archive())["status"] == "success"
+    assert contents(archiver.iter_archived(CHAT_ID)) == contents(turns(0, 25))
+    assert db.history.find_one(sort=[("seq", 1)])["seq"] == 25
+
+
+def test_append_mode_push_during_pass_stays_live(db, tmp_path):
+    seed_log(db, HISTORY_WINDOW + 30)
+    history = AsyncCollection(db.history)
+    mongo = mongo_for(db, "append")
+    archiver = HistoryArchiver(mongo, root=str(tmp_path), keep_count=HISTORY_WINDOW + 10)
+    find = history.find
+
+    def find_then_push(*args, **kwargs):
+        cursor = find(*args, **kwargs)
+        db.history.insert_one(
+            {
+                "chat_id": CHAT_ID,
+                "seq": HISTORY_WINDOW + 30,
+                "created_at": datetime.now(),
+                "role": "user",
+                "content": "late",
+            }
+        )
+        return cursor
+
+    history.find = find_then_push
+    mongo.history_log = history
+    run(archiver.archive())
+    assert contents(archiver.iter_archived(CHAT_ID)) == contents(turns(0, 20))
+    assert db.history.find_one({"content": "late"})
+
+
+# document mode
+def document_doc(db):
+    doc = db.group.find_one({"id": CHAT_ID})
+    return {
+        "id": CHAT_ID,
+        "head": doc["history"][0],
+        "history_len": len(doc["history"]),
+        "messages_len": len(doc.get("messages", [])),
+        "archived_history": doc.get("archived_history", 0),
+    }
+
+
+def archive_document(archiver, collection, db):
+    segments = run(archiver.archive_document_chat("group", collection, document_doc(db)))
+    archiver.finish("group", CHAT_ID, segments, [])
+    return segments
+
+
+def test_document_mode_trims_past_keep_count_and_round_trips(db, tmp_path):
+    db.group.insert_one({"id": CHAT_ID, "history": [SYSTEM, *turns(0, HISTORY_WINDOW + 20)]})
+    groups = AsyncCollection(db.group)
+    archiver = HistoryArchiver(mongo_for(db, "document", groups), root=str(tmp_path), keep_count=HISTORY_WINDOW)
+    [segment] = archive_document(archiver, groups, db)
+    group = db.group.find_one({"id": CHAT_ID})
+    assert group["history"][0] == SYSTEM and contents(group["history"][1:]) == contents(turns(20, HISTORY_WINDOW + 20))
+    assert group["archived_history"] == 20
+    assert archiver.manifest(CHAT_ID, "history") == [segment]
+    assert (segment["first_seq"], segment["last_seq"]) == (0, 19)
+    db.group.update_one(
+        {"id": CHAT_ID}, {"$push": {"history": {"$each": turns(HISTORY_WINDOW + 20, HISTORY_WINDOW + 25)}}}
+    )
+    archive_document(archiver, groups, db)
+    assert db.group.find_one({"id": CHAT_ID})["archived_history"] == 25
+    assert contents(archiver.iter_archived(CHAT_ID)) == contents(turns(0, 25))
+
+
+def test_document_mode_push_during_pass_discards_the_segment(db, tmp_path):
+    db.group.insert_one({"id": CHAT_ID, "history": [SYSTEM, *turns(0, HISTORY_WINDOW + 20)]})
+    groups = AsyncCollection(db.group)
+    archiver = HistoryArchiver(mongo_for(db, "document", groups), root=str(tmp_path), keep_count=HISTORY_WINDOW)
+    doc = document_doc(db)
+    db.group.update_one({"id": CHAT_ID}, {"$push": {"history": {"role": "user", "content": "late"}}})
+    segments = run(archiver.archive_document_chat("group", groups, doc))
+    assert segments == []
+    assert len(db.group.find_one({"id": CHAT_ID})["history"]) == HISTORY_WINDOW + 22
+    assert archiver.manifest(CHAT_ID) == [] and list(archiver.iter_archived(CHAT_ID)) == []
+    assert not list(tmp_path.rglob("*.jsonl.gz"))
@@ -0,0 +1,155 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+from lib.abbot.backend import LatencyModel, RecordingCompletions, Recordings, ReplayCompletions, prompt_key
+from lib.abbot.tokenizer import tokenizer
+from lib.api.llm_server import LLMServer
+
+MODEL = "gpt-4"
+MESSAGES = [{"role": "system", "content": "you are abbot"}, {"role": "user", "content": "what is a sat?"}]
+ANSWER = "A sat is one hundred millionth of a bitcoin."
+
+
+def tokenizer_available():
+    try:
+        tokenizer.encoder()
+        return True
+    except Exception:
+        return False
+
+
+# non-streamed replays count usage with tiktoken, which downloads its encodings on first use
+needs_tokenizer = pytest.mark.skipif(not tokenizer_available(), reason="tiktoken encodings unavailable offline")
+
+
+class LiveClient:
+    """Answers like AsyncOpenAI, as one response or as delta chunks"""
+
+    def __init__(self, content=ANSWER):
+        self.content = content
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        if kwargs.get("stream"):
+            return self.stream()
+        return {"choices": [{"message": {"role": "assistant", "content": self.content}}]}
+
+    async def stream(self):
+        for word in self.content.split(" "):
+            yield {"choices": [{"delta": {"content": f"{word} "}}]}
+
+
+def replay(root):
+    return ReplayCompletions(Recordings(str(root)), LatencyModel("fixed:0"))
+
+
+async def streamed(stream):
+    return "".join([chunk["choices"][0]["delta"].get("content") or "" async for chunk in stream])
+
+
+@needs_tokenizer
+def test_record_then_replay_round_trip(tmp_path):
+    live = LiveClient()
+    recorder = RecordingCompletions(live, Recordings(str(tmp_path)))
+
+    async def flow():
+        await recorder.create(model=MODEL, messages=MESSAGES)
+        # replay reads the recordings back from disk, as a later run would
+        replayer = replay(tmp_path)
+        response = await replayer.create(model=MODEL, messages=MESSAGES)
+        return replayer, response
+
+    replayer, response = asyncio.run(flow())
+    assert live.calls == 1 and replayer.hits == 1 and not replayer.misses
+    assert response["choices"][0]["message"]["content"] == ANSWER
+    assert response["usage"]["completion_tokens"] > 0
+
+
+def test_recorded_stream_replays_as_a_stream(tmp_path):
+    live = LiveClient()
+    recorder = RecordingCompletions(live, Recordings(str(tmp_path)))
+    replayer = replay(tmp_path)
+
+    async def flow():
+        recorded = await streamed(await recorder.create(model=MODEL, messages=MESSAGES, stream=True))
+        replayed = await streamed(await replayer.create(model=MODEL, messages=MESSAGES, stream=True))
+        return recorded, replayed
+
+    recorded, replayed = asyncio.run(flow())
+    assert replayed == recorded and recorded.split() == ANSWER.split()
+    assert live.calls == 1 and replayer.hits == 1 and not replayer.misses
+
+
+@needs_tokenizer
+def test_replay_miss_is_a_deterministic_synthetic_answer(tmp_path):
+    replayer = replay(tmp_path)
+    messages = [{"role": "user", "content": "never recorded"}]
+
+    async def flow():
+        first = await replayer.create(model=MODEL, messages=messages)
+        second = await replayer.create(model=MODEL, messages=messages)
+        return first, second
+
+    first, second = asyncio.run(flow())
+    content = first["choices"][0]["message"]["content"]
+    assert content == second["choices"][0]["message"]["content"]
+    assert content.startswith(f"Replayed answer {prompt_key({'model': MODEL, 'messages': messages})[:8]}")
+    assert "never recorded" in content
+    assert replayer.misses == 2 and not replayer.hits
+
+
+def llm_server(root):
+    recordings = Recordings(str(root))
+    recordings.add({"key": prompt_key({"model": MODEL, "messages": MESSAGES}), "model": MODEL, "content": ANSWER})
+    return LLMServer(ReplayCompletions(recordings, LatencyModel("fixed:0")))
+
+
+def test_llm_server_streams_recordings_over_sse(tmp_path):
+    server = llm_server(tmp_path)
+
+    async def flow():
+        async with TestClient(TestServer(server.app())) as client:
+            models = await (await client.get("/v1/models")).json()
+            response = await client.post(
+                "/v1/chat/completions", json={"model": MODEL, "messages": MESSAGES, "stream": True}
+            )
+            events = [line[len("data: ") :] for line in (await response.text()).splitlines() if line]
+            return models, response.headers["Content-Type"], events
+
+    models, content_type, events = asyncio.run(flow())
+    assert [model["id"] for model in models["data"]] == [MODEL]
+    assert content_type.startswith("text/event-stream") and events[-1] == "[DONE]"
+    chunks = [json.loads(event) for event in events[:-1]]
+    assert "".join(chunk["choices"][0]["delta"].get("content") or "" for chunk in chunks) == ANSWER
+    assert chunks[-1]["choices"][0]["finish_reason"] == "stop" and server.requests == 1
+
+
+@needs_tokenizer
+def test_llm_server_answers_plain_completions(tmp_path):
+    server = llm_server(tmp_path)
+
+    async def flow():
+        async with TestClient(TestServer(server.app())) as client:
+            response = await client.post("/v1/chat/completions", json={"model": MODEL, "messages": MESSAGES})
+            return await response.json()
+
+    completion = asyncio.run(flow())
+    assert completion["choices"][0]["message"]["content"] == ANSWER and completion["model"] == MODEL
+
+
+def test_replay_miss_streams_the_synthetic_answer(tmp_path):
+    replayer = replay(tmp_path)
+    messages = [{"role": "user", "content": "never recorded"}]
+
+    async def flow():
+        return await streamed(await replayer.create(model=MODEL, messages=messages, stream=True))
+
+    content = asyncio.run(flow())
+    assert content.startswith(f"Replayed answer {prompt_key({'model': MODEL, 'messages': messages})[:8]}")
+    assert content == asyncio.run(flow()) and replayer.misses == 2 and not replayer.hits
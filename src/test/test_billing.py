@@ -0,0 +1,100 @@
+import asyncio
+
+import mongomock
+import pytest
+from pymongo import ASCENDING
+
+from conftest import AsyncCollection
+from lib.abbot.billing import Billing
+from lib.db.cache import GroupStateCache
+from lib.db.mongo_async import AsyncMongoAbbot
+
+CHAT_ID = -100
+
+
+@pytest.fixture
+def db():
+    client = mongomock.MongoClient()
+    groups = client.telegram.group
+    groups.create_index([("id", ASCENDING)], unique=True, name="id_unique")
+    groups.insert_one({"id": CHAT_ID, "title": "test", "balance": 1000})
+    return client.telegram
+
+
+@pytest.fixture
+def billing(db):
+    mongo = AsyncMongoAbbot("telegram")
+    mongo.groups = AsyncCollection(db.group)
+    return Billing(AsyncCollection(db.ledger), GroupStateCache(mongo))
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_debit_covered(billing, db):
+    result = run(billing.debit(CHAT_ID, 300, input_tokens=10, output_tokens=20, model="gpt-4", reason="reply"))
+    assert result["status"] == "success"
+    assert result["data"] == 700 and result["debited"] == 300 and not result["drained"]
+    assert db.group.find_one({"id": CHAT_ID})["balance"] == 700
+    entry = db.ledger.find_one({"kind": "debit"})
+    assert entry["sats"] == -300 and entry["cost_sats"] == 300 and entry["balance"] == 700
+
+
+def test_debit_short_drains_without_upserting(billing, db):
+    db.group.update_one({"id": CHAT_ID}, {"$set": {"balance": 100}})
+    result = run(billing.debit(CHAT_ID, 300))
+    assert result["status"] == "success"
+    assert result["data"] == 0 and result["debited"] == 100 and result["drained"]
+    assert db.group.count_documents({"id": CHAT_ID}) == 1
+    assert db.group.find_one({"id": CHAT_ID})["balance"] == 0
+
+
+def test_debit_empty_balance_is_refused(billing, db):
+    db.group.update_one({"id": CHAT_ID}, {"$set": {"balance": 0}})
+    result = run(billing.debit(CHAT_ID, 300))
+    assert result["status"] == "error" and result["debited"] == 0
+    assert db.group.count_documents({}) == 1
+    assert db.group.find_one({"id": CHAT_ID})["balance"] == 0
+    assert db.ledger.count_documents({}) == 0
+
+
+def test_debit_unknown_chat_creates_nothing(billing, db):
+    result = run(billing.debit(-200, 300))
+    assert result["status"] == "error"
+    assert db.group.count_documents({"id": -200}) == 0
+
+
+def test_concurrent_debits_never_overspend(billing, db):
+    async def spend():
+        return await asyncio.gather(*[billing.debit(CHAT_ID, 70) for _ in range(20)])
+
+    results = run(spend())
+    debited = sum(result.get("debited", 0) for result in results)
+    assert debited == 1000
+    assert db.group.find_one({"id": CHAT_ID})["balance"] == 0
+    assert -sum(entry["sats"] for entry in db.ledger.find({"kind": "debit"})) == 1000
+
+
+def test_credit_same_invoice_once(billing, db):
+    first = run(billing.credit(CHAT_ID, 500, invoice_id="inv-1"))
+    second = run(billing.credit(CHAT_ID, 500, invoice_id="inv-1"))
+    assert first["status"] == "success" and first["data"] == 1500
+    assert second["status"] == "error" and second["duplicate"]
+    assert db.group.find_one({"id": CHAT_ID})["balance"] == 1500
+    assert db.ledger.find_one({"_id": "credit:inv-1"})["balance"] == 1500
+
+
+def test_credit_unknown_chat_is_refused(billing, db):
+    result = run(billing.credit(-200, 500, invoice_id="inv-2"))
+    assert result["status"] == "error"
+    assert db.group.count_documents({"id": -200}) == 0
+    assert db.ledger.count_documents({"_id": "credit:inv-2"}) == 0
+
+
+def test_debit_attributes_shares_to_askers(billing, db):
+    askers = [{"user_id": 1, "username": "alice"}, {"user_id": 2, "username": "bob"}]
+    run(billing.debit(CHAT_ID, 301, reason="mention", askers=askers))
+    entry = db.ledger.find_one({"kind": "debit"})
+    assert [asker["sats"] for asker in entry["askers"]] == [151, 150]
+    assert sum(asker["sats"] for asker in entry["askers"]) == -entry["sats"]
@@ -0,0 +1,117 @@
+import asyncio
+
+from lib.db.buffer import GroupMessageBuffer
+
+
+class FakeMongo:
+    """Records bulk_push_groups calls; fails the next `failures` of them"""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.pushes = []
+
+    async def bulk_push_groups(self, pushes):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("mongo went away")
+        self.pushes.append(pushes)
+
+
+def add(buffer, chat_id, text):
+    return buffer.add(chat_id, {"title": f"chat {chat_id}"}, {"text": text}, {"role": "user", "content": text})
+
+
+def history(pushes, chat_id):
+    return [entry["content"] for entry in pushes[chat_id]["history"]]
+
+
+def test_chat_flushes_at_max_pending():
+    mongo = FakeMongo()
+    buffer = GroupMessageBuffer(mongo, max_pending=3, max_total=100)
+
+    async def fill():
+        for text in ("a", "b"):
+            await add(buffer, -1, text)
+        await add(buffer, -2, "other")
+        assert not mongo.pushes
+        await add(buffer, -1, "c")
+
+    asyncio.run(fill())
+    [pushes] = mongo.pushes
+    assert list(pushes) == [-1] and history(pushes, -1) == ["a", "b", "c"]
+    assert pushes[-1]["$set"] == {"title": "chat -1"}
+    assert buffer.total == 1 and buffer.pending_count(-2) == 1
+
+
+def test_buffer_flushes_every_chat_at_max_total():
+    mongo = FakeMongo()
+    buffer = GroupMessageBuffer(mongo, max_pending=10, max_total=3)
+
+    async def fill():
+        for chat_id, text in ((-1, "a"), (-2, "b"), (-3, "c")):
+            await add(buffer, chat_id, text)
+
+    asyncio.run(fill())
+    [pushes] = mongo.pushes
+    assert sorted(pushes) == [-3, -2, -1]
+    assert buffer.total == 0 and not buffer.pending
+
+
+def test_interval_flush_and_flush_on_shutdown():
+    mongo = FakeMongo()
+    buffer = GroupMessageBuffer(mongo, flush_interval=0.02)
+
+    async def lifetime():
+        task = asyncio.create_task(buffer.run())
+        await add(buffer, -1, "a")
+        await asyncio.sleep(0.05)
+        assert len(mongo.pushes) == 1
+        await add(buffer, -1, "b")
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(lifetime())
+    assert [history(pushes, -1) for pushes in mongo.pushes] == [["a"], ["b"]]
+    assert buffer.total == 0
+
+
+def test_failed_flush_requeues_ahead_of_newer_messages():
+    mongo = FakeMongo(failures=1)
+    buffer = GroupMessageBuffer(mongo)
+
+    async def flow():
+        await add(buffer, -1, "a")
+        assert await buffer.flush() is False
+        assert buffer.total == 1 and buffer.pending_count(-1) == 1
+        await add(buffer, -1, "b")
+        assert await buffer.flush(-1) is True
+
+    asyncio.run(flow())
+    [pushes] = mongo.pushes
+    assert history(pushes, -1) == ["a", "b"]
+    assert buffer.total == 0
+
+
+def test_flush_of_unknown_chat_is_a_no_op():
+    mongo = FakeMongo()
+    buffer = GroupMessageBuffer(mongo)
+    assert asyncio.run(buffer.flush(-1)) is True
+    assert not mongo.pushes
+
+
+def test_messages_added_during_a_failed_flush_stay_behind_the_requeued_ones():
+    buffer = GroupMessageBuffer(None)
+
+    async def slow_failure(pushes):
+        await add(buffer, -1, "b")
+        raise ConnectionError("mongo went away")
+
+    buffer.mongo = type("SlowMongo", (), {"bulk_push_groups": staticmethod(slow_failure)})()
+
+    async def flow():
+        await add(buffer, -1, "a")
+        await buffer.flush()
+
+    asyncio.run(flow())
+    assert [entry["content"] for entry in buffer.pending[-1]["history"]] == ["a", "b"]
+    assert buffer.total == 2
@@ -0,0 +1,62 @@
+import random
+
+import pytest
+
+from lib.abbot.context import MESSAGE_OVERHEAD_TOKENS, REPLY_PRIMING_TOKENS, RollingContext, window_start
+
+
+def brute_force_start(token_counts, budget):
+    for start in range(len(token_counts) + 1):
+        if sum(token_counts[start:]) <= max(budget, 0):
+            return start, sum(token_counts[start:])
+
+
+@pytest.mark.parametrize(
+    "token_counts, budget, expected",
+    [
+        ([], 100, (0, 0)),
+        ([10, 20, 30], 100, (0, 60)),
+        ([10, 20, 30], 50, (1, 50)),
+        ([10, 20, 30], 49, (2, 30)),
+        ([10, 20, 30], 29, (3, 0)),
+        ([10, 20, 30], 0, (3, 0)),
+        ([10, 20, 30], -5, (3, 0)),
+    ],
+)
+def test_window_start_edges(token_counts, budget, expected):
+    assert window_start(token_counts, budget) == expected
+
+
+def test_window_start_matches_brute_force():
+    rng = random.Random(7)
+    for _ in range(500):
+        token_counts = [rng.randint(0, 50) for _ in range(rng.randint(0, 30))]
+        budget = rng.randint(-10, 800)
+        assert window_start(token_counts, budget) == brute_force_start(token_counts, budget)
+
+
+def entry(role, content):
+    return {"role": role, "content": content}
+
+
+def context(tail):
+    history = [entry("system", "s" * 100), *tail]
+    return RollingContext(history, count_tokens=lambda message: len(message["content"]))
+
+
+def test_window_keeps_newest_entries_within_budget(monkeypatch):
+    monkeypatch.setattr("lib.abbot.context.context_budget", lambda model: 400)
+    tail = [entry("user", "x" * 100) for _ in range(5)]
+    messages, tokens = context(tail).window("gpt-4")
+    head_tokens = 100 + MESSAGE_OVERHEAD_TOKENS + REPLY_PRIMING_TOKENS
+    kept = (400 - head_tokens) // (100 + MESSAGE_OVERHEAD_TOKENS)
+    assert len(messages) == 1 + kept
+    assert tokens == head_tokens + kept * (100 + MESSAGE_OVERHEAD_TOKENS)
+
+
+def test_window_always_sends_the_newest_entry(monkeypatch):
+    monkeypatch.setattr("lib.abbot.context.context_budget", lambda model: 50)
+    tail = [entry("user", "old"), entry("user", "y" * 500)]
+    messages, tokens = context(tail).window("gpt-4")
+    assert messages[-1]["content"] == "y" * 500 and len(messages) == 2
+    assert tokens == 100 + 500 + 2 * MESSAGE_OVERHEAD_TOKENS + REPLY_PRIMING_TOKENS
@@ -0,0 +1,29 @@
+import importlib
+
+import dotenv
+import pytest
+
+from conftest import TEST_ENV
+import lib.abbot.env
+
+
+def load_env(monkeypatch, **overrides):
+    monkeypatch.setattr(dotenv, "dotenv_values", lambda *args, **kwargs: {**TEST_ENV, **overrides})
+    return importlib.reload(lib.abbot.env)
+
+
+@pytest.fixture(autouse=True)
+def restore_env(monkeypatch):
+    yield
+    monkeypatch.undo()
+    importlib.reload(lib.abbot.env)
+
+
+def test_empty_optional_llm_settings_are_unset(monkeypatch):
+    env = load_env(monkeypatch, LLM_BACKEND="", OPENAI_BASE_URL="")
+    assert env.LLM_BACKEND is None and env.OPENAI_BASE_URL is None
+
+
+def test_unknown_llm_backend_is_rejected(monkeypatch):
+    with pytest.raises(ValueError, match="LLM_BACKEND"):
+        load_env(monkeypatch, LLM_BACKEND="offline")
@@ -0,0 +1,133 @@
+import asyncio
+
+from lib.db.cache import GroupStateCache
+from lib.db.mongo import HISTORY_WINDOW
+
+CHAT_ID = -100
+SYSTEM = {"role": "system", "content": "you are abbot"}
+
+
+def turns(first, last):
+    return [{"role": "user", "content": f"turn {seq}"} for seq in range(first, last)]
+
+
+def contents(entries):
+    return [entry["content"] for entry in entries]
+
+
+def cache_with(**state):
+    cache = GroupStateCache(mongo=None)
+    cache.store(CHAT_ID, {"id": CHAT_ID, **state})
+    return cache
+
+
+def state(cache):
+    return cache.states[CHAT_ID]
+
+
+def test_push_one_entry():
+    cache = cache_with(history=[SYSTEM, *turns(0, 2)], history_len=3)
+    cache.apply(CHAT_ID, {"$push": {"history": {"role": "user", "content": "turn 2"}}})
+    assert contents(state(cache)["history"][1:]) == contents(turns(0, 3))
+    assert state(cache)["history_len"] == 4
+
+
+def test_push_each_keeps_the_system_prompt_and_the_window():
+    cache = cache_with(history=[SYSTEM, *turns(0, HISTORY_WINDOW)], history_len=HISTORY_WINDOW + 1)
+    cache.apply(CHAT_ID, {"$push": {"history": {"$each": turns(HISTORY_WINDOW, HISTORY_WINDOW + 3)}}})
+    history = state(cache)["history"]
+    assert history[0] == SYSTEM and len(history) == HISTORY_WINDOW + 1
+    assert contents(history[1:]) == contents(turns(3, HISTORY_WINDOW + 3))
+    assert state(cache)["history_len"] == HISTORY_WINDOW + 4
+
+
+def test_push_counts_history_len_even_without_cached_history():
+    cache = cache_with(history_len=5)
+    cache.apply(CHAT_ID, {"$push": {"history": {"$each": turns(0, 2)}}})
+    assert state(cache)["history_len"] == 7 and "history" not in state(cache)
+
+
+def test_set_history_replaces_it_and_recomputes_history_len():
+    cache = cache_with(history=[SYSTEM, *turns(0, 5)], history_len=6)
+    cache.apply(CHAT_ID, {"$set": {"history": [SYSTEM, *turns(10, 12)]}})
+    assert contents(state(cache)["history"]) == contents([SYSTEM, *turns(10, 12)])
+    assert state(cache)["history_len"] == 3
+
+
+def test_set_top_level_and_dotted_fields():
+    cache = cache_with(title="old", config={"started": True, "unleashed": False})
+    cache.apply(CHAT_ID, {"$set": {"title": "new", "config.unleashed": True}})
+    assert state(cache)["title"] == "new"
+    assert state(cache)["config"] == {"started": True, "unleashed": True}
+
+
+def test_inc_balance_and_tokens():
+    cache = cache_with(balance=1000, tokens=50)
+    cache.apply(CHAT_ID, {"$inc": {"balance": -300, "tokens": 20}})
+    assert (state(cache)["balance"], state(cache)["tokens"]) == (700, 70)
+
+
+def test_updates_it_cannot_replay_drop_the_field():
+    cache = cache_with(balance=10.5, config={"nested": {"a": 1}}, title="t", summary={"content": "s"})
+    cache.apply(
+        CHAT_ID,
+        {"$inc": {"balance": 1}, "$set": {"config.nested.a": 2}, "$unset": {"title": ""}, "$max": {"summary": 1}},
+    )
+    assert not {"balance", "config", "title", "summary"} & set(state(cache))
+
+
+def test_uncached_fields_and_chats_are_left_alone():
+    cache = cache_with(balance=100)
+    cache.apply(CHAT_ID, {"$set": {"title": "new", "messages_len": 3}})
+    cache.apply(-200, {"$inc": {"balance": 5}})
+    assert state(cache) == {"id": CHAT_ID, "balance": 100}
+    assert -200 not in cache.states
+
+
+def test_cached_slices_history_to_the_limit():
+    cache = cache_with(history=[SYSTEM, *turns(0, 20)], balance=5)
+    doc = cache.cached(CHAT_ID, ["history", "balance"], history_limit=5)
+    assert doc["history"][0] == SYSTEM and contents(doc["history"][1:]) == contents(turns(15, 20))
+    assert contents(cache.cached(CHAT_ID, ["history"], history_limit=50)["history"]) == contents(
+        [SYSTEM, *turns(0, 20)]
+    )
+
+
+def test_cached_misses_beyond_the_window_or_on_missing_fields():
+    cache = cache_with(history=[SYSTEM, *turns(0, 20)])
+    assert cache.cached(CHAT_ID, ["history"], history_limit=None) is None
+    assert cache.cached(CHAT_ID, ["history"], history_limit=HISTORY_WINDOW + 1) is None
+    assert cache.cached(CHAT_ID, ["history", "balance"], history_limit=5) is None
+    assert cache.cached(-200, ["balance"], history_limit=None) is None
+
+
+def test_cached_copies_are_independent():
+    cache = cache_with(config={"started": True})
+    cache.cached(CHAT_ID, ["config"], None)["config"]["started"] = False
+    assert state(cache)["config"] == {"started": True}
+
+
+class FakeMongo:
+    def __init__(self, group):
+        self.group = group
+        self.reads = 0
+
+    async def find_one_group_and_update(self, filter, update, fields=None, history_limit=None):
+        return {field: self.group[field] for field in fields or []}
+
+    async def find_one_group(self, filter, fields=None, history_limit=None):
+        self.reads += 1
+        return {field: self.group[field] for field in fields}
+
+
+def test_write_through_then_read_from_memory():
+    mongo = FakeMongo({"id": CHAT_ID, "balance": 900, "config": {"started": True}})
+    cache = GroupStateCache(mongo)
+
+    async def flow():
+        await cache.get_group_config({"id": CHAT_ID})
+        await cache.find_one_group_and_update({"id": CHAT_ID}, {"$set": {"config.started": False}}, fields=["balance"])
+        return await cache.get_group_config({"id": CHAT_ID}), await cache.get_group_balance({"id": CHAT_ID})
+
+    assert asyncio.run(flow()) == ({"started": False}, 900)
+    assert mongo.reads == 1 and cache.hits == 2
@@ -0,0 +1,115 @@
+import asyncio
+
+from lib.invoice_watcher import INVOICE_CHECK_MAX, InvoiceWatcher
+
+
+class FakeProcessor:
+    def __init__(self, paid=True):
+        self.paid = paid
+        self.expired = []
+
+    async def invoice_is_paid(self, invoice_id):
+        return self.paid
+
+    async def expire_invoice(self, invoice_id):
+        self.expired.append(invoice_id)
+        return True
+
+
+class FlakyOnPaid:
+    """Raises on the first `failures` calls, like a Mongo error in Billing.credit, then succeeds"""
+
+    def __init__(self, failures=1):
+        self.failures = failures
+        self.calls = 0
+        self.credited = []
+
+    async def __call__(self, invoice):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise RuntimeError("mongo unavailable")
+        self.credited.append(invoice.invoice_id)
+
+
+async def on_expired(invoice, cancelled):
+    pass
+
+
+def test_paid_invoice_is_settled_once():
+    watcher = InvoiceWatcher(FakeProcessor())
+    on_paid = FlakyOnPaid(failures=0)
+
+    async def flow():
+        invoice = watcher.register("inv-1", -100, 500, 600, on_paid, on_expired)
+        await watcher.check(invoice)
+        return await watcher.settle("inv-1", source="webhook")
+
+    assert asyncio.run(flow()) is False
+    assert on_paid.credited == ["inv-1"] and not watcher.invoices
+    assert watcher.metrics["paid_poll"] == 1
+
+
+def test_failed_on_paid_keeps_the_invoice_until_credited():
+    watcher = InvoiceWatcher(FakeProcessor())
+    on_paid = FlakyOnPaid(failures=1)
+
+    async def flow():
+        invoice = watcher.register("inv-1", -100, 500, 600, on_paid, on_expired)
+        await watcher.check(invoice)
+        assert "inv-1" in watcher.invoices and watcher.metrics["errors"] == 1
+        assert invoice.interval == INVOICE_CHECK_MAX
+        assert watcher.due(invoice.due) == [invoice]
+        await watcher.check(invoice)
+
+    asyncio.run(flow())
+    assert on_paid.calls == 2 and on_paid.credited == ["inv-1"]
+    assert not watcher.invoices and watcher.metrics["paid_poll"] == 1
+
+
+def test_failed_webhook_settle_is_left_to_polling():
+    watcher = InvoiceWatcher(FakeProcessor())
+    on_paid = FlakyOnPaid(failures=1)
+
+    async def flow():
+        invoice = watcher.register("inv-1", -100, 500, 600, on_paid, on_expired)
+        try:
+            await watcher.settle("inv-1", source="webhook")
+        except RuntimeError:
+            pass
+        assert watcher.due(invoice.due) == [invoice]
+        await watcher.check(invoice)
+
+    asyncio.run(flow())
+    assert on_paid.credited == ["inv-1"] and not watcher.invoices
+
+
+def test_paid_invoice_is_retried_past_expiry():
+    watcher = InvoiceWatcher(FakeProcessor())
+    on_paid = FlakyOnPaid(failures=2)
+
+    async def flow():
+        invoice = watcher.register("inv-1", -100, 500, 600, on_paid, on_expired)
+        invoice.expires_at -= 600 + INVOICE_CHECK_MAX + 1
+        await watcher.check(invoice)
+        assert "inv-1" in watcher.invoices
+        await watcher.check(invoice)
+        await watcher.check(invoice)
+
+    asyncio.run(flow())
+    assert on_paid.credited == ["inv-1"] and not watcher.invoices
+    assert not watcher.processor.expired
+
+
+def test_unpaid_invoice_expires():
+    watcher = InvoiceWatcher(FakeProcessor(paid=False))
+    on_paid = FlakyOnPaid(failures=0)
+
+    async def flow():
+        invoice = watcher.register("inv-1", -100, 500, 600, on_paid, on_expired)
+        await watcher.check(invoice)
+        assert invoice.interval > watcher.check_min
+        invoice.expires_at -= 600
+        await watcher.check(invoice)
+
+    asyncio.run(flow())
+    assert watcher.processor.expired == ["inv-1"] and not on_paid.calls and not watcher.invoices
@@ -0,0 +1,51 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from lib.abbot.llm import LLMUnavailableException, ResilientCompletions
+
+
+class FlakyClient:
+    """Raises each queued exception in turn, then answers"""
+
+    def __init__(self, *exceptions):
+        self.exceptions = list(exceptions)
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        if self.exceptions:
+            raise self.exceptions.pop(0)
+        return {"ok": True}
+
+
+def completions(client):
+    resilient = ResilientCompletions(client, deadline=1, max_retries=0, hedge=False)
+    resilient.breaker.max_failures = 2
+    resilient.breaker.cooldown = 0
+    return resilient
+
+
+def test_non_retryable_error_keeps_failure_count():
+    resilient = completions(FlakyClient(TimeoutError(), ValueError("bad request")))
+    with pytest.raises(LLMUnavailableException):
+        asyncio.run(resilient.create(model="gpt-4"))
+    with pytest.raises(ValueError):
+        asyncio.run(resilient.create(model="gpt-4"))
+    assert resilient.breaker.failures == 1
+
+
+def test_failed_probe_reopens_breaker():
+    resilient = completions(FlakyClient(TimeoutError(), TimeoutError(), ValueError("bad request")))
+    for _ in range(2):
+        with pytest.raises(LLMUnavailableException):
+            asyncio.run(resilient.create(model="gpt-4"))
+    resilient.breaker.cooldown = 60
+    resilient.breaker.opened_at -= 61
+    with pytest.raises(ValueError):
+        asyncio.run(resilient.create(model="gpt-4"))
+    assert resilient.breaker.state == "open"
+    with pytest.raises(LLMUnavailableException):
+        asyncio.run(resilient.create(model="gpt-4"))
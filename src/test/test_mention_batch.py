@@ -0,0 +1,50 @@
+import asyncio
+
+from lib.abbot.billing import split_sats
+from lib.abbot.telegram.mention_batch import MentionBatcher
+
+CHAT_ID = -100
+
+
+def test_lone_mention_is_answered_right_away():
+    batcher = MentionBatcher(window=0.05)
+    mentions = batcher.join(CHAT_ID, {"username": "alice"}, queued=1)
+    assert mentions == [{"username": "alice"}]
+    assert not batcher.is_open(CHAT_ID)
+
+
+def test_burst_of_mentions_is_batched():
+    batcher = MentionBatcher(window=0.05)
+
+    async def burst():
+        leader = batcher.join(CHAT_ID, {"username": "alice"}, queued=3)
+        assert batcher.is_open(CHAT_ID)
+        assert batcher.join(CHAT_ID, {"username": "bob"}) is None
+        assert batcher.join(CHAT_ID, {"username": "carol"}) is None
+        return leader, await batcher.close(CHAT_ID)
+
+    leader, batch = asyncio.run(burst())
+    assert leader is batch
+    assert [mention["username"] for mention in batch] == ["alice", "bob", "carol"]
+    assert not batcher.is_open(CHAT_ID)
+
+
+def test_mention_right_after_another_opens_a_batch():
+    batcher = MentionBatcher(window=0.05)
+    batcher.join(CHAT_ID, {"username": "alice"}, queued=1)
+    batcher.join(CHAT_ID, {"username": "bob"}, queued=1)
+    assert batcher.is_open(CHAT_ID)
+
+
+def test_zero_window_never_batches():
+    batcher = MentionBatcher(window=0)
+    assert batcher.join(CHAT_ID, {"username": "alice"}, queued=5) == [{"username": "alice"}]
+    assert batcher.join(CHAT_ID, {"username": "bob"}, queued=5) == [{"username": "bob"}]
+    assert not batcher.is_open(CHAT_ID)
+
+
+def test_split_sats_adds_up():
+    askers = [{"username": "alice"}, {"username": "bob"}, {"username": "carol"}]
+    shares = split_sats(100, askers)
+    assert [share["sats"] for share in shares] == [34, 33, 33]
+    assert [share["username"] for share in shares] == ["alice", "bob", "carol"]
@@ -0,0 +1,58 @@
+import mongomock
+import pytest
+from pymongo import ASCENDING
+
+from lib.db import migrations
+from lib.db.mongo import LOG_INDEX
+
+SYSTEM = {"role": "system", "content": "you are abbot"}
+
+
+@pytest.fixture
+def telegram(monkeypatch):
+    db = mongomock.MongoClient().telegram
+    for name in ("message", "history"):
+        db[name].create_index(LOG_INDEX, unique=True, name="chat_seq")
+    monkeypatch.setattr(migrations, "telegram_groups", db.group)
+    monkeypatch.setattr(migrations, "telegram_dms", db.dm)
+    monkeypatch.setattr(migrations, "telegram_messages", db.message)
+    monkeypatch.setattr(migrations, "telegram_history", db.history)
+    return db
+
+
+def history_of(db, chat_id):
+    return [entry["content"] for entry in db.history.find({"chat_id": chat_id}).sort("seq", ASCENDING)]
+
+
+def test_backfill_copies_document_arrays_and_seeds_counters(telegram):
+    history = [SYSTEM, {"role": "user", "content": "hi"}, {"role": "assistant", "content": "hello"}]
+    telegram.group.insert_one({"id": -1, "history": history, "messages": [{"text": "hi"}]})
+    telegram.dm.insert_one({"id": 7, "history": [SYSTEM, {"role": "user", "content": "gm"}]})
+    result = migrations.backfill_append_logs()
+    assert result["status"] == "success"
+    assert history_of(telegram, -1) == ["hi", "hello"]
+    assert history_of(telegram, 7) == ["gm"]
+    assert [entry["seq"] for entry in telegram.history.find({"chat_id": -1}).sort("seq", ASCENDING)] == [0, 1]
+    group = telegram.group.find_one({"id": -1})
+    assert group["history_seq"] == 2 and group["messages_seq"] == 1
+    assert telegram.dm.find_one({"id": 7})["messages_seq"] == 0
+
+
+def test_backfill_skips_append_mode_chats_and_reruns_cleanly(telegram):
+    telegram.group.insert_one({"id": -1, "history_seq": 1, "messages_seq": 0})
+    telegram.history.insert_one({"chat_id": -1, "seq": 0, "role": "user", "content": "appended"})
+    telegram.group.insert_one({"id": -2, "history": [SYSTEM, {"role": "user", "content": "old"}]})
+    migrations.backfill_append_logs()
+    telegram.group.update_one({"id": -2}, {"$unset": {"history_seq": ""}})
+    assert migrations.backfill_append_logs()["status"] == "success"
+    assert history_of(telegram, -1) == ["appended"]
+    assert history_of(telegram, -2) == ["old"]
+    assert telegram.group.find_one({"id": -2})["history_seq"] == 1
+
+
+def test_backfill_waits_for_append_mode(monkeypatch):
+    migration = next(migration for migration in migrations.MIGRATIONS if migration.name == "backfill_append_logs")
+    monkeypatch.setattr(migrations, "DATABASE_STORAGE_MODE", "document")
+    assert not migration.due()
+    monkeypatch.setattr(migrations, "DATABASE_STORAGE_MODE", "append")
+    assert migration.due()
@@ -0,0 +1,91 @@
+import asyncio
+import time
+
+import pytest
+
+from lib.price_oracle import PriceOracle, PriceUnavailableException
+
+
+class FakeProvider:
+    def __init__(self, *amounts):
+        self.amounts = list(amounts)
+        self.calls = 0
+
+    async def get_bitcoin_price(self):
+        self.calls += 1
+        await asyncio.sleep(0)
+        amount = self.amounts.pop(0) if self.amounts else None
+        if isinstance(amount, Exception):
+            raise amount
+        return {"status": "success", "amount": amount}
+
+
+class FakeStore:
+    def __init__(self, doc=None):
+        self.doc = doc
+
+    async def latest(self):
+        return self.doc
+
+
+def test_cold_start_uses_the_stored_price():
+    provider = FakeProvider(50_000)
+    oracle = PriceOracle(provider, FakeStore({"_id": int(time.time()), "amount": 40_000}))
+    assert asyncio.run(oracle.current()) == 40_000
+    assert provider.calls == 0
+
+
+def test_cold_start_without_stored_price_waits_for_a_refresh():
+    provider = FakeProvider(50_000)
+    oracle = PriceOracle(provider, FakeStore())
+    assert asyncio.run(oracle.current()) == 50_000
+    assert provider.calls == 1
+
+
+def test_cold_start_with_no_price_anywhere_raises_abbot_exception():
+    oracle = PriceOracle(FakeProvider(ConnectionError("provider down")), FakeStore())
+    with pytest.raises(PriceUnavailableException) as raised:
+        asyncio.run(oracle.current())
+    assert raised.value.reply
+    assert oracle.metrics["failed_refreshes"] == 1 and oracle.metrics["unavailable"] == 1
+
+
+def test_stale_price_is_served_while_it_revalidates():
+    provider = FakeProvider(51_000)
+    oracle = PriceOracle(provider, FakeStore(), stale_after=60)
+    oracle.set(50_000, time.time() - 120)
+
+    async def read():
+        stale = await oracle.current()
+        await oracle.refreshing
+        return stale, await oracle.current()
+
+    assert asyncio.run(read()) == (50_000, 51_000)
+    assert provider.calls == 1 and oracle.metrics["stale_reads"] == 1
+
+
+def test_stale_reads_share_one_refresh():
+    provider = FakeProvider(51_000)
+    oracle = PriceOracle(provider, FakeStore(), stale_after=60)
+    oracle.set(50_000, time.time() - 120)
+
+    async def reads():
+        prices = [await oracle.current() for _ in range(3)]
+        await oracle.refreshing
+        return prices
+
+    assert asyncio.run(reads()) == [50_000, 50_000, 50_000]
+    assert provider.calls == 1
+
+
+def test_failed_refresh_keeps_the_last_quote():
+    oracle = PriceOracle(FakeProvider(ConnectionError("provider down")), FakeStore(), stale_after=60)
+    oracle.set(50_000, time.time() - 120)
+
+    async def read():
+        await oracle.current()
+        await oracle.refreshing
+        return await oracle.current()
+
+    assert asyncio.run(read()) == 50_000
+    assert oracle.metrics["failed_refreshes"] == 1
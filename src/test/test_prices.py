@@ -0,0 +1,52 @@
+import asyncio
+
+import mongomock
+import pytest
+
+from conftest import AsyncCollection
+from lib.db.prices import PriceStore, as_datetime
+
+T0 = 1_700_000_040  # 22:14:00 UTC, a minute boundary
+
+
+@pytest.fixture
+def prices():
+    db = mongomock.MongoClient().prices
+    return db, PriceStore(AsyncCollection(db.ticks), AsyncCollection(db.minutes), AsyncCollection(db.hours))
+
+
+def record(store, ticks):
+    async def write():
+        for offset, price in ticks:
+            await store.record(price, T0 + offset)
+
+    asyncio.run(write())
+
+
+def test_buckets_downsample_ticks(prices):
+    db, store = prices
+    record(store, [(0, 100), (20, 120), (40, 90), (60, 110)])
+    minute = db.minutes.find_one({"_id": as_datetime(T0)})
+    assert (minute["open"], minute["high"], minute["low"], minute["close"], minute["count"]) == (100, 120, 90, 90, 3)
+    hour = db.hours.find_one()
+    assert (hour["open"], hour["high"], hour["low"], hour["close"], hour["count"]) == (100, 120, 90, 110, 4)
+
+
+def test_price_at_uses_newest_tick_at_or_before(prices):
+    _, store = prices
+    record(store, [(0, 100), (90, 110), (300, 120)])
+    found = asyncio.run(store.price_at(T0 + 250))
+    assert found["amount"] == 110 and found["resolution"] == "tick"
+    assert asyncio.run(store.price_at(T0 - 1)) is None
+
+
+def test_price_at_never_returns_a_later_bucket_close(prices):
+    db, store = prices
+    record(store, [(0, 100), (70, 110), (80, 120), (110, 130)])
+    db.ticks.delete_many({})
+    # the 22:15 bucket opened at 22:15:10 with 110 and closed at 22:15:50 with 130
+    found = asyncio.run(store.price_at(T0 + 90))
+    assert found["amount"] == 110 and found["resolution"] == "1m"
+    assert found["at"] <= as_datetime(T0 + 90)
+    assert asyncio.run(store.price_at(T0 + 65))["amount"] == 100
+    assert asyncio.run(store.price_at(T0 + 115))["amount"] == 130
@@ -0,0 +1,125 @@
+import asyncio
+import json
+
+from aiohttp.test_utils import TestClient, TestServer
+
+from lib.api.strike_webhook import STRIKE_SIGNATURE_HEADER, STRIKE_WEBHOOK_PATH, StrikeWebhook, sign
+from lib.invoice_watcher import InvoiceWatcher
+from test_invoice_watcher import FakeProcessor, FlakyOnPaid, on_expired
+
+SECRET = "whsec"
+
+
+def event(invoice_id, event_type="invoice.updated"):
+    return json.dumps({"eventType": event_type, "data": {"entityId": invoice_id}}).encode()
+
+
+async def deliver(client, body, signature=None):
+    headers = {STRIKE_SIGNATURE_HEADER: signature if signature is not None else sign(SECRET, body)}
+    response = await client.post(STRIKE_WEBHOOK_PATH, data=body, headers=headers)
+    return response.status
+
+
+def webhook(paid=True):
+    processor = FakeProcessor(paid)
+    return StrikeWebhook(SECRET, processor, InvoiceWatcher(processor))
+
+
+async def settled(hook):
+    await asyncio.gather(*list(hook.tasks))
+
+
+def test_bad_signature_is_refused():
+    hook = webhook()
+    on_paid = FlakyOnPaid(failures=0)
+
+    async def flow():
+        hook.watcher.register("inv-1", -100, 500, 600, on_paid, on_expired)
+        async with TestClient(TestServer(hook.app())) as client:
+            body = event("inv-1")
+            statuses = [
+                await deliver(client, body, signature=sign("other secret", body)),
+                await deliver(client, body, signature=""),
+                await deliver(client, event("inv-2"), signature=sign(SECRET, body)),
+            ]
+            await settled(hook)
+            return statuses
+
+    assert asyncio.run(flow()) == [401, 401, 401]
+    assert hook.metrics["bad_signature"] == 3 and not on_paid.credited and "inv-1" in hook.watcher.invoices
+
+
+def test_valid_event_settles_once():
+    hook = webhook()
+    on_paid = FlakyOnPaid(failures=0)
+
+    async def flow():
+        hook.watcher.register("inv-1", -100, 500, 600, on_paid, on_expired)
+        async with TestClient(TestServer(hook.app())) as client:
+            status = await deliver(client, event("inv-1"))
+            await settled(hook)
+            return status
+
+    assert asyncio.run(flow()) == 200
+    assert on_paid.credited == ["inv-1"] and not hook.watcher.invoices
+    assert hook.metrics["settled"] == 1 and hook.watcher.metrics["paid_webhook"] == 1
+
+
+def test_unpaid_or_unwatched_events_settle_nothing():
+    hook = webhook(paid=False)
+    on_paid = FlakyOnPaid(failures=0)
+
+    async def flow():
+        hook.watcher.register("inv-1", -100, 500, 600, on_paid, on_expired)
+        async with TestClient(TestServer(hook.app())) as client:
+            statuses = [
+                await deliver(client, event("inv-1")),
+                await deliver(client, event("inv-unknown")),
+                await deliver(client, event("inv-1", "invoice.created")),
+            ]
+            await settled(hook)
+            return statuses
+
+    assert asyncio.run(flow()) == [200, 200, 200]
+    assert not on_paid.credited and "inv-1" in hook.watcher.invoices and not hook.metrics["settled"]
+
+
+def test_duplicate_delivery_is_a_no_op():
+    hook = webhook()
+    on_paid = FlakyOnPaid(failures=0)
+
+    async def flow():
+        hook.watcher.register("inv-1", -100, 500, 600, on_paid, on_expired)
+        async with TestClient(TestServer(hook.app())) as client:
+            statuses = [await deliver(client, event("inv-1"))]
+            await settled(hook)
+            statuses.append(await deliver(client, event("inv-1")))
+            await settled(hook)
+            return statuses
+
+    assert asyncio.run(flow()) == [200, 200]
+    assert on_paid.credited == ["inv-1"] and hook.metrics["received"] == 2 and hook.metrics["settled"] == 1
+
+
+def test_duplicate_delivery_during_settle_is_a_no_op():
+    hook = webhook()
+    credited = []
+
+    async def flow():
+        gate = asyncio.Event()
+
+        async def slow_on_paid(invoice):
+            await gate.wait()
+            credited.append(invoice.invoice_id)
+
+        hook.watcher.register("inv-1", -100, 500, 600, slow_on_paid, on_expired)
+        async with TestClient(TestServer(hook.app())) as client:
+            await deliver(client, event("inv-1"))
+            await deliver(client, event("inv-1"))
+            await asyncio.sleep(0)
+            gate.set()
+            await settled(hook)
+
+    asyncio.run(flow())
+    assert credited == ["inv-1"] and not hook.watcher.invoices
+    assert hook.metrics["settled"] == 1 and hook.metrics["already_settled"] == 1
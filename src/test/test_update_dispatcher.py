@@ -0,0 +1,117 @@
+import asyncio
+from types import SimpleNamespace
+
+from lib.abbot.telegram.update_dispatcher import ChatOrderedUpdateProcessor
+
+
+def update(chat_id):
+    return SimpleNamespace(effective_chat=SimpleNamespace(id=chat_id) if chat_id is not None else None)
+
+
+def test_updates_of_a_chat_run_in_arrival_order():
+    processor = ChatOrderedUpdateProcessor(max_workers=8)
+    log = []
+
+    async def handle(name, delay):
+        log.append(f"{name} start")
+        await asyncio.sleep(delay)
+        log.append(f"{name} end")
+
+    async def dispatch():
+        await asyncio.gather(
+            processor.process_update(update(1), handle("a", 0.03)),
+            processor.process_update(update(1), handle("b", 0)),
+            processor.process_update(update(1), handle("c", 0.01)),
+        )
+
+    asyncio.run(dispatch())
+    assert log == ["a start", "a end", "b start", "b end", "c start", "c end"]
+    assert processor.metrics["processed"] == 3
+    assert processor.queued(1) == 0 and not processor.tails
+
+
+def test_chats_run_concurrently():
+    processor = ChatOrderedUpdateProcessor(max_workers=8)
+    log = []
+
+    async def handle(name, delay):
+        log.append(f"{name} start")
+        await asyncio.sleep(delay)
+        log.append(f"{name} end")
+
+    async def dispatch():
+        await asyncio.gather(
+            processor.process_update(update(1), handle("a", 0.03)),
+            processor.process_update(update(2), handle("b", 0)),
+        )
+
+    asyncio.run(dispatch())
+    assert log == ["a start", "b start", "b end", "a end"]
+
+
+def test_chat_past_max_depth_drops_new_updates():
+    processor = ChatOrderedUpdateProcessor(max_workers=8, max_depth=2)
+    handled = []
+
+    async def handle(name):
+        await asyncio.sleep(0.01)
+        handled.append(name)
+
+    async def dispatch():
+        await asyncio.gather(
+            *[processor.process_update(update(1), handle(name)) for name in "abcd"],
+            processor.process_update(update(2), handle("other")),
+        )
+
+    asyncio.run(dispatch())
+    assert sorted(handled) == ["a", "b", "other"]
+    assert processor.metrics["dropped"] == 2
+    assert processor.peak_depth == 2
+
+
+def test_run_ordered_waits_for_the_chat_and_is_never_dropped():
+    processor = ChatOrderedUpdateProcessor(max_workers=8, max_depth=1)
+    log = []
+
+    async def handle(name, delay=0):
+        await asyncio.sleep(delay)
+        log.append(name)
+
+    async def dispatch():
+        first = asyncio.create_task(processor.process_update(update(1), handle("update", 0.02)))
+        await asyncio.sleep(0)
+        assert processor.queued(1) == 1
+        await asyncio.gather(first, processor.run_ordered(1, handle("batch")))
+
+    asyncio.run(dispatch())
+    assert log == ["update", "batch"]
+    assert processor.metrics["reentered"] == 1 and not processor.metrics["dropped"]
+
+
+def test_failed_update_does_not_block_the_chat():
+    processor = ChatOrderedUpdateProcessor(max_workers=8)
+    handled = []
+
+    async def fail():
+        raise ValueError("boom")
+
+    async def handle():
+        handled.append("next")
+
+    async def dispatch():
+        await asyncio.gather(processor.process_update(update(1), fail()), processor.process_update(update(1), handle()))
+
+    asyncio.run(dispatch())
+    assert handled == ["next"]
+    assert processor.metrics["failed"] == 1 and processor.metrics["processed"] == 1
+
+
+def test_updates_without_a_chat_are_not_ordered():
+    processor = ChatOrderedUpdateProcessor(max_workers=8)
+
+    async def handle():
+        pass
+
+    asyncio.run(processor.process_update(update(None), handle()))
+    assert processor.metrics["unordered"] == 1 and processor.metrics["processed"] == 1
+    assert not processor.depths